@@ -10,6 +10,11 @@ from contextlib import asynccontextmanager
 from core.database import init_db, get_engine, get_sessionmaker
 import asyncio
 from core.services.bg_workers import BackgroundWorkers
+from core.services.ingest_buffer import IngestBuffer
+from core.services.spool import SegmentSpool
+from core.config import INGEST_BUFFER_ENABLED, SPOOL_ENABLED
+from core.config import META_DATA_FORMAT, META_DATA_MIGRATION_ENABLED
+from core.config import AUDIT_LOG_PARTITION_INTERVAL
 from core.limiter import RATE_LIMITER
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -27,16 +32,74 @@ async def lifespan(app: FastAPI):
     sessionmaker = get_sessionmaker(engine)
     app.state.db_sessionmaker = sessionmaker
 
+    app.state.log_spool = SegmentSpool() if SPOOL_ENABLED else None
+    bg_workers = BackgroundWorkers(
+        sessionmaker, log_spool=app.state.log_spool
+    )
     app.state._bg_workers_task = asyncio.create_task(
-        BackgroundWorkers(sessionmaker).worker_loop()
+        bg_workers.worker_loop()
     )
+    app.state._spool_replay_task = None
+    if app.state.log_spool:
+        app.state._spool_replay_task = asyncio.create_task(
+            bg_workers.spool_replay_loop()
+        )
+
+    app.state.ingest_buffer = None
+    if INGEST_BUFFER_ENABLED:
+        app.state.ingest_buffer = IngestBuffer(
+            sessionmaker, log_spool=app.state.log_spool
+        )
+        app.state.ingest_buffer.start()
 
     await init_db(engine)
     logger.info("Startup completed and tables created.")
 
+    # needs the meta_data_bin column added by init_db
+    app.state._meta_migration_task = None
+    if META_DATA_FORMAT == "bytea" and META_DATA_MIGRATION_ENABLED:
+        app.state._meta_migration_task = asyncio.create_task(
+            bg_workers.meta_data_migration_loop()
+        )
+    app.state._key_rotation_task = asyncio.create_task(
+        bg_workers.key_rotation_loop()
+    )
+    app.state._retention_task = asyncio.create_task(
+        bg_workers.retention_loop()
+    )
+    app.state._rollup_task = asyncio.create_task(
+        bg_workers.rollup_compaction_loop()
+    )
+    app.state._export_task = asyncio.create_task(
+        bg_workers.export_loop()
+    )
+    # always listens for tenant key shreds, log ids only if enabled
+    app.state._log_hub_task = asyncio.create_task(
+        bg_workers.log_hub_listener_loop()
+    )
+    app.state._partition_task = None
+    if AUDIT_LOG_PARTITION_INTERVAL != "none":
+        app.state._partition_task = asyncio.create_task(
+            bg_workers.partition_maintenance_loop()
+        )
+
     yield
 
     app.state._bg_workers_task.cancel()
+    if app.state._meta_migration_task:
+        app.state._meta_migration_task.cancel()
+    app.state._key_rotation_task.cancel()
+    app.state._retention_task.cancel()
+    app.state._rollup_task.cancel()
+    app.state._export_task.cancel()
+    app.state._log_hub_task.cancel()
+    if app.state._partition_task:
+        app.state._partition_task.cancel()
+    if app.state.ingest_buffer:
+        await app.state.ingest_buffer.stop()
+    if app.state.log_spool:
+        app.state._spool_replay_task.cancel()
+        app.state.log_spool.close()
     await engine.dispose()
     logger.info("Disconnected database")
 
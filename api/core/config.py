@@ -24,9 +24,216 @@ CRITICAL_THRESHOLD = 10
 RATE_LIMIT_DEFAULT = "10000/minute"
 VIETNAM_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
 
+# write-behind buffer for single-log ingestion (opt-in)
+INGEST_BUFFER_ENABLED = (
+    os.environ.get("INGEST_BUFFER_ENABLED", "false").lower() == "true"
+)
+INGEST_FLUSH_INTERVAL_MS = int(
+    os.environ.get("INGEST_FLUSH_INTERVAL_MS", 20)
+)
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 500))
+INGEST_MAX_PENDING = int(os.environ.get("INGEST_MAX_PENDING", 10000))
+
+# streaming NDJSON bulk ingestion
+NDJSON_CHUNK_SIZE = int(os.environ.get("NDJSON_CHUNK_SIZE", 1000))
+NDJSON_MAX_LINE_BYTES = int(
+    os.environ.get("NDJSON_MAX_LINE_BYTES", 1048576)
+)
+NDJSON_MAX_ERRORS_PER_CHUNK = 20
+
+# durable local spool used when the database is saturated or down
+SPOOL_ENABLED = (
+    os.environ.get("SPOOL_ENABLED", "false").lower() == "true"
+)
+SPOOL_DIR = Path(
+    os.environ.get("SPOOL_DIR") or Path(BASE_DIR, "spool")
+)
+SPOOL_SEGMENT_BYTES = int(
+    os.environ.get("SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024)
+)
+# always: msync every append, interval: every SPOOL_FSYNC_INTERVAL_MS,
+# never: leave it to the OS page cache
+SPOOL_FSYNC_POLICY = os.environ.get("SPOOL_FSYNC_POLICY", "interval")
+SPOOL_FSYNC_INTERVAL_MS = int(
+    os.environ.get("SPOOL_FSYNC_INTERVAL_MS", 1000)
+)
+SPOOL_REPLAY_BATCH_SIZE = int(
+    os.environ.get("SPOOL_REPLAY_BATCH_SIZE", 5000)
+)
+SPOOL_REPLAY_INTERVAL = 5.0
+
+# per-tenant bloom filter of recently written log ids
+DEDUP_FILTER_CAPACITY = int(
+    os.environ.get("DEDUP_FILTER_CAPACITY", 100000)
+)
+DEDUP_FILTER_ERROR_RATE = float(
+    os.environ.get("DEDUP_FILTER_ERROR_RATE", 0.001)
+)
+DEDUP_MAX_TENANTS = int(os.environ.get("DEDUP_MAX_TENANTS", 128))
+
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM")
 DATA_ENCRYPTION_KEY = os.environ.get("DATA_ENCRYPTION_KEY")
+# the replaced master key, still accepted for decryption while the
+# key rotation job re-encrypts rows and re-wraps tenant keys
+DATA_ENCRYPTION_KEY_PREVIOUS = os.environ.get(
+    "DATA_ENCRYPTION_KEY_PREVIOUS", None
+)
+# field encryption batches at least this large run on a thread pool
+CRYPTO_WORKERS = int(
+    os.environ.get("CRYPTO_WORKERS", min(4, os.cpu_count() or 1))
+)
+CRYPTO_PARALLEL_THRESHOLD = int(
+    os.environ.get("CRYPTO_PARALLEL_THRESHOLD", 256)
+)
+# "bytea" stores meta_data as a versioned binary envelope, "text" as base64
+META_DATA_FORMAT = os.environ.get("META_DATA_FORMAT", "bytea")
+META_DATA_MIGRATION_ENABLED = (
+    os.environ.get("META_DATA_MIGRATION_ENABLED", "true").lower()
+    == "true"
+)
+META_DATA_MIGRATION_BATCH_SIZE = int(
+    os.environ.get("META_DATA_MIGRATION_BATCH_SIZE", 1000)
+)
+META_DATA_MIGRATION_INTERVAL = 0.5
+
+# per-tenant data keys wrapped by DATA_ENCRYPTION_KEY (bytea format only,
+# text values have no key version so they are always off there)
+TENANT_KEYS_ENABLED = (
+    os.environ.get("TENANT_KEYS_ENABLED", "true").lower() == "true"
+    and META_DATA_FORMAT == "bytea"
+)
+TENANT_KEY_CACHE_SIZE = int(
+    os.environ.get("TENANT_KEY_CACHE_SIZE", 1024)
+)
+TENANT_KEY_CACHE_TTL = int(os.environ.get("TENANT_KEY_CACHE_TTL", 900))
+# NOTIFY channel telling every process to drop a shredded tenant's keys
+TENANT_KEYS_SHRED_CHANNEL = "tenant_keys_shredded"
+
+# background key rotation / re-encryption jobs, rate limit in rows/second
+KEY_ROTATION_BATCH_SIZE = int(
+    os.environ.get("KEY_ROTATION_BATCH_SIZE", 500)
+)
+KEY_ROTATION_RATE_LIMIT = int(
+    os.environ.get("KEY_ROTATION_RATE_LIMIT", 2000)
+)
+KEY_ROTATION_POLL_INTERVAL = 10.0
+
+# a job is claimed by one worker, another may take it over once its owner
+# saved no progress for JOB_LEASE_SECONDS (e.g. the process died)
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 300))
+
+# q= search index over log text fields: "fts" (GIN tsvector, word prefix
+# matches, no extension) or "trigram" (GIN pg_trgm, substring matches,
+# needs a role allowed to CREATE EXTENSION pg_trgm)
+LOG_SEARCH_MODE = os.environ.get("LOG_SEARCH_MODE", "fts")
+if LOG_SEARCH_MODE not in ("fts", "trigram"):
+    raise ValueError(
+        f"LOG_SEARCH_MODE must be fts or trigram, got {LOG_SEARCH_MODE}"
+    )
+
+# RANGE (timestamp) sub-partitions of every tenant partition: "none", "day"
+# or "month". Set it before audit_logs is first created, the primary key
+# then becomes (tenant_id, id, timestamp) as Postgres requires
+AUDIT_LOG_PARTITION_INTERVAL = os.environ.get(
+    "AUDIT_LOG_PARTITION_INTERVAL", "none"
+)
+if AUDIT_LOG_PARTITION_INTERVAL not in ("none", "day", "month"):
+    raise ValueError(
+        "AUDIT_LOG_PARTITION_INTERVAL must be none, day or month, got"
+        f" {AUDIT_LOG_PARTITION_INTERVAL}"
+    )
+AUDIT_LOG_PARTITIONS_AHEAD = int(
+    os.environ.get("AUDIT_LOG_PARTITIONS_AHEAD", 3)
+)
+PARTITION_MAINTENANCE_INTERVAL = 3600.0
+
+# background retention jobs: rows per DELETE batch, pause between batches
+# and how often tenant retention policies are turned into jobs
+RETENTION_BATCH_SIZE = int(
+    os.environ.get("RETENTION_BATCH_SIZE", 5000)
+)
+RETENTION_BATCH_SLEEP = float(
+    os.environ.get("RETENTION_BATCH_SLEEP", 0.2)
+)
+RETENTION_SCHEDULE_INTERVAL = float(
+    os.environ.get("RETENTION_SCHEDULE_INTERVAL", 3600)
+)
+RETENTION_POLL_INTERVAL = 5.0
+
+# per-minute log rollups are compacted into hourly ones once older than
+# ROLLUP_MINUTE_RETENTION_HOURS, /stats/timeseries answers at most
+# TIMESERIES_MAX_POINTS buckets per request
+ROLLUP_MINUTE_RETENTION_HOURS = int(
+    os.environ.get("ROLLUP_MINUTE_RETENTION_HOURS", 48)
+)
+ROLLUP_COMPACTION_INTERVAL = 600.0
+TIMESERIES_MAX_POINTS = int(
+    os.environ.get("TIMESERIES_MAX_POINTS", 1500)
+)
+
+# in-process /stats cache, entries also drop on every local write
+STATS_CACHE_SIZE = int(os.environ.get("STATS_CACHE_SIZE", 10000))
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", 5))
+
+# in-process ring of each tenant's newest logs for head-of-list reads,
+# holding up to RECENT_LOGS_SIZE x RECENT_LOGS_MAX_TENANTS logs
+RECENT_LOGS_SIZE = int(os.environ.get("RECENT_LOGS_SIZE", 100))
+RECENT_LOGS_MAX_TENANTS = int(
+    os.environ.get("RECENT_LOGS_MAX_TENANTS", 1000)
+)
+RECENT_LOGS_TTL = float(os.environ.get("RECENT_LOGS_TTL", 30))
+
+# fan-out of new logs to /logs/stream sockets, across processes via
+# LISTEN/NOTIFY on one dedicated connection per process
+LOG_HUB_NOTIFY_ENABLED = (
+    os.environ.get("LOG_HUB_NOTIFY_ENABLED", "true").lower() == "true"
+)
+LOG_HUB_MAX_PENDING = int(os.environ.get("LOG_HUB_MAX_PENDING", 100))
+LOG_HUB_CHANNEL = "audit_log_inserts"
+# NOTIFY payloads must stay under 8000 bytes, channel name aside
+LOG_HUB_NOTIFY_IDS = 100
+LOG_HUB_NOTIFY_BYTES = 7500
+LOG_HUB_RECONNECT_INTERVAL = 5.0
+
+# logs of a /logs/stream view, and most logs replayed on resume
+LOG_STREAM_VIEW_SIZE = 10
+LOG_STREAM_RESUME_LIMIT = int(
+    os.environ.get("LOG_STREAM_RESUME_LIMIT", 1000)
+)
+
+# frames queued for one /logs/stream socket, a producer waits up to
+# WS_SEND_TIMEOUT for room (or a send to finish) before it is dropped
+WS_OUTBOUND_QUEUE_SIZE = int(
+    os.environ.get("WS_OUTBOUND_QUEUE_SIZE", 256)
+)
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", 10))
+# chat queries a socket may have waiting for the agent
+WS_CHAT_QUEUE_SIZE = 4
+
+# longest client supplied log id, ids travel in NOTIFY payloads
+LOG_ID_MAX_LENGTH = 255
+
+# ids accepted by one POST /logs/batch-get
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", 5000))
+
+# streaming CSV export, rows fetched per server-side cursor round trip
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 2000))
+EXPORT_GZIP_LEVEL = 6
+
+# background Parquet exports, one row group per server-side cursor batch.
+# Any instance may run a job and any may serve its download, so with more
+# than one API instance EXPORT_DIR must be storage they all share
+EXPORT_DIR = Path(
+    os.environ.get("EXPORT_DIR") or Path(BASE_DIR, "exports")
+)
+EXPORT_ROW_GROUP_SIZE = int(
+    os.environ.get("EXPORT_ROW_GROUP_SIZE", 50000)
+)
+EXPORT_FILE_TTL_HOURS = int(
+    os.environ.get("EXPORT_FILE_TTL_HOURS", 24)
+)
+EXPORT_POLL_INTERVAL = 5.0
 
 DB_HOST = os.environ.get("DBHOST", None)
 DB_PORT = os.environ.get("DBPORT", None)
@@ -34,6 +241,8 @@ DB_USER = os.environ.get("DBUSER", None)
 DB_PASSWORD = os.environ.get("DBPASSWORD", None)
 DB_NAME = os.environ.get("DBNAME", None)
 AUDIT_USER_DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
 
 PANDAS_API_KEY = os.environ.get("PANDAS_API_KEY", None)
 PAI_KEY = os.environ.get("PAI_KEY", None)
@@ -1,5 +1,6 @@
 from core.database.CRUD.creation import PGCreation
 from core.database.CRUD.retrieve import PGRetrieve
 from core.database.CRUD.deletion import PGDeletion
+from core.database.CRUD.update import PGUpdate
 
-__all__ = ["PGCreation", "PGRetrieve", "PGDeletion"]
+__all__ = ["PGCreation", "PGRetrieve", "PGDeletion", "PGUpdate"]
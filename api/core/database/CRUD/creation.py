@@ -1,17 +1,55 @@
-from core.config import VIETNAM_TZ, logger
+from core.config import (
+    VIETNAM_TZ,
+    META_DATA_FORMAT,
+    TENANT_KEYS_ENABLED,
+    LOG_HUB_NOTIFY_ENABLED,
+    LOG_HUB_CHANNEL,
+    logger,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
+from datetime import datetime, timezone
 from core.schemas.v1.session import SessionTable, Session
-from core.schemas.v1.logs import AuditLogTable, AuditLog
-from core.schemas.v1.tenant import Tenant, TenantTable
+from core.schemas.v1.logs import (
+    AuditLogTable,
+    AuditLog,
+    LogWriteResult,
+    AUDIT_LOG_KEY_COLUMNS,
+    as_aware,
+)
+from core.database.partition import PGPartition
+from core.database.counter import PGCounter
+from core.database.rollup import PGRollup
+from core.schemas.v1.tenant import Tenant, TenantTable, TenantKeyTable
 from core.schemas.v1.user import User, UserTable
 import asyncpg
 import traceback
-from sqlalchemy import text
+from sqlalchemy import LargeBinary, text, select, update, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
-from core.services.security import SecurityService
-from typing import List
+from core.services.security import SecurityService, TENANT_KEYS
+from core.services.dedup import DEDUP_FILTER
+from core.services.stats_cache import STATS_CACHE
+from core.services.recent_logs import RECENT_LOGS
+from core.services.log_hub import LOG_HUB
+from typing import Dict, List, Set, Tuple
+from collections import defaultdict, Counter
+from core.schemas.v1.enum import SeverityEnum, TenantKeyStatusEnum
+import json
 from core.schemas.v1.chat import Conversation, ConverationTable
+from core.schemas.v1.job import (
+    KeyRotationJob,
+    KeyRotationJobTable,
+    RetentionJob,
+    RetentionJobTable,
+    ExportJob,
+    ExportJobTable,
+)
+
+AUDIT_LOG_COLUMNS = [c.name for c in AuditLogTable.__table__.columns]
+AUDIT_LOG_JSON_COLUMNS = ("before_state", "after_state")
+
+# (tenant_id, id), the idempotency key of an audit log
+LogKey = Tuple[str, str]
 
 
 class PGCreation:
@@ -21,12 +59,10 @@ class PGCreation:
     async def ensure_tenant_partition(self, tenant_id: str):
         try:
             """Initi tenant partition table for audit_logs"""
-            partition_name = f"audit_logs_{tenant_id}"
-            sql = f"""
-            CREATE TABLE IF NOT EXISTS "{partition_name}"
-            PARTITION OF audit_logs FOR VALUES IN ('{tenant_id}');
-            """
-            await self.db.execute(text(sql))
+            await PGPartition(self.db).create_tenant_partition(
+                tenant_id
+            )
+            await self.db.commit()
         except Exception:
             logger.error(
                 f"Error when ensuring tenant partition for {tenant_id}: {traceback.format_exc()}"
@@ -34,107 +70,481 @@ class PGCreation:
             await self.db.rollback()
             return None
 
-    async def create_bulk_logs(
-        self,
-        logs: list[AuditLog],
-        tenant_id: str,
-        user_id: str,
-    ) -> list[AuditLog]:
+    async def ensure_tenant_key(self, tenant_id: str):
+        """
+        Make sure the active data key of a tenant is in TENANT_KEYS,
+        creating version 1 on first use. Encryption falls back to
+        DATA_ENCRYPTION_KEY (v1 envelopes) while no key is cached, which
+        is also how a crypto-shredded tenant's later logs are written:
+        it never gets a key again. Raises if the key cannot be loaded.
+        """
+        if (
+            not TENANT_KEYS_ENABLED
+            or TENANT_KEYS.active_version(tenant_id)
+            or TENANT_KEYS.is_shredded(tenant_id)
+        ):
+            return
         try:
-            entries = []
-            for log in logs:
-                data = log.model_dump(exclude_none=True)
-                data.update(
-                    {
-                        "tenant_id": tenant_id,
-                        "user_id": user_id,
-                    }
+            query = (
+                select(TenantKeyTable)
+                .where(
+                    TenantKeyTable.tenant_id == tenant_id,
+                    TenantKeyTable.status
+                    == TenantKeyStatusEnum.ACTIVE,
+                )
+                .order_by(TenantKeyTable.version.desc())
+                .limit(1)
+            )
+            key = (await self.db.execute(query)).scalar_one_or_none()
+            if key is None:
+                # no insert once the tenant's keys were shredded
+                wrapped_key = SecurityService().new_tenant_key(
+                    tenant_id, 1
                 )
-                data.setdefault("timestamp", datetime.now(VIETNAM_TZ))
-                if data.get("meta_data"):
-                    data.update(
-                        {
-                            "meta_data": SecurityService().encrypt_field(
-                                data.get("meta_data")
-                            )
-                        }
+                await self.db.execute(
+                    pg_insert(TenantKeyTable)
+                    .from_select(
+                        [
+                            "tenant_id",
+                            "version",
+                            "wrapped_key",
+                            "status",
+                        ],
+                        select(
+                            TenantTable.id,
+                            literal(1),
+                            literal(wrapped_key, LargeBinary),
+                            literal(TenantKeyStatusEnum.ACTIVE.value),
+                        ).where(
+                            TenantTable.id == tenant_id,
+                            TenantTable.keys_shredded_at.is_(None),
+                        ),
                     )
-                entries.append(AuditLogTable(**data))
+                    .on_conflict_do_nothing()
+                )
+                await self.db.commit()
+                # re-read, a concurrent request may have won the insert
+                key = (
+                    await self.db.execute(query)
+                ).scalar_one_or_none()
+                if key is None:
+                    if await self.is_tenant_shredded(tenant_id):
+                        TENANT_KEYS.shred(tenant_id)
+                    return
 
-            self.db.add_all(entries)
+            SecurityService().load_tenant_key(
+                tenant_id, key.version, key.wrapped_key, active=True
+            )
             await self.db.commit()
 
-            for entry in entries:
-                await self.db.refresh(entry)
-            return logs
-
-        except asyncpg.exceptions.InvalidTextRepresentationError as e:
+        except Exception:
+            # rows written under DATA_ENCRYPTION_KEY instead would stay
+            # readable after a shred, fail the write
             logger.error(
-                f"Invalid enum value error when creating bulk logs: {traceback.format_exc()}"
+                f"Error when ensuring tenant key for {tenant_id}: {traceback.format_exc()}"
             )
             await self.db.rollback()
-            return None
+            raise
 
-        except SQLAlchemyError as e:
-            logger.error(
-                f"Database error when creating bulk logs: {traceback.format_exc()}"
+    async def is_tenant_shredded(self, tenant_id: str) -> bool:
+        shredded_at = await self.db.execute(
+            select(TenantTable.keys_shredded_at).where(
+                TenantTable.id == tenant_id
             )
-            await self.db.rollback()
-            return None
+        )
+        return shredded_at.scalar_one_or_none() is not None
 
-        except Exception as e:
+    async def rotate_tenant_key(self, tenant_id: str) -> int:
+        """
+        Retire the active data key of a tenant and activate a new version.
+        Existing rows keep decrypting with their retired version. The
+        tenant row is locked, so concurrent rotations run one after the
+        other; a crypto-shredded tenant is never given a key again.
+        """
+        try:
+            tenant = await self.db.execute(
+                select(TenantTable.keys_shredded_at)
+                .where(TenantTable.id == tenant_id)
+                .with_for_update()
+            )
+            if tenant.one().keys_shredded_at is not None:
+                raise ValueError(
+                    f"Keys of tenant {tenant_id} are shredded"
+                )
+            current = await self.db.execute(
+                select(func.max(TenantKeyTable.version)).where(
+                    TenantKeyTable.tenant_id == tenant_id
+                )
+            )
+            version = (current.scalar() or 0) + 1
+            await self.db.execute(
+                update(TenantKeyTable)
+                .where(
+                    TenantKeyTable.tenant_id == tenant_id,
+                    TenantKeyTable.status
+                    == TenantKeyStatusEnum.ACTIVE,
+                )
+                .values(status=TenantKeyStatusEnum.RETIRED)
+            )
+            wrapped_key = SecurityService().new_tenant_key(
+                tenant_id, version
+            )
+            self.db.add(
+                TenantKeyTable(
+                    tenant_id=tenant_id,
+                    version=version,
+                    wrapped_key=wrapped_key,
+                    status=TenantKeyStatusEnum.ACTIVE,
+                )
+            )
+            await self.db.commit()
+
+            SecurityService().load_tenant_key(
+                tenant_id, version, wrapped_key, active=True
+            )
+            return version
+
+        except Exception:
             logger.error(
-                f"Error when creating bulk logs: {traceback.format_exc()}"
+                f"Error when rotating tenant key for {tenant_id}: {traceback.format_exc()}"
             )
             await self.db.rollback()
             return None
 
-    async def create_new_log(
-        self,
+    @staticmethod
+    def prepare_log_row(
         log: AuditLog,
         tenant_id: str,
         user_id: str,
-    ) -> AuditLog:
-        try:
-            data = log.model_dump(exclude_none=True)
-            data.update({"tenant_id": tenant_id, "user_id": user_id})
-            if data.get("meta_data"):
-                data.update(
-                    {
-                        "meta_data": SecurityService().encrypt_field(
-                            data.get("meta_data")
-                        )
-                    }
+        encrypt: bool = True,
+    ) -> dict:
+        """Turn an AuditLog into an audit_logs row with meta_data encrypted"""
+        data = log.model_dump(exclude_none=True)
+        data.update({"tenant_id": tenant_id, "user_id": user_id})
+        data.setdefault("timestamp", datetime.now(VIETNAM_TZ))
+        data.setdefault("severity", SeverityEnum.INFO)
+        if encrypt and data.get("meta_data"):
+            security = SecurityService()
+            if META_DATA_FORMAT == "bytea":
+                data["meta_data_bin"] = security.encrypt_envelope(
+                    data.pop("meta_data"), tenant_id=tenant_id
                 )
+            else:
+                data["meta_data"] = security.encrypt_field(
+                    data["meta_data"]
+                )
+        return data
 
-            data.setdefault("timestamp", datetime.now(VIETNAM_TZ))
-            entry = AuditLogTable(**data)
-            self.db.add(entry)
-            await self.db.commit()
-            await self.db.refresh(entry)
-            return log
+    @staticmethod
+    async def prepare_log_rows(
+        entries: List[Tuple[AuditLog, str, str]],
+    ) -> List[dict]:
+        """Batch prepare_log_row, meta_data is encrypted in one encrypt_many"""
+        rows = [
+            PGCreation.prepare_log_row(
+                log=log,
+                tenant_id=tenant_id,
+                user_id=user_id,
+                encrypt=False,
+            )
+            for log, tenant_id, user_id in entries
+        ]
+        envelope = META_DATA_FORMAT == "bytea"
+        encrypted = await SecurityService().encrypt_many(
+            [row.get("meta_data") for row in rows],
+            envelope=envelope,
+            tenant_ids=[row["tenant_id"] for row in rows],
+        )
+        for row, meta_data in zip(rows, encrypted):
+            if not meta_data:
+                continue
+            if envelope:
+                row.pop("meta_data")
+                row["meta_data_bin"] = meta_data
+            else:
+                row["meta_data"] = meta_data
+        return rows
 
-        except asyncpg.exceptions.InvalidTextRepresentationError as e:
+    @staticmethod
+    def mark_duplicates(
+        keys: List[LogKey], duplicates: List[LogKey]
+    ) -> List[bool]:
+        """
+        Flag which submitted keys were duplicates. Within a batch the
+        first occurrence of a key is the one written, so repeats are
+        matched from the end.
+        """
+        pending = Counter(duplicates)
+        flags = []
+        for key in reversed(keys):
+            flags.append(pending[key] > 0)
+            pending[key] -= 1
+        return flags[::-1]
+
+    async def copy_log_rows(self, tenant_id: str, rows: List[dict]):
+        """
+        Binary COPY prepared rows into the tenant partition of audit_logs,
+        falls back to the parent table when the partition is missing.
+        The lookup also opens the session transaction the COPY joins.
+        """
+        partition_name = f"audit_logs_{tenant_id}"
+        result = await self.db.execute(
+            text("SELECT to_regclass(:name)"),
+            {"name": f'"{partition_name}"'},
+        )
+        target = (
+            partition_name
+            if result.scalar()
+            else AuditLogTable.__tablename__
+        )
+        records = [
+            tuple(
+                (
+                    json.dumps(row.get(column))
+                    if column in AUDIT_LOG_JSON_COLUMNS
+                    and row.get(column) is not None
+                    else row.get(column)
+                )
+                for column in AUDIT_LOG_COLUMNS
+            )
+            for row in rows
+        ]
+        conn = await self.db.connection()
+        raw_conn = await conn.get_raw_connection()
+        await raw_conn.driver_connection.copy_records_to_table(
+            target, records=records, columns=AUDIT_LOG_COLUMNS
+        )
+
+    async def upsert_log_rows(self, rows: List[dict]) -> List[LogKey]:
+        """
+        INSERT ... ON CONFLICT DO NOTHING on (tenant_id, id), returns
+        the keys of rows that were already stored. Does not commit.
+        """
+        result = await self.db.execute(
+            pg_insert(AuditLogTable)
+            .on_conflict_do_nothing(
+                index_elements=list(AUDIT_LOG_KEY_COLUMNS)
+            )
+            .returning(AuditLogTable.tenant_id, AuditLogTable.id),
+            [
+                {
+                    column: row.get(column)
+                    for column in AUDIT_LOG_COLUMNS
+                }
+                for row in rows
+            ],
+        )
+        inserted = set(result.all())
+        return [
+            (row["tenant_id"], row["id"])
+            for row in rows
+            if (row["tenant_id"], row["id"]) not in inserted
+        ]
+
+    async def write_log_rows(
+        self,
+        fresh_rows: List[dict],
+        seen_rows: List[dict],
+        published: bool = True,
+    ) -> List[LogKey]:
+        """COPY fresh rows, upsert possibly seen rows, count them into counters
+        and rollups, NOTIFY their ids to the LOG_HUB listeners, then commit.
+        `published` tells whether the caller publishes them to LOG_HUB itself.
+        """
+        rows_by_tenant = defaultdict(list)
+        for row in fresh_rows:
+            rows_by_tenant[row["tenant_id"]].append(row)
+        for tenant_id, tenant_rows in rows_by_tenant.items():
+            await self.copy_log_rows(tenant_id, tenant_rows)
+
+        duplicates = (
+            await self.upsert_log_rows(seen_rows) if seen_rows else []
+        )
+        stored = set(duplicates)
+        inserted = fresh_rows + [
+            row
+            for row in seen_rows
+            if (row["tenant_id"], row["id"]) not in stored
+        ]
+        await PGCounter(self.db).apply(PGCounter.count_rows(inserted))
+        await PGRollup(self.db).apply(PGRollup.count_rows(inserted))
+        if LOG_HUB_NOTIFY_ENABLED and inserted:
+            # delivered on commit, so listeners only hear of stored logs
+            await self.db.execute(
+                text(
+                    """
+                    SELECT pg_notify(:channel, payload)
+                    FROM unnest(CAST(:payloads AS text[])) AS payload
+                    """
+                ),
+                {
+                    "channel": LOG_HUB_CHANNEL,
+                    "payloads": LOG_HUB.notify_payloads(
+                        inserted, published
+                    ),
+                },
+            )
+        await self.db.commit()
+        return duplicates
+
+    async def insert_log_rows(
+        self,
+        rows: List[dict],
+        logs: List[AuditLog] = None,
+        raise_errors: bool = False,
+    ) -> List[LogKey]:
+        """
+        Write prepared audit_logs rows idempotently with a single COMMIT.
+        The client supplied `id` is the idempotency key: ids the dedup
+        filter has never seen take the binary COPY path, the rest go
+        through INSERT ... ON CONFLICT DO NOTHING. A COPY that still hits
+        an existing key (written by another process) is redone as upsert.
+
+        `logs` are the plaintext AuditLogs the rows were prepared from,
+        the written ones go into RECENT_LOGS and LOG_HUB; without them the
+        tenants' rings are dropped and the LOG_HUB listener reads the
+        logs back instead.
+
+        Returns:
+            List[LogKey]: (tenant_id, id) of rows already stored,
+            in batch repeats included; None if the write failed, or the
+            error is raised with `raise_errors`
+        """
+        unique_rows, duplicates, keys = [], [], set()
+        for row in rows:
+            key = (row["tenant_id"], row["id"])
+            if key in keys:
+                duplicates.append(key)
+                continue
+            keys.add(key)
+            unique_rows.append(row)
+        if not unique_rows:
+            return duplicates
+
+        fresh_rows, seen_rows = [], []
+        for row in unique_rows:
+            if DEDUP_FILTER.might_contain(row["tenant_id"], row["id"]):
+                seen_rows.append(row)
+            else:
+                fresh_rows.append(row)
+
+        try:
+            published = logs is not None
+            try:
+                stored = await self.write_log_rows(
+                    fresh_rows, seen_rows, published
+                )
+            except asyncpg.exceptions.UniqueViolationError:
+                await self.db.rollback()
+                stored = await self.write_log_rows(
+                    [], unique_rows, published
+                )
+            except Exception:
+                logger.warning(
+                    f"COPY of log rows failed, fallback to INSERT: {traceback.format_exc()}"
+                )
+                await self.db.rollback()
+                stored = await self.write_log_rows(
+                    [], unique_rows, published
+                )
+
+        except SQLAlchemyError:
             logger.error(
-                f"Invalid enum value error when creating log: {traceback.format_exc()}"
+                f"Database error when inserting log rows: {traceback.format_exc()}"
             )
             await self.db.rollback()
+            if raise_errors:
+                raise
             return None
 
-        except SQLAlchemyError as e:
+        except Exception:
             logger.error(
-                f"Database error when creating log: {traceback.format_exc()}"
+                f"Error when inserting log rows: {traceback.format_exc()}"
             )
             await self.db.rollback()
+            if raise_errors:
+                raise
             return None
 
+        ids_by_tenant = defaultdict(list)
+        for tenant_id, log_id in keys:
+            ids_by_tenant[tenant_id].append(log_id)
+        written = self.written_logs(rows, logs, set(stored))
+        for tenant_id, log_ids in ids_by_tenant.items():
+            DEDUP_FILTER.add(tenant_id, log_ids)
+            STATS_CACHE.bump(tenant_id)
+            if logs is None:
+                RECENT_LOGS.invalidate(tenant_id)
+            else:
+                RECENT_LOGS.add(tenant_id, written[tenant_id])
+                LOG_HUB.publish(tenant_id, written[tenant_id])
+        return duplicates + stored
+
+    @staticmethod
+    def written_logs(
+        rows: List[dict], logs: List[AuditLog], stored: Set[LogKey]
+    ) -> Dict[str, List[AuditLog]]:
+        """Logs of a batch actually inserted, as read back, by tenant"""
+        written, seen = defaultdict(list), set()
+        for row, log in zip(rows, logs or []):
+            key = (row["tenant_id"], row["id"])
+            if key in stored or key in seen:
+                continue
+            seen.add(key)
+            written[row["tenant_id"]].append(
+                log.model_copy(
+                    update={
+                        "timestamp": as_aware(
+                            row["timestamp"]
+                        ).astimezone(timezone.utc),
+                        "severity": row["severity"],
+                    }
+                )
+            )
+        return written
+
+    async def create_bulk_logs(
+        self,
+        logs: list[AuditLog],
+        tenant_id: str,
+        user_id: str,
+    ) -> LogWriteResult:
+        try:
+            await self.ensure_tenant_key(tenant_id)
+            rows = await self.prepare_log_rows(
+                [(log, tenant_id, user_id) for log in logs]
+            )
+            duplicates = await self.insert_log_rows(rows, logs=logs)
+            if duplicates is None:
+                return None
+            flags = self.mark_duplicates(
+                [(tenant_id, log.id) for log in logs], duplicates
+            )
+            return LogWriteResult(
+                logs=[log for log, dup in zip(logs, flags) if not dup],
+                duplicates=[
+                    log.id for log, dup in zip(logs, flags) if dup
+                ],
+            )
+
         except Exception as e:
             logger.error(
-                f"Error when creating log: {traceback.format_exc()}"
+                f"Error when creating bulk logs: {traceback.format_exc()}"
             )
             await self.db.rollback()
             return None
 
+    async def create_new_log(
+        self,
+        log: AuditLog,
+        tenant_id: str,
+        user_id: str,
+    ) -> LogWriteResult:
+        """Write one log, a retried id comes back in `duplicates`"""
+        return await self.create_bulk_logs(
+            logs=[log], tenant_id=tenant_id, user_id=user_id
+        )
+
     async def create_new_session(
         self,
         session: Session,
@@ -213,6 +623,59 @@ class PGCreation:
             await self.db.rollback()
             return None
 
+    async def create_key_rotation_job(
+        self, job: KeyRotationJob
+    ) -> KeyRotationJob:
+        try:
+            entry = KeyRotationJobTable(
+                **job.model_dump(exclude_none=True)
+            )
+            self.db.add(entry)
+            await self.db.commit()
+            await self.db.refresh(entry)
+            return KeyRotationJob.model_validate(entry)
+
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Database error when creating key rotation job: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def create_retention_job(
+        self, job: RetentionJob
+    ) -> RetentionJob:
+        try:
+            entry = RetentionJobTable(
+                **job.model_dump(exclude_none=True)
+            )
+            self.db.add(entry)
+            await self.db.commit()
+            await self.db.refresh(entry)
+            return RetentionJob.model_validate(entry)
+
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Database error when creating retention job: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def create_export_job(self, job: ExportJob) -> ExportJob:
+        try:
+            entry = ExportJobTable(**job.model_dump(exclude_none=True))
+            self.db.add(entry)
+            await self.db.commit()
+            await self.db.refresh(entry)
+            return ExportJob.model_validate(entry)
+
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Database error when creating export job: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
     async def create_bulk_conversations(
         self, tenant_id: str, conversations: List[Conversation]
     ) -> List[Conversation]:
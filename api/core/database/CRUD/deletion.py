@@ -1,31 +1,87 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timedelta
-from core.config import VIETNAM_TZ
+from datetime import datetime
 from core.schemas.v1.logs import AuditLogTable
-from sqlalchemy import delete
-from core.config import logger
+from core.schemas.v1.tenant import TenantKeyTable, TenantTable
+from core.database.counter import PGCounter
+from core.services.security import TENANT_KEYS
+from core.services.recent_logs import RECENT_LOGS
+from collections import Counter
+from sqlalchemy import delete, func, select, tuple_, update
+from core.config import (
+    TENANT_KEYS_SHRED_CHANNEL,
+    logger,
+)
 
 class PGDeletion:
     def __init__(self, db: AsyncSession):
         self.db: AsyncSession = db
 
-    async def cleanup_old_logs(
-        self, tenant_id: str, retention_hours: int
+    async def delete_expired_logs_batch(
+        self, tenant_id: str, cutoff: datetime, batch_size: int
     ) -> int:
+        """
+        Delete at most `batch_size` logs of a tenant older than `cutoff`,
+        so locks and WAL stay bounded, and takes them off the log counters.
+        Does not commit, the caller commits with its job progress.
+        """
+        batch = (
+            select(AuditLogTable.tenant_id, AuditLogTable.id)
+            .where(
+                AuditLogTable.tenant_id == tenant_id,
+                AuditLogTable.timestamp < cutoff,
+            )
+            .limit(batch_size)
+            .cte("batch")
+        )
+        query = delete(AuditLogTable).where(
+            AuditLogTable.tenant_id == tenant_id,
+            AuditLogTable.timestamp < cutoff,
+            tuple_(AuditLogTable.tenant_id, AuditLogTable.id).in_(
+                select(batch.c.tenant_id, batch.c.id)
+            ),
+        )
+        result = await self.db.execute(
+            query.returning(
+                AuditLogTable.severity, AuditLogTable.action_type
+            )
+        )
+        deleted = Counter(result.all())
+        await PGCounter(self.db).subtract(
+            tenant_id,
+            [(*key, count) for key, count in deleted.items()],
+        )
+        return sum(deleted.values())
+
+    async def delete_tenant_keys(self, tenant_id: str) -> int:
+        """
+        Crypto-shred a tenant: drop its data keys so its envelope-encrypted
+        meta_data can no longer be decrypted, without touching audit_logs.
+        The tenant is tombstoned so it never gets a key again, and the
+        other processes drop their cached keys on the NOTIFY.
+        """
         try:
-            """Clean up `retention days` logs based on tenant_id"""
-            cutoff_date = datetime.now(VIETNAM_TZ) - timedelta(
-                hours=retention_hours
+            await self.db.execute(
+                update(TenantTable)
+                .where(TenantTable.id == tenant_id)
+                .values(keys_shredded_at=func.now())
             )
-            query = delete(AuditLogTable).where(
-                AuditLogTable.tenant_id == tenant_id,
-                AuditLogTable.timestamp < cutoff_date,
+            result = await self.db.execute(
+                delete(TenantKeyTable).where(
+                    TenantKeyTable.tenant_id == tenant_id
+                )
+            )
+            await self.db.execute(
+                select(
+                    func.pg_notify(TENANT_KEYS_SHRED_CHANNEL, tenant_id)
+                )
             )
-            result = await self.db.execute(query)
             await self.db.commit()
+            TENANT_KEYS.shred(tenant_id)
+            RECENT_LOGS.invalidate(tenant_id)
             return int(result.rowcount)
         except Exception as e:
             logger.error(
-                f"Error during cleanup_old_logs for tenant {tenant_id}: {e}"
+                f"Error during delete_tenant_keys for tenant {tenant_id}: {e}"
             )
             await self.db.rollback()
+            return None
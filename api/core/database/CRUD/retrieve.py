@@ -1,21 +1,69 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.schemas.v1.tenant import TenantTable, Tenant
+from core.schemas.v1.tenant import (
+    TenantTable,
+    Tenant,
+    TenantKeyTable,
+    RetentionPolicy,
+    RetentionPolicyTable,
+)
 from core.schemas.v1.user import UserTable, User
-from core.schemas.v1.logs import AuditLogTable, AuditLog
-from typing import List, Tuple
-from sqlalchemy import select
+from core.schemas.v1.logs import (
+    AuditLogTable,
+    AuditLog,
+    PartialAuditLog,
+    LogCursor,
+    LogFilter,
+    LogTimeseries,
+    LogTimeseriesSeries,
+    LOG_SEARCH_DOCUMENT,
+    truncate_bucket,
+    as_aware,
+)
+from typing import AsyncIterator, List, Set, Tuple
+from sqlalchemy import (
+    select,
+    text,
+    tuple_,
+    literal_column,
+    cast,
+    Text,
+    String,
+    any_,
+    bindparam,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql import func
 from core.schemas.v1.enum import (
     SeverityEnum,
     ActionTypeEnum,
     LogStatsEnum,
+    TenantKeyStatusEnum,
+    JobStatusEnum,
 )
 from core.schemas.v1.logs import LogStats
+from core.database.counter import PGCounter
+from core.database.rollup import PGRollup
 from datetime import datetime, timedelta
-from core.config import VIETNAM_TZ
+from core.config import (
+    VIETNAM_TZ,
+    LOG_SEARCH_MODE,
+    TENANT_KEYS_ENABLED,
+    EXPORT_BATCH_SIZE,
+)
 from core.schemas.v1.enum import SeverityEnum
-from core.services.security import SecurityService
+from core.services.security import SecurityService, TENANT_KEYS
+from core.services.stats_cache import STATS_CACHE
+from core.services.recent_logs import RECENT_LOGS
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from core.schemas.v1.chat import ConverationTable, Conversation
+from core.schemas.v1.job import (
+    KeyRotationJob,
+    KeyRotationJobTable,
+    RetentionJob,
+    RetentionJobTable,
+    ExportJob,
+    ExportJobTable,
+)
 from core.config import logger
 import traceback
 
@@ -32,9 +80,39 @@ class PGRetrieve:
         skip: int = None,
         limit: int = None,
         order_by_time: bool = True,
-    ) -> List[AuditLog]:
+        fields: Set[str] = None,
+        cursor: LogCursor = None,
+        filters: LogFilter = None,
+        log_ids: List[str] = None,
+        after: LogCursor = None,
+        raise_errors: bool = False,
+    ) -> List[AuditLog | PartialAuditLog]:
+        """
+        Retrieve logs, with `fields` only those columns are selected and
+        PartialAuditLog is returned; meta_data is decrypted only when asked.
+        `log_ids` are matched with one `id = ANY(array)` parameter.
+        `cursor` continues after the (timestamp, id) of a previous page,
+        or after (rank, timestamp, id) when `filters.q` searches.
+        `after` instead reads forward, the logs newer than its
+        (timestamp, id) oldest first.
+        Errors come back as an empty list, unless `raise_errors` is set
+        for callers that must tell a failure from no logs. A row whose
+        meta_data fails to decrypt is returned with None, flagged by
+        `_meta_data_failed`.
+        """
         try:
-            query = select(AuditLogTable)
+            if fields is None:
+                query = select(AuditLogTable)
+            else:
+                columns = {"id", *fields}
+                if "meta_data" in fields:
+                    columns |= {"tenant_id", "meta_data_bin"}
+                query = select(
+                    *(
+                        getattr(AuditLogTable, c)
+                        for c in sorted(columns)
+                    )
+                )
             if tenant_id:
                 query = query.where(
                     AuditLogTable.tenant_id == tenant_id
@@ -43,37 +121,526 @@ class PGRetrieve:
                 query = query.where(AuditLogTable.user_id == user_id)
             if log_id:
                 query = query.where(AuditLogTable.id == log_id)
+            if log_ids:
+                query = query.where(
+                    AuditLogTable.id
+                    == any_(
+                        bindparam(
+                            "log_ids", log_ids, type_=ARRAY(String)
+                        )
+                    )
+                )
 
-            if order_by_time:
-                query = query.order_by(AuditLogTable.timestamp.desc())
+            query = self.filter_logs(query, filters)
+            search_rank = None
+            if filters and filters.q:
+                search_match, search_rank = self.search_clause(
+                    filters.q
+                )
+                query = query.where(search_match).add_columns(
+                    search_rank.label("search_rank")
+                )
+
+            if cursor and search_rank is not None:
+                query = query.where(
+                    tuple_(
+                        search_rank,
+                        AuditLogTable.timestamp,
+                        AuditLogTable.id,
+                    )
+                    < tuple_(cursor.rank, cursor.timestamp, cursor.id)
+                )
+            elif cursor:
+                query = query.where(
+                    tuple_(AuditLogTable.timestamp, AuditLogTable.id)
+                    < tuple_(cursor.timestamp, cursor.id)
+                )
+            if after:
+                query = query.where(
+                    tuple_(AuditLogTable.timestamp, AuditLogTable.id)
+                    > tuple_(after.timestamp, after.id)
+                )
+
+            if search_rank is not None:
+                query = query.order_by(
+                    search_rank.desc(),
+                    AuditLogTable.timestamp.desc(),
+                    AuditLogTable.id.desc(),
+                )
+            elif after:
+                query = query.order_by(
+                    AuditLogTable.timestamp, AuditLogTable.id
+                )
+            elif order_by_time:
+                # id breaks timestamp ties so cursor pages never overlap
+                query = query.order_by(
+                    AuditLogTable.timestamp.desc(),
+                    AuditLogTable.id.desc(),
+                )
             if skip:
                 query = query.offset(skip)
             if limit:
                 query = query.limit(limit)
 
             res = await self.db.execute(query)
-            records = res.scalars().all()
+            rows = res.all()
+            ranks = [None] * len(rows)
+            if search_rank is not None:
+                ranks = [row.search_rank for row in rows]
 
-            logs: List[AuditLog] = []
-            for rec in records:
-                # rec.meta_data is a cipher text
-                raw = rec.meta_data
-                if isinstance(raw, str) and raw:
-                    try:
-                        rec.meta_data = (
-                            SecurityService().decrypt_field(raw)
-                        )
-                    except Exception:
-                        rec.meta_data = None
+            if fields is None:
+                records = [row[0] for row in rows]
+                meta_data = await self.decrypt_meta_data(records)
+                logs: List[AuditLog] = []
+                for rec, meta, rank in zip(records, meta_data, ranks):
+                    failed = isinstance(meta, Exception)
+                    rec.meta_data = None if failed else meta
+                    # convert SQLAlchemy obj → Pydantic model
+                    log = AuditLog.model_validate(rec)
+                    log._search_rank = rank
+                    log._meta_data_failed = failed
+                    logs.append(log)
+                return logs
 
-                # convert SQLAlchemy obj → Pydantic model
-                logs.append(AuditLog.model_validate(rec))
-            return logs
+            records = rows
+            meta_data = [None] * len(records)
+            if "meta_data" in fields:
+                meta_data = await self.decrypt_meta_data(records)
+            partial_logs: List[PartialAuditLog] = []
+            for rec, meta, rank in zip(records, meta_data, ranks):
+                values = {"id": rec.id}
+                for field in fields:
+                    values[field] = getattr(rec, field)
+                if "meta_data" in fields and not isinstance(
+                    meta, Exception
+                ):
+                    values["meta_data"] = meta
+                partial_log = PartialAuditLog(**values)
+                partial_log._search_rank = rank
+                partial_logs.append(partial_log)
+            return partial_logs
         except Exception:
             logger.error(
                 f"Failed to retrieve logs: {traceback.format_exc()}"
             )
             await self.db.rollback()
+            if raise_errors:
+                raise
+            return []
+
+    @staticmethod
+    def filter_logs(query, filters: LogFilter = None):
+        """Add the equality filters and time range of `filters` to a query"""
+        if not filters:
+            return query
+        for column, value in filters.equalities().items():
+            query = query.where(
+                getattr(AuditLogTable, column) == value
+            )
+        if filters.start_time:
+            query = query.where(
+                AuditLogTable.timestamp >= filters.start_time
+            )
+        if filters.end_time:
+            query = query.where(
+                AuditLogTable.timestamp < filters.end_time
+            )
+        return query
+
+    async def count_logs(
+        self, tenant_id: str, filters: LogFilter = None
+    ) -> int:
+        try:
+            query = self.filter_logs(
+                select(func.count()).where(
+                    AuditLogTable.tenant_id == tenant_id
+                ),
+                filters,
+            )
+            return (await self.db.execute(query)).scalar_one()
+        except Exception:
+            logger.error(
+                f"Failed to count logs of {tenant_id}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def retrieve_recent_logs(
+        self,
+        tenant_id: str,
+        limit: int,
+        fields: Set[str] = None,
+        raise_errors: bool = False,
+    ) -> List[AuditLog | PartialAuditLog]:
+        """
+        Newest `limit` logs of a tenant from RECENT_LOGS, a miss reads the
+        whole ring in one query and keeps it. None when limit exceeds it.
+        """
+        if limit > RECENT_LOGS.size:
+            return None
+        logs = RECENT_LOGS.get(tenant_id, limit)
+        if logs is None:
+            version = RECENT_LOGS.start_fill(tenant_id)
+            kept = None
+            try:
+                logs = await self.retrieve_logs(
+                    tenant_id=tenant_id,
+                    limit=RECENT_LOGS.size,
+                    raise_errors=raise_errors,
+                )
+                # errors also come back empty, so nothing is kept then,
+                # nor logs whose meta_data could not be decrypted
+                if logs and not any(
+                    log._meta_data_failed for log in logs
+                ):
+                    kept = logs
+            finally:
+                RECENT_LOGS.fill(tenant_id, kept, version)
+            logs = logs[:limit]
+
+        if fields is None:
+            return logs
+        return [
+            PartialAuditLog(
+                **{
+                    field: getattr(log, field)
+                    for field in {"id", *fields}
+                }
+            )
+            for log in logs
+        ]
+
+    async def stream_logs(
+        self,
+        tenant_id: str,
+        columns: List[str],
+        filters: LogFilter = None,
+        batch_size: int = EXPORT_BATCH_SIZE,
+    ) -> AsyncIterator[List[tuple]]:
+        """
+        Stream a tenant's logs newest first through a server-side cursor,
+        `batch_size` rows per round trip, as tuples of `columns` with
+        meta_data decrypted. Errors are raised rather than swallowed so a
+        broken stream is not mistaken for its end.
+        """
+        selected = {
+            *columns,
+            "tenant_id",
+            "meta_data",
+            "meta_data_bin",
+        }
+        query = select(
+            *(getattr(AuditLogTable, c) for c in sorted(selected))
+        ).where(AuditLogTable.tenant_id == tenant_id)
+        query = (
+            self.filter_logs(query, filters)
+            .order_by(
+                AuditLogTable.timestamp.desc(), AuditLogTable.id.desc()
+            )
+            .execution_options(yield_per=batch_size)
+        )
+
+        try:
+            res = await self.db.stream(query)
+            async for records in res.partitions():
+                meta_data = await self.decrypt_meta_data(records)
+                errors = [
+                    m for m in meta_data if isinstance(m, Exception)
+                ]
+                if errors:
+                    # a partial export must not pass for a complete one
+                    raise errors[0]
+                yield [
+                    tuple(
+                        meta if c == "meta_data" else getattr(rec, c)
+                        for c in columns
+                    )
+                    for rec, meta in zip(records, meta_data)
+                ]
+        except Exception:
+            logger.error(
+                f"Failed to stream logs of {tenant_id}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            raise
+
+    @staticmethod
+    def search_clause(q: str):
+        """
+        Match predicate and rank of a q= search. Both are written against
+        the same LOG_SEARCH_DOCUMENT expression as the GIN index, inlined
+        rather than bound so generic plans still match the index.
+        """
+        document = literal_column(f"({LOG_SEARCH_DOCUMENT})")
+        if LOG_SEARCH_MODE == "trigram":
+            escaped = (
+                q.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            return (
+                document.ilike(f"%{escaped}%"),
+                func.similarity(document, q),
+            )
+
+        # every word of q as a prefix, parsed like the indexed document
+        simple = literal_column("'simple'")
+        vector = literal_column(
+            f"to_tsvector('simple', {LOG_SEARCH_DOCUMENT})"
+        )
+        query = func.to_tsquery(
+            simple,
+            func.regexp_replace(
+                cast(func.plainto_tsquery(simple, q), Text),
+                "'( |$)",
+                "':*\\1",
+                "g",
+            ),
+        )
+        return vector.op("@@")(query), func.ts_rank(vector, query)
+
+    async def decrypt_meta_data(self, records) -> List[dict]:
+        """Batch decrypt meta_data of rows carrying tenant_id, meta_data and meta_data_bin"""
+        # meta_data is a bytea envelope, or base64 text on rows the
+        # background migration has not converted yet
+        ciphertexts = [
+            (
+                rec.meta_data_bin
+                if rec.meta_data_bin is not None
+                else rec.meta_data
+            )
+            for rec in records
+        ]
+        tenant_ids = [rec.tenant_id for rec in records]
+        key_versions = set()
+        for tenant_id, value in zip(tenant_ids, ciphertexts):
+            version = SecurityService.envelope_key_version(value)
+            if version:
+                key_versions.add((tenant_id, version))
+        await self.load_tenant_keys(key_versions)
+        meta_data = await SecurityService().decrypt_many(
+            ciphertexts, tenant_ids=tenant_ids
+        )
+        failed = [
+            rec.id
+            for rec, meta in zip(records, meta_data)
+            if isinstance(meta, Exception)
+        ]
+        if failed:
+            logger.error(
+                f"Failed to decrypt meta_data of {len(failed)} logs,"
+                f" e.g. {failed[:10]}"
+            )
+        return meta_data
+
+    async def load_tenant_keys(self, keys: Set[Tuple[str, int]]):
+        """
+        Unwrap the (tenant_id, version) data keys missing from TENANT_KEYS.
+        Tenants whose keys are gone because they were crypto-shredded are
+        marked as such; any other key that cannot be loaded raises, so it
+        is never mistaken for a shredded one.
+        """
+        missing = [
+            key
+            for key in keys
+            if not TENANT_KEYS.get(*key)
+            and not TENANT_KEYS.is_shredded(key[0])
+        ]
+        if not missing:
+            return
+        try:
+            res = await self.db.execute(
+                select(TenantKeyTable)
+                .join(
+                    TenantTable,
+                    TenantTable.id == TenantKeyTable.tenant_id,
+                )
+                .where(
+                    tuple_(
+                        TenantKeyTable.tenant_id,
+                        TenantKeyTable.version,
+                    ).in_(missing),
+                    # keys being shredded by a concurrent offboarding
+                    TenantTable.keys_shredded_at.is_(None),
+                )
+            )
+            security = SecurityService()
+            for key in res.scalars().all():
+                security.load_tenant_key(
+                    key.tenant_id,
+                    key.version,
+                    key.wrapped_key,
+                    # only encrypt with it when tenant keys are on
+                    active=TENANT_KEYS_ENABLED
+                    and key.status == TenantKeyStatusEnum.ACTIVE,
+                )
+
+            missing = [
+                key for key in missing if not TENANT_KEYS.get(*key)
+            ]
+            if not missing:
+                return
+            res = await self.db.execute(
+                select(TenantTable.id).where(
+                    TenantTable.id.in_({key[0] for key in missing}),
+                    TenantTable.keys_shredded_at.is_not(None),
+                )
+            )
+            shredded = set(res.scalars().all())
+            for tenant_id in shredded:
+                TENANT_KEYS.shred(tenant_id)
+            missing = [
+                key for key in missing if key[0] not in shredded
+            ]
+            if missing:
+                raise LookupError(
+                    f"Tenant keys {missing} do not exist"
+                )
+        except Exception:
+            logger.error(
+                f"Failed to load tenant keys: {traceback.format_exc()}"
+            )
+            raise
+
+    async def list_log_partitions(
+        self, tenant_id: str = None
+    ) -> List[str]:
+        """Leaf partitions of audit_logs in name order, optionally only
+        the ones that can hold rows of `tenant_id`"""
+        res = await self.db.execute(
+            text(
+                """
+                SELECT c.relname
+                FROM pg_partition_tree('audit_logs') t
+                JOIN pg_class c ON c.oid = t.relid
+                WHERE t.isleaf
+                ORDER BY c.relname
+                """
+            )
+        )
+        partitions = res.scalars().all()
+        if tenant_id:
+            # audit_logs_{tenant_id} or its time sub-partitions
+            tenant_partition = f"audit_logs_{tenant_id}"
+            partitions = [
+                name
+                for name in partitions
+                if name in (tenant_partition, "audit_logs_default")
+                or name.startswith(f"{tenant_partition}_")
+            ]
+        return partitions
+
+    async def retrieve_meta_data_batch(
+        self,
+        partition: str,
+        after: Tuple[str, str],
+        batch_size: int,
+        tenant_id: str = None,
+    ) -> list:
+        """Next rows of a partition after the (tenant_id, id) key `after`"""
+        partition = partition.replace('"', '""')
+        tenant_filter = (
+            "AND tenant_id = :tenant_id" if tenant_id else ""
+        )
+        res = await self.db.execute(
+            text(
+                f"""
+                SELECT tenant_id, id, meta_data, meta_data_bin
+                FROM "{partition}"
+                WHERE (tenant_id, id) > (:after_tenant_id, :after_id)
+                {tenant_filter}
+                ORDER BY tenant_id, id
+                LIMIT :batch_size
+                """
+            ),
+            {
+                "after_tenant_id": after[0],
+                "after_id": after[1],
+                "tenant_id": tenant_id,
+                "batch_size": batch_size,
+            },
+        )
+        return res.all()
+
+    async def retrieve_key_rotation_job(
+        self, job_id: str = None
+    ) -> KeyRotationJob:
+        return await self.retrieve_job(
+            KeyRotationJobTable, KeyRotationJob, job_id
+        )
+
+    async def retrieve_job(
+        self, table, model, job_id: str = None, tenant_id: str = None
+    ):
+        """
+        Job by id (within `tenant_id` if given), or without id the active
+        job that runs first, optionally only one of `tenant_id`. Workers
+        take jobs with PGUpdate.claim_job instead.
+        """
+        try:
+            query = select(table)
+            if tenant_id:
+                query = query.where(table.tenant_id == tenant_id)
+            if job_id:
+                query = query.where(table.id == job_id)
+            else:
+                query = (
+                    query.where(
+                        table.status.in_(
+                            [
+                                JobStatusEnum.RUNNING,
+                                JobStatusEnum.PENDING,
+                            ]
+                        )
+                    )
+                    .order_by(
+                        (table.status == JobStatusEnum.RUNNING).desc(),
+                        table.created_at,
+                    )
+                    .limit(1)
+                )
+            job = (await self.db.execute(query)).scalar_one_or_none()
+            return model.model_validate(job) if job else None
+        except Exception:
+            logger.error(
+                f"Failed to retrieve {table.__tablename__}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def retrieve_retention_job(
+        self, job_id: str = None, tenant_id: str = None
+    ) -> RetentionJob:
+        return await self.retrieve_job(
+            RetentionJobTable, RetentionJob, job_id, tenant_id
+        )
+
+    async def retrieve_export_job(
+        self, job_id: str = None, tenant_id: str = None
+    ) -> ExportJob:
+        return await self.retrieve_job(
+            ExportJobTable, ExportJob, job_id, tenant_id
+        )
+
+    async def retrieve_retention_policies(
+        self, tenant_id: str = None
+    ) -> List[RetentionPolicy]:
+        try:
+            query = select(RetentionPolicyTable)
+            if tenant_id:
+                query = query.where(
+                    RetentionPolicyTable.tenant_id == tenant_id
+                )
+            res = await self.db.execute(query)
+            return [
+                RetentionPolicy.model_validate(policy)
+                for policy in res.scalars().all()
+            ]
+        except Exception:
+            logger.error(
+                f"Failed to retrieve retention policies: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
             return []
 
     async def retrieve_tenant(
@@ -156,72 +723,116 @@ class PGRetrieve:
     async def get_logs_stats_by_tenant(
         self, tenant_id: str
     ) -> LogStats:
-        """This would return total logs have been occured in the whole time of tenent"""
+        """
+        Total logs of the tenant over its whole history, read from the
+        log_counters maintained on every write, so O(1) in its log volume
+        """
         try:
-            field_names = [
-                LogStatsEnum.TOTOL_LOGS,
-                LogStatsEnum.INFO_LOGS,
-                LogStatsEnum.WARN_LOGS,
-                LogStatsEnum.ERROR_LOGS,
-                LogStatsEnum.CRITICAL_lOGS,
-                LogStatsEnum.CREATE_LOGS,
-                LogStatsEnum.UPDATE_LOGS,
-                LogStatsEnum.DELETE_LOGS,
-                LogStatsEnum.VIEW_LOGS,
-            ]
+            counts = await PGCounter(self.db).retrieve(tenant_id)
 
-            query = select(
-                func.count().label(LogStatsEnum.TOTOL_LOGS),
-                func.count()
-                .filter(AuditLogTable.severity == SeverityEnum.INFO)
-                .label(LogStatsEnum.INFO_LOGS),
-                func.count()
-                .filter(AuditLogTable.severity == SeverityEnum.WARNING)
-                .label(LogStatsEnum.WARN_LOGS),
-                func.count()
-                .filter(AuditLogTable.severity == SeverityEnum.ERROR)
-                .label(LogStatsEnum.ERROR_LOGS),
-                func.count()
-                .filter(
-                    AuditLogTable.severity == SeverityEnum.CRITICAL
-                )
-                .label(LogStatsEnum.CRITICAL_lOGS),
-                func.count()
-                .filter(
-                    AuditLogTable.action_type == ActionTypeEnum.CREATE
+            def total(severity=None, action_type=None) -> int:
+                return sum(
+                    count
+                    for (sev, action), count in counts.items()
+                    if severity in (None, sev)
+                    and action_type in (None, action)
                 )
-                .label(LogStatsEnum.CREATE_LOGS),
-                func.count()
-                .filter(
-                    AuditLogTable.action_type == ActionTypeEnum.UPDATE
-                )
-                .label(LogStatsEnum.UPDATE_LOGS),
-                func.count()
-                .filter(
-                    AuditLogTable.action_type == ActionTypeEnum.DELETE
-                )
-                .label(LogStatsEnum.DELETE_LOGS),
-                func.count()
-                .filter(
-                    AuditLogTable.action_type == ActionTypeEnum.VIEW
-                )
-                .label(LogStatsEnum.VIEW_LOGS),
-            ).where(AuditLogTable.tenant_id == tenant_id)
 
-            result = await self.db.execute(query)
-            stats = result.fetchone()
+            return LogStats(
+                stats={
+                    LogStatsEnum.TOTOL_LOGS: total(),
+                    LogStatsEnum.INFO_LOGS: total(SeverityEnum.INFO),
+                    LogStatsEnum.WARN_LOGS: total(
+                        SeverityEnum.WARNING
+                    ),
+                    LogStatsEnum.ERROR_LOGS: total(SeverityEnum.ERROR),
+                    LogStatsEnum.CRITICAL_lOGS: total(
+                        SeverityEnum.CRITICAL
+                    ),
+                    LogStatsEnum.CREATE_LOGS: total(
+                        action_type=ActionTypeEnum.CREATE
+                    ),
+                    LogStatsEnum.UPDATE_LOGS: total(
+                        action_type=ActionTypeEnum.UPDATE
+                    ),
+                    LogStatsEnum.DELETE_LOGS: total(
+                        action_type=ActionTypeEnum.DELETE
+                    ),
+                    LogStatsEnum.VIEW_LOGS: total(
+                        action_type=ActionTypeEnum.VIEW
+                    ),
+                }
+            )
+        except Exception:
+            logger.error(
+                f"Failed to retrieve stats: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
 
-            if not stats:
-                return LogStats(stats={})
+    async def get_logs_timeseries(
+        self,
+        tenant_id: str,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+        severity: SeverityEnum = None,
+        action_type: ActionTypeEnum = None,
+        group_by: str = None,
+    ) -> LogTimeseries:
+        """
+        Zero-filled log counts per bucket from the rollup tables, one
+        series per severity or action_type when grouped by it
+        """
+        try:
+            start, end = as_aware(start), as_aware(end)
+            buckets = LogTimeseries.bucket_range(
+                granularity, start, end
+            )
+            index = {bucket: i for i, bucket in enumerate(buckets)}
+            rows = await PGRollup(self.db).retrieve_buckets(
+                tenant_id,
+                granularity,
+                start,
+                end,
+                severity,
+                action_type,
+            )
+
+            series = {}
+            for bucket, sev, action, count in rows:
+                group = (
+                    sev if group_by == "severity" else severity,
+                    (
+                        action
+                        if group_by == "action_type"
+                        else action_type
+                    ),
+                )
+                counts = series.setdefault(group, [0] * len(buckets))
+                counts[
+                    index[truncate_bucket(bucket, granularity)]
+                ] += count
 
-            stats_dict = {
-                field_names[i]: stats[i]
-                for i in range(len(field_names))
-            }
-            return LogStats(stats=stats_dict)
+            if not group_by and not series:
+                series[(severity, action_type)] = [0] * len(buckets)
+            return LogTimeseries(
+                granularity=granularity,
+                buckets=buckets,
+                series=[
+                    LogTimeseriesSeries(
+                        severity=sev, action_type=action, counts=counts
+                    )
+                    for (sev, action), counts in sorted(
+                        series.items(), key=lambda item: str(item[0])
+                    )
+                ],
+            )
+        except ValueError:
+            raise
         except Exception:
             logger.error(
-                f"Failed to retrieve stats: {traceback.format_exc()}"
+                f"Failed to retrieve timeseries: {traceback.format_exc()}"
             )
             await self.db.rollback()
             return None
@@ -298,3 +909,35 @@ class PGRetrieve:
             )
             await self.db.rollback()
             return []
+
+
+async def get_cached_stats(
+    sessionmaker: async_sessionmaker[AsyncSession], tenant_id: str
+) -> LogStats:
+    """Tenant stats through STATS_CACHE, a miss loads them on its own session"""
+
+    async def load() -> LogStats:
+        async with sessionmaker() as session:
+            return await PGRetrieve(session).get_logs_stats_by_tenant(
+                tenant_id
+            )
+
+    return await STATS_CACHE.get(tenant_id, load)
+
+
+async def stream_tenant_logs(
+    sessionmaker: async_sessionmaker[AsyncSession],
+    tenant_id: str,
+    columns: List[str],
+    filters: LogFilter = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[tuple]]:
+    """
+    PGRetrieve.stream_logs on a session of its own, held open for as long
+    as the consumer iterates, e.g. past the end of a request handler
+    """
+    async with sessionmaker() as session:
+        async for rows in PGRetrieve(session).stream_logs(
+            tenant_id, columns, filters=filters, batch_size=batch_size
+        ):
+            yield rows
@@ -0,0 +1,210 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, update, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from core.schemas.v1.tenant import (
+    TenantKeyTable,
+    RetentionPolicy,
+    RetentionPolicyTable,
+)
+from core.schemas.v1.job import (
+    KeyRotationJob,
+    KeyRotationJobTable,
+    RetentionJob,
+    RetentionJobTable,
+    ExportJob,
+    ExportJobTable,
+)
+from core.services.security import SecurityService
+from core.schemas.v1.enum import JobStatusEnum
+from core.config import JOB_LEASE_SECONDS, logger
+from datetime import timedelta
+from typing import List
+import traceback
+
+
+class PGUpdate:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def claim_job(self, table, model, owner: str):
+        """
+        Claim the job the worker should run next for `owner`: a running
+        job whose owner saved no progress for JOB_LEASE_SECONDS, else the
+        oldest pending one. Candidates are locked with SKIP LOCKED, so
+        concurrent workers never claim the same job.
+        """
+        try:
+            candidate = (
+                select(table.id)
+                .where(
+                    table.status.in_(
+                        [JobStatusEnum.RUNNING, JobStatusEnum.PENDING]
+                    ),
+                    or_(
+                        table.owner.is_(None),
+                        table.updated_at
+                        < func.now()
+                        - timedelta(seconds=JOB_LEASE_SECONDS),
+                    ),
+                )
+                .order_by(
+                    (table.status == JobStatusEnum.RUNNING).desc(),
+                    table.created_at,
+                )
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            res = await self.db.execute(
+                update(table)
+                .where(table.id == candidate)
+                .values(owner=owner)
+                .returning(table)
+            )
+            job = res.scalar_one_or_none()
+            job = model.model_validate(job) if job else None
+            await self.db.commit()
+            return job
+        except Exception:
+            logger.error(
+                f"Failed to claim {table.__tablename__}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def save_job(self, table, job):
+        """
+        Persist the progress of a job row, commits along with the batch.
+        Also renews the owner's lease; None once another worker took the
+        job over, so the former owner stops.
+        """
+        try:
+            query = update(table).where(table.id == job.id)
+            if job.owner:
+                query = query.where(table.owner == job.owner)
+            res = await self.db.execute(
+                query.values(
+                    **job.model_dump(
+                        exclude={"id", "created_at", "updated_at"}
+                    )
+                )
+            )
+            if not res.rowcount:
+                await self.db.rollback()
+                logger.warning(
+                    f"{table.__tablename__} {job.id} is no longer owned by {job.owner}"
+                )
+                return None
+            await self.db.commit()
+            return job
+        except Exception:
+            logger.error(
+                f"Failed to save {table.__tablename__} {job.id}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def claim_key_rotation_job(
+        self, owner: str
+    ) -> KeyRotationJob:
+        return await self.claim_job(
+            KeyRotationJobTable, KeyRotationJob, owner
+        )
+
+    async def claim_retention_job(self, owner: str) -> RetentionJob:
+        return await self.claim_job(
+            RetentionJobTable, RetentionJob, owner
+        )
+
+    async def claim_export_job(self, owner: str) -> ExportJob:
+        return await self.claim_job(ExportJobTable, ExportJob, owner)
+
+    async def save_key_rotation_job(
+        self, job: KeyRotationJob
+    ) -> KeyRotationJob:
+        return await self.save_job(KeyRotationJobTable, job)
+
+    async def save_retention_job(
+        self, job: RetentionJob
+    ) -> RetentionJob:
+        return await self.save_job(RetentionJobTable, job)
+
+    async def save_export_job(self, job: ExportJob) -> ExportJob:
+        return await self.save_job(ExportJobTable, job)
+
+    async def upsert_retention_policy(
+        self, policy: RetentionPolicy
+    ) -> RetentionPolicy:
+        try:
+            res = await self.db.execute(
+                pg_insert(RetentionPolicyTable)
+                .values(
+                    tenant_id=policy.tenant_id,
+                    retention_hours=policy.retention_hours,
+                )
+                .on_conflict_do_update(
+                    index_elements=["tenant_id"],
+                    set_={
+                        "retention_hours": policy.retention_hours,
+                        "updated_at": func.now(),
+                    },
+                )
+                .returning(RetentionPolicyTable)
+            )
+            saved = RetentionPolicy.model_validate(res.scalar_one())
+            await self.db.commit()
+            return saved
+        except Exception:
+            logger.error(
+                f"Failed to save retention policy of {policy.tenant_id}: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
+
+    async def update_meta_data(self, partition: str, rows: List[dict]):
+        """
+        Overwrite the encrypted meta_data of rows in one partition,
+        each row has tenant_id, id, meta_data and meta_data_bin.
+        Does not commit, the caller commits with its checkpoint.
+        """
+        if not rows:
+            return
+        partition = partition.replace('"', '""')
+        await self.db.execute(
+            text(
+                f"""
+                UPDATE "{partition}"
+                SET meta_data = :meta_data, meta_data_bin = :meta_data_bin
+                WHERE tenant_id = :tenant_id AND id = :id
+                """
+            ),
+            rows,
+        )
+
+    async def rewrap_tenant_keys(self, tenant_id: str = None) -> int:
+        """Re-wrap tenant keys still wrapped by DATA_ENCRYPTION_KEY_PREVIOUS"""
+        try:
+            query = select(TenantKeyTable)
+            if tenant_id:
+                query = query.where(
+                    TenantKeyTable.tenant_id == tenant_id
+                )
+            keys = (await self.db.execute(query)).scalars().all()
+
+            security = SecurityService()
+            rewrapped = 0
+            for key in keys:
+                wrapped_key = security.rewrap_key(
+                    key.tenant_id, key.version, key.wrapped_key
+                )
+                if wrapped_key is not None:
+                    key.wrapped_key = wrapped_key
+                    rewrapped += 1
+            await self.db.commit()
+            return rewrapped
+        except Exception:
+            logger.error(
+                f"Failed to re-wrap tenant keys: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            return None
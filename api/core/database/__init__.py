@@ -2,4 +2,11 @@ from core.database.engine import *
 from core.database.setup import *
 
 
-__all__ = ["init_db", "get_engine", "get_sessionmaker", "async_get_db"]
+__all__ = [
+    "init_db",
+    "get_engine",
+    "get_sessionmaker",
+    "async_get_db",
+    "is_pool_saturated",
+    "is_connection_error",
+]
@@ -0,0 +1,103 @@
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.schemas.v1.logs import LogCounterTable
+from core.schemas.v1.enum import SeverityEnum, ActionTypeEnum
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# (tenant_id, severity, action_type), the key of a log counter
+CounterKey = Tuple[str, str, str]
+
+
+class PGCounter:
+    """
+    Per tenant x severity x action_type log counts in log_counters.
+    Writers pass the rows they inserted or deleted and the counters move
+    in the same transaction. Methods do not commit.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db: AsyncSession = db
+
+    @staticmethod
+    def count_rows(rows: Iterable[dict]) -> Counter:
+        """Count audit_logs rows by counter key, with the column defaults"""
+        return Counter(
+            (
+                row["tenant_id"],
+                str(row.get("severity") or SeverityEnum.INFO),
+                str(row.get("action_type") or ActionTypeEnum.VIEW),
+            )
+            for row in rows
+        )
+
+    async def apply(self, deltas: Dict[CounterKey, int]):
+        """Add deltas to the counters, negative ones for deleted rows"""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        # one upsert in key order, so concurrent writers lock alike
+        query = pg_insert(LogCounterTable).values(
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "severity": severity,
+                    "action_type": action_type,
+                    "count": delta,
+                }
+                for (
+                    tenant_id,
+                    severity,
+                    action_type,
+                ), delta in sorted(deltas.items())
+            ]
+        )
+        await self.db.execute(
+            query.on_conflict_do_update(
+                constraint="pk_log_counters",
+                set_={
+                    "count": LogCounterTable.count
+                    + query.excluded.count
+                },
+            )
+        )
+
+    async def subtract(self, tenant_id: str, rows: List[tuple]):
+        """Take deleted (severity, action_type, count) groups off"""
+        await self.apply(
+            {
+                (tenant_id, str(severity), str(action_type)): -count
+                for severity, action_type, count in rows
+            }
+        )
+
+    async def subtract_table(self, tenant_id: str, table: str):
+        """Take the rows of a partition about to be dropped off, returns how many"""
+        res = await self.db.execute(
+            text(
+                f"""
+                SELECT severity, action_type, count(*)
+                FROM "{table}" GROUP BY severity, action_type
+                """
+            )
+        )
+        rows = res.all()
+        await self.subtract(tenant_id, rows)
+        return sum(count for _, _, count in rows)
+
+    async def retrieve(
+        self, tenant_id: str
+    ) -> Dict[Tuple[str, str], int]:
+        """(severity, action_type) -> count of a tenant"""
+        res = await self.db.execute(
+            select(
+                LogCounterTable.severity,
+                LogCounterTable.action_type,
+                LogCounterTable.count,
+            ).where(LogCounterTable.tenant_id == tenant_id)
+        )
+        return {
+            (str(severity), str(action_type)): count
+            for severity, action_type, count in res.all()
+        }
@@ -1,5 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
-from core.config import AUDIT_USER_DB_URL
+from sqlalchemy.exc import (
+    DBAPIError,
+    InterfaceError,
+    OperationalError,
+    TimeoutError as PoolTimeoutError,
+)
+import asyncpg
+from core.config import (
+    AUDIT_USER_DB_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+)
 from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
@@ -12,13 +23,39 @@ def get_engine() -> AsyncEngine:
     """Create one Async Engine only which would be allocated by FastAPI state"""
     return create_async_engine(
         AUDIT_USER_DB_URL,
-        pool_size=5,
-        max_overflow=10,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         pool_timeout=30,
         pool_pre_ping=True,
     )
 
 
+def is_pool_saturated(engine: AsyncEngine) -> bool:
+    """True when every pooled and overflow connection is checked out"""
+    return engine.pool.checkedout() >= DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    True when the database could not be reached (lost connection, pool
+    timeout), as opposed to a statement it rejected for its data
+    """
+    if isinstance(
+        error, (OperationalError, InterfaceError, PoolTimeoutError)
+    ):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(
+        error,
+        (
+            OSError,
+            asyncpg.exceptions.PostgresConnectionError,
+            asyncpg.exceptions.InterfaceError,
+        ),
+    )
+
+
 def get_sessionmaker(engine):
     """Generate a new db_session"""
     return async_sessionmaker(
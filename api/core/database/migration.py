@@ -0,0 +1,387 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from core.config import logger
+from core.schemas.v1.logs import (
+    AUDIT_LOG_KEY_COLUMNS,
+    LOG_FILTER_INDEXES,
+    LOG_SEARCH_DOCUMENT,
+    LOG_SEARCH_INDEXES,
+)
+from core.config import LOG_SEARCH_MODE
+from core.config import VIETNAM_TZ, ROLLUP_MINUTE_RETENTION_HOURS
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from core.schemas.v1.job import (
+    MigrationCheckpoint,
+    MigrationCheckpointTable,
+)
+from typing import Optional
+import traceback
+
+META_DATA_MIGRATION = "meta_data_bytea"
+# complete base64 quads only, decode() raises on anything else
+BASE64_PATTERN = (
+    "^([A-Za-z0-9+/]{4})*([A-Za-z0-9+/]{2}==|[A-Za-z0-9+/]{3}=)?$"
+)
+
+
+class PGMigration:
+    def __init__(
+        self, conn: AsyncConnection = None, db: AsyncSession = None
+    ):
+        self.conn: AsyncConnection = conn
+        self.db: AsyncSession = db
+
+    async def check_primary_key(self):
+        """
+        `create_all` keeps the primary key audit_logs was created with,
+        refuse to start when AUDIT_LOG_PARTITION_INTERVAL asks for another
+        one: partitions could not be attached and retries would no longer
+        deduplicate on the conflict target.
+        """
+        if not self.conn:
+            raise Exception("Connection is not established")
+
+        result = await self.conn.execute(
+            text(
+                """
+                SELECT a.attname
+                FROM pg_index i
+                JOIN pg_attribute a
+                    ON a.attrelid = i.indrelid
+                    AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = 'audit_logs'::regclass
+                AND i.indisprimary
+                ORDER BY array_position(i.indkey::int2[], a.attnum)
+                """
+            )
+        )
+        columns = tuple(result.scalars().all())
+        if columns != AUDIT_LOG_KEY_COLUMNS:
+            message = (
+                f"audit_logs primary key is {columns} but"
+                f" AUDIT_LOG_PARTITION_INTERVAL needs"
+                f" {AUDIT_LOG_KEY_COLUMNS}, it can only change before"
+                " audit_logs is first created"
+            )
+            logger.error(message)
+            raise Exception(message)
+
+    async def add_missing_columns(self):
+        """
+        `create_all` never alters an existing table, so columns added
+        to AuditLogTable after a deployment are added here.
+        """
+        try:
+            if not self.conn:
+                raise Exception("Connection is not established")
+
+            await self.conn.execute(
+                text(
+                    """
+                    ALTER TABLE audit_logs
+                    ADD COLUMN IF NOT EXISTS meta_data_bin bytea;
+                    """
+                )
+            )
+            await self.conn.execute(
+                text(
+                    """
+                    ALTER TABLE tenants
+                    ADD COLUMN IF NOT EXISTS keys_shredded_at timestamptz;
+                    """
+                )
+            )
+            for table in (
+                "key_rotation_jobs",
+                "retention_jobs",
+                "export_jobs",
+            ):
+                await self.conn.execute(
+                    text(
+                        f"""
+                        ALTER TABLE {table}
+                        ADD COLUMN IF NOT EXISTS owner varchar;
+                        """
+                    )
+                )
+
+        except Exception:
+            logger.error(
+                f"Failed to add missing columns: {traceback.format_exc()}"
+            )
+            raise Exception("Failed to add missing columns")
+
+    async def add_missing_indexes(self):
+        """Indexes added to AuditLogTable after a deployment"""
+        try:
+            if not self.conn:
+                raise Exception("Connection is not established")
+
+            await self.conn.execute(
+                text(
+                    """
+                    CREATE INDEX IF NOT EXISTS ix_audit_logs_tenant_ts_id
+                    ON audit_logs (tenant_id, timestamp DESC, id DESC);
+                    """
+                )
+            )
+            for index, columns in LOG_FILTER_INDEXES.items():
+                await self.conn.execute(
+                    text(
+                        f"""
+                        CREATE INDEX IF NOT EXISTS {index} ON audit_logs
+                        (tenant_id, {', '.join(columns)}, timestamp);
+                        """
+                    )
+                )
+
+        except Exception:
+            logger.error(
+                f"Failed to add missing indexes: {traceback.format_exc()}"
+            )
+            raise Exception("Failed to add missing indexes")
+
+    async def add_search_index(self):
+        """
+        GIN index over LOG_SEARCH_DOCUMENT for q= search, created on the
+        partitioned parent so every tenant partition gets its own
+        """
+        try:
+            if not self.conn:
+                raise Exception("Connection is not established")
+
+            index = LOG_SEARCH_INDEXES[LOG_SEARCH_MODE]
+            if LOG_SEARCH_MODE == "trigram":
+                await self.conn.execute(
+                    text("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+                )
+                definition = f"({LOG_SEARCH_DOCUMENT}) gin_trgm_ops"
+            else:
+                definition = (
+                    f"(to_tsvector('simple', {LOG_SEARCH_DOCUMENT}))"
+                )
+            await self.conn.execute(
+                text(
+                    f"""
+                    CREATE INDEX IF NOT EXISTS {index} ON audit_logs
+                    USING gin ({definition});
+                    """
+                )
+            )
+
+        except Exception:
+            logger.error(
+                f"Failed to add search index: {traceback.format_exc()}"
+            )
+            raise Exception(
+                "Failed to add search index, pg_trgm is required "
+                "unless LOG_SEARCH_MODE=fts"
+            )
+
+    async def backfill_log_counters(self):
+        """
+        Fill log_counters from audit_logs once, when it is still empty.
+        The lock holds writers back so no row is counted twice or missed.
+        """
+        try:
+            if not self.conn:
+                raise Exception("Connection is not established")
+
+            await self.conn.execute(
+                text(
+                    "LOCK TABLE log_counters IN SHARE ROW EXCLUSIVE MODE;"
+                )
+            )
+            res = await self.conn.execute(
+                text("SELECT EXISTS (SELECT 1 FROM log_counters);")
+            )
+            if res.scalar():
+                return
+            await self.conn.execute(
+                text(
+                    """
+                    INSERT INTO log_counters
+                        (tenant_id, severity, action_type, count)
+                    SELECT tenant_id, severity, action_type, count(*)
+                    FROM audit_logs
+                    GROUP BY tenant_id, severity, action_type;
+                    """
+                )
+            )
+
+        except Exception:
+            logger.error(
+                f"Failed to backfill log counters: {traceback.format_exc()}"
+            )
+            raise Exception("Failed to backfill log counters")
+
+    async def backfill_log_rollups(self):
+        """
+        Fill the rollup tables from audit_logs once, when both are empty:
+        minute buckets for the last ROLLUP_MINUTE_RETENTION_HOURS, hour
+        buckets before that
+        """
+        try:
+            if not self.conn:
+                raise Exception("Connection is not established")
+
+            await self.conn.execute(
+                text(
+                    """
+                    LOCK TABLE log_rollups_minute, log_rollups_hour
+                    IN SHARE ROW EXCLUSIVE MODE;
+                    """
+                )
+            )
+            res = await self.conn.execute(
+                text(
+                    """
+                    SELECT EXISTS (SELECT 1 FROM log_rollups_minute)
+                    OR EXISTS (SELECT 1 FROM log_rollups_hour);
+                    """
+                )
+            )
+            if res.scalar():
+                return
+            cutoff = {
+                "cutoff": datetime.now(VIETNAM_TZ)
+                - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS)
+            }
+            for table, unit, condition in (
+                ("log_rollups_minute", "minute", ">="),
+                ("log_rollups_hour", "hour", "<"),
+            ):
+                await self.conn.execute(
+                    text(
+                        f"""
+                        INSERT INTO {table}
+                            (tenant_id, bucket, severity, action_type, count)
+                        SELECT tenant_id, date_trunc('{unit}', timestamp),
+                            severity, action_type, count(*)
+                        FROM audit_logs
+                        WHERE timestamp {condition} :cutoff
+                        GROUP BY 1, 2, 3, 4;
+                        """
+                    ),
+                    cutoff,
+                )
+
+        except Exception:
+            logger.error(
+                f"Failed to backfill log rollups: {traceback.format_exc()}"
+            )
+            raise Exception("Failed to backfill log rollups")
+
+    async def migrate_meta_data_batch(
+        self, batch_size: int
+    ) -> Optional[MigrationCheckpoint]:
+        """
+        Convert the legacy base64 meta_data of the next `batch_size` rows
+        after the persisted checkpoint into version 0x01 bytea envelopes.
+        Walks the primary key, so every batch is an index range scan
+        instead of a scan for unconverted rows. Values that are not
+        valid base64 are left as they are and logged.
+
+        Returns:
+            Optional[MigrationCheckpoint]: the checkpoint after this
+            batch, `finished_at` set once the walk reached the end;
+            None while another process is migrating a batch
+        """
+        try:
+            await self.db.execute(
+                pg_insert(MigrationCheckpointTable)
+                .values(id=META_DATA_MIGRATION)
+                .on_conflict_do_nothing()
+            )
+            checkpoint = (
+                await self.db.execute(
+                    select(MigrationCheckpointTable)
+                    .where(
+                        MigrationCheckpointTable.id
+                        == META_DATA_MIGRATION
+                    )
+                    .with_for_update(skip_locked=True)
+                )
+            ).scalar_one_or_none()
+            if not checkpoint:
+                await self.db.rollback()
+                return None
+            if checkpoint.finished_at:
+                finished = MigrationCheckpoint.model_validate(
+                    checkpoint
+                )
+                await self.db.commit()
+                return finished
+
+            result = await self.db.execute(
+                text(
+                    """
+                    WITH batch AS (
+                        SELECT tenant_id, id, meta_data, meta_data_bin
+                        FROM audit_logs
+                        WHERE (tenant_id, id) > (:tenant_id, :id)
+                        ORDER BY tenant_id, id
+                        LIMIT :batch_size
+                    ), legacy AS (
+                        SELECT tenant_id, id, meta_data,
+                            length(meta_data) > 0
+                            AND length(meta_data) % 4 = 0
+                            AND meta_data ~ :pattern AS valid
+                        FROM batch
+                        WHERE meta_data_bin IS NULL
+                        AND meta_data IS NOT NULL
+                    ), moved AS (
+                        UPDATE audit_logs a
+                        SET meta_data_bin = decode('01', 'hex')
+                                || decode(legacy.meta_data, 'base64'),
+                            meta_data = NULL
+                        FROM legacy
+                        WHERE a.tenant_id = legacy.tenant_id
+                        AND a.id = legacy.id
+                        AND legacy.valid
+                        RETURNING 1
+                    ), last AS (
+                        SELECT tenant_id, id FROM batch
+                        ORDER BY tenant_id DESC, id DESC
+                        LIMIT 1
+                    )
+                    SELECT
+                        (SELECT count(*) FROM moved),
+                        (SELECT array_agg(id) FROM legacy WHERE NOT valid),
+                        (SELECT tenant_id FROM last),
+                        (SELECT id FROM last)
+                    """
+                ),
+                {
+                    "tenant_id": checkpoint.last_tenant_id,
+                    "id": checkpoint.last_id,
+                    "batch_size": batch_size,
+                    "pattern": BASE64_PATTERN,
+                },
+            )
+            moved, skipped, last_tenant_id, last_id = result.one()
+            skipped = skipped or []
+            if skipped:
+                logger.warning(
+                    f"[META MIGRATION] Skipped {len(skipped)} rows whose"
+                    f" meta_data is not base64, e.g. {skipped[:10]}"
+                )
+
+            checkpoint.rows_converted += moved
+            checkpoint.rows_skipped += len(skipped)
+            if last_id is None:
+                checkpoint.finished_at = func.now()
+            else:
+                checkpoint.last_tenant_id = last_tenant_id
+                checkpoint.last_id = last_id
+            await self.db.commit()
+            await self.db.refresh(checkpoint)
+            return MigrationCheckpoint.model_validate(checkpoint)
+
+        except Exception:
+            logger.error(
+                f"Failed to migrate meta_data batch: {traceback.format_exc()}"
+            )
+            await self.db.rollback()
+            raise
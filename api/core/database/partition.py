@@ -0,0 +1,180 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database.counter import PGCounter
+from core.config import (
+    VIETNAM_TZ,
+    AUDIT_LOG_PARTITION_INTERVAL,
+    AUDIT_LOG_PARTITIONS_AHEAD,
+)
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+PERIOD_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+
+
+class PGPartition:
+    """
+    Partition layout of audit_logs: one LIST partition per tenant
+    (`audit_logs_{tenant_id}`), sub-partitioned by RANGE (timestamp) into
+    `audit_logs_{tenant_id}_{YYYYMM|YYYYMMDD}` periods when
+    AUDIT_LOG_PARTITION_INTERVAL is "month" or "day". Rows outside the
+    created periods land in `audit_logs_{tenant_id}_default`.
+    Methods execute DDL on the session without committing.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        interval: str = AUDIT_LOG_PARTITION_INTERVAL,
+    ):
+        self.db: AsyncSession = db
+        self.interval: str = interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval in PERIOD_FORMATS
+
+    def period_start(self, moment: datetime) -> datetime:
+        start = moment.astimezone(VIETNAM_TZ).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        if self.interval == "month":
+            start = start.replace(day=1)
+        return start
+
+    def next_period(self, start: datetime) -> datetime:
+        days = 1 if self.interval == "day" else 32
+        return self.period_start(start + timedelta(days=days))
+
+    @staticmethod
+    def tenant_partition(tenant_id: str) -> str:
+        return f"audit_logs_{tenant_id}"
+
+    def partition_name(self, tenant_id: str, start: datetime) -> str:
+        suffix = start.strftime(PERIOD_FORMATS[self.interval])
+        return f"{self.tenant_partition(tenant_id)}_{suffix}"
+
+    def parse_partition(
+        self, tenant_id: str, name: str
+    ) -> Optional[datetime]:
+        """Start of the period a sub-partition covers, None if not one"""
+        prefix = f"{self.tenant_partition(tenant_id)}_"
+        if not name.startswith(prefix):
+            return None
+        try:
+            start = datetime.strptime(
+                name[len(prefix) :], PERIOD_FORMATS[self.interval]
+            )
+        except ValueError:
+            return None
+        return start.replace(tzinfo=VIETNAM_TZ)
+
+    async def create_tenant_partition(self, tenant_id: str):
+        """LIST partition of a tenant plus its default and upcoming periods"""
+        partition = self.tenant_partition(tenant_id)
+        sub_partitioning = (
+            "PARTITION BY RANGE (timestamp)" if self.enabled else ""
+        )
+        await self.db.execute(
+            text(
+                f"""
+                CREATE TABLE IF NOT EXISTS "{partition}"
+                PARTITION OF audit_logs FOR VALUES IN ('{tenant_id}')
+                {sub_partitioning};
+                """
+            )
+        )
+        if not self.enabled:
+            return
+
+        await self.db.execute(
+            text(
+                f"""
+                CREATE TABLE IF NOT EXISTS "{partition}_default"
+                PARTITION OF "{partition}" DEFAULT;
+                """
+            )
+        )
+        await self.ensure_time_partitions(tenant_id)
+
+    async def ensure_time_partitions(
+        self, tenant_id: str, ahead: int = AUDIT_LOG_PARTITIONS_AHEAD
+    ):
+        """Create the current period and `ahead` future ones if missing"""
+        partition = self.tenant_partition(tenant_id)
+        start = self.period_start(datetime.now(VIETNAM_TZ))
+        for _ in range(ahead + 1):
+            end = self.next_period(start)
+            await self.db.execute(
+                text(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS
+                    "{self.partition_name(tenant_id, start)}"
+                    PARTITION OF "{partition}"
+                    FOR VALUES FROM ('{start.isoformat()}')
+                    TO ('{end.isoformat()}');
+                    """
+                )
+            )
+            start = end
+
+    async def list_partitioned_tenants(self) -> List[str]:
+        """Tenants whose partition is sub-partitioned by time"""
+        res = await self.db.execute(
+            text(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'audit_logs' AND c.relkind = 'p'
+                ORDER BY c.relname
+                """
+            )
+        )
+        prefix = len(self.tenant_partition(""))
+        return [name[prefix:] for name in res.scalars().all()]
+
+    async def list_time_partitions(
+        self, tenant_id: str
+    ) -> List[Tuple[str, datetime]]:
+        """(name, period start) of a tenant's sub-partitions, oldest first"""
+        res = await self.db.execute(
+            text(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = :partition
+                """
+            ),
+            {"partition": self.tenant_partition(tenant_id)},
+        )
+        partitions = []
+        for name in res.scalars().all():
+            start = self.parse_partition(tenant_id, name)
+            if start:
+                partitions.append((name, start))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    async def drop_expired_partitions(
+        self, tenant_id: str, cutoff: datetime
+    ) -> Tuple[int, int]:
+        """
+        Drop sub-partitions whose whole period is older than `cutoff`.
+        Returns how many were dropped and the number of rows they held.
+        """
+        if not self.enabled:
+            return 0, 0
+
+        dropped, dropped_rows = 0, 0
+        for name, start in await self.list_time_partitions(tenant_id):
+            if self.next_period(start) > cutoff:
+                break
+            dropped_rows += await PGCounter(self.db).subtract_table(
+                tenant_id, name
+            )
+            await self.db.execute(text(f'DROP TABLE "{name}"'))
+            dropped += 1
+        return dropped, dropped_rows
@@ -0,0 +1,148 @@
+from sqlalchemy import select, text, union_all, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.schemas.v1.logs import (
+    LogRollupMinuteTable,
+    LogRollupHourTable,
+    truncate_bucket,
+)
+from core.schemas.v1.enum import SeverityEnum, ActionTypeEnum
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (tenant_id, minute bucket, severity, action_type)
+RollupKey = Tuple[str, datetime, str, str]
+
+
+class PGRollup:
+    """
+    Time-bucketed log counts in log_rollups_minute / log_rollups_hour.
+    Writers add the rows they inserted to the minute buckets in the same
+    transaction; `compact` folds old minutes into hours. Methods do not
+    commit.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db: AsyncSession = db
+
+    @staticmethod
+    def count_rows(rows: Iterable[dict]) -> Counter:
+        """Count audit_logs rows by minute bucket, with the column defaults"""
+        return Counter(
+            (
+                row["tenant_id"],
+                truncate_bucket(row["timestamp"], "minute"),
+                str(row.get("severity") or SeverityEnum.INFO),
+                str(row.get("action_type") or ActionTypeEnum.VIEW),
+            )
+            for row in rows
+        )
+
+    async def apply(self, deltas: Dict[RollupKey, int]):
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        # one upsert in key order, so concurrent writers lock alike
+        query = pg_insert(LogRollupMinuteTable).values(
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "bucket": bucket,
+                    "severity": severity,
+                    "action_type": action_type,
+                    "count": delta,
+                }
+                for (
+                    tenant_id,
+                    bucket,
+                    severity,
+                    action_type,
+                ), delta in sorted(deltas.items())
+            ]
+        )
+        await self.db.execute(
+            query.on_conflict_do_update(
+                constraint="pk_log_rollups_minute",
+                set_={
+                    "count": LogRollupMinuteTable.count
+                    + query.excluded.count
+                },
+            )
+        )
+
+    async def compact(self, before: datetime) -> int:
+        """Move minute buckets older than `before` into hour buckets"""
+        res = await self.db.execute(
+            text(
+                """
+                WITH moved AS (
+                    DELETE FROM log_rollups_minute WHERE bucket < :before
+                    RETURNING tenant_id, bucket, severity, action_type, count
+                ), hours AS (
+                    INSERT INTO log_rollups_hour
+                        (tenant_id, bucket, severity, action_type, count)
+                    SELECT tenant_id, date_trunc('hour', bucket),
+                        severity, action_type, sum(count)
+                    FROM moved
+                    GROUP BY 1, 2, 3, 4
+                    ORDER BY 1, 2, 3, 4
+                    ON CONFLICT ON CONSTRAINT pk_log_rollups_hour
+                    DO UPDATE SET
+                        count = log_rollups_hour.count + excluded.count
+                )
+                SELECT count(*) FROM moved
+                """
+            ),
+            {"before": before},
+        )
+        return res.scalar()
+
+    async def retrieve_buckets(
+        self,
+        tenant_id: str,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+        severity: Optional[SeverityEnum] = None,
+        action_type: Optional[ActionTypeEnum] = None,
+    ) -> List[Tuple[datetime, str, str, int]]:
+        """
+        (bucket, severity, action_type, count) rows of [start, end).
+        Minute granularity reads minute buckets only, coarser ones read
+        hour buckets plus the recent minutes truncated to the hour.
+        """
+        start = truncate_bucket(start, granularity)
+
+        def scoped(table, bucket):
+            query = select(
+                bucket.label("bucket"),
+                table.severity,
+                table.action_type,
+                table.count,
+            ).where(
+                table.tenant_id == tenant_id,
+                table.bucket >= start,
+                table.bucket < end,
+            )
+            if severity:
+                query = query.where(table.severity == severity)
+            if action_type:
+                query = query.where(table.action_type == action_type)
+            return query
+
+        minutes = LogRollupMinuteTable
+        if granularity == "minute":
+            query = scoped(minutes, minutes.bucket)
+        else:
+            query = union_all(
+                scoped(LogRollupHourTable, LogRollupHourTable.bucket),
+                scoped(
+                    minutes, func.date_trunc("hour", minutes.bucket)
+                ),
+            )
+        res = await self.db.execute(query)
+        return [
+            (bucket, str(sev), str(action), count)
+            for bucket, sev, action, count in res.all()
+        ]
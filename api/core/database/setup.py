@@ -1,5 +1,6 @@
 from core.schemas import Base
 from core.database.trigger import PGTrigger
+from core.database.migration import PGMigration
 from sqlalchemy.ext.asyncio import AsyncEngine
 from core.config import logger
 
@@ -10,5 +11,22 @@ async def init_db(engine: AsyncEngine):
         await conn.run_sync(Base.metadata.create_all)
         logger.info("Database initialized and tables created.")
 
+        await PGMigration(conn=conn).check_primary_key()
+
+        await PGMigration(conn=conn).add_missing_columns()
+        logger.info("Missing columns added successfully.")
+
+        await PGMigration(conn=conn).add_missing_indexes()
+        logger.info("Missing indexes added successfully.")
+
+        await PGMigration(conn=conn).add_search_index()
+        logger.info("Search index added successfully.")
+
+        await PGMigration(conn=conn).backfill_log_counters()
+        logger.info("Log counters backfilled successfully.")
+
+        await PGMigration(conn=conn).backfill_log_rollups()
+        logger.info("Log rollups backfilled successfully.")
+
         await PGTrigger(conn=conn).create_masking_triggers()
         logger.info("Triggers and functions created successfully.")
@@ -7,6 +7,8 @@ def run():
         host="0.0.0.0",
         port=8080,
         reload=True,
+        # compress /logs/stream frames for clients offering it
+        ws_per_message_deflate=True,
     )
 
 
@@ -13,15 +13,40 @@ import traceback
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
-from core.database import async_get_db
+from core.database import async_get_db, is_pool_saturated
 from core.database.CRUD import PGCreation, PGRetrieve, PGDeletion
-import csv
+from core.database.CRUD.retrieve import (
+    get_cached_stats,
+    stream_tenant_logs,
+)
+from core.services.csv_stream import iter_csv_chunks
 from typing import List
-import tempfile
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse, FileResponse
+from core.services.parquet_export import parquet_available, export_path
 from core.services import Audit_SQS
 from core.limiter import RATE_LIMITER
-from core.schemas.v1.enum import UserRoleEnum
+from core.schemas.v1.enum import (
+    UserRoleEnum,
+    SeverityEnum,
+    ActionTypeEnum,
+    JobStatusEnum,
+)
+from core.schemas.v1.logs import (
+    LogWriteResult,
+    PartialAuditLog,
+    LogCursor,
+    LogFilter,
+)
+from core.services.ndjson_stream import iter_ndjson_lines
+from core.config import NDJSON_CHUNK_SIZE, NDJSON_MAX_ERRORS_PER_CHUNK
+from pydantic import ValidationError
+from datetime import datetime, timedelta
+from core.schemas.v1.job import RetentionJob, ExportJob
+from core.config import (
+    VIETNAM_TZ,
+    RETENTION_BATCH_SIZE,
+    EXPORT_ROW_GROUP_SIZE,
+)
 
 router = APIRouter()
 Limiter = RATE_LIMITER.get_limiter()
@@ -56,22 +81,53 @@ async def create_log_entry(
         token_data = AuthenService.verify_token(token.credentials)
         if token_data.get("role", "") == UserRoleEnum.AUDITOR:
             raise HTTPException(status_code=401, detail="User with AUDITOR role cannot have action of create log")
-        log = await PGCreation(db).create_new_log(
-            log=payload,
-            tenant_id=token_data.get("tenant_id", None),
-            user_id=token_data.get("user_id", None),
-        )
-        if not log:
+        tenant_id = token_data.get("tenant_id", None)
+        user_id = token_data.get("user_id", None)
+        ingest_buffer = request.app.state.ingest_buffer
+        log_spool = request.app.state.log_spool
+
+        result = None
+        if log_spool and is_pool_saturated(
+            request.app.state.db_engine
+        ):
+            # every connection is busy, let the spool take it below
+            pass
+        elif ingest_buffer:
+            result = await ingest_buffer.submit(
+                log=payload, tenant_id=tenant_id, user_id=user_id
+            )
+        else:
+            result = await PGCreation(db).create_new_log(
+                log=payload, tenant_id=tenant_id, user_id=user_id
+            )
+
+        if not result and log_spool:
+            if await log_spool.spool_logs(
+                [payload], tenant_id, user_id
+            ):
+                return LogEntryCreateResponse(
+                    message="Log accepted and spooled for delivery!",
+                    log=payload.model_dump(),
+                )
+        if not result:
             return LogEntryCreateResponse(
                 message="Failed to create log!"
             )
 
+        if result.duplicates:
+            # a retry of a log that is already stored, nothing to announce
+            return LogEntryCreateResponse(
+                message="Log already exists, duplicate ignored!",
+                log=payload.model_dump(),
+                duplicate=True,
+            )
+
         background_tasks.add_task(
             Audit_SQS.send_message,
             {
                 "type": "logs.created",
                 "tenant_id": token_data.get("tenant_id", None),
-                **log.model_dump(),
+                **payload.model_dump(),
             },
         )
 
@@ -97,12 +153,43 @@ async def get_logs(
     token: TokenDependencies,
     request: Request,
     db: AsyncSession = Depends(async_get_db),
-    skip: int = Query(
-        None, description="Number of records to skip"
-    ),
+    skip: int = Query(None, description="Number of records to skip"),
     limit: int = Query(
         None, le=1000, description="Max records to return"
     ),
+    fields: str = Query(
+        None,
+        description="Comma separated log fields to return, e.g. severity,action_type,timestamp",
+    ),
+    cursor: str = Query(
+        None,
+        description="next_cursor of the previous page, replaces skip",
+    ),
+    severity: SeverityEnum = Query(
+        None, description="Filter by severity"
+    ),
+    action_type: ActionTypeEnum = Query(
+        None, description="Filter by action type"
+    ),
+    resource_type: str = Query(
+        None, description="Filter by resource type"
+    ),
+    resource_id: str = Query(
+        None,
+        description="Filter by resource id, requires resource_type",
+    ),
+    user_id: str = Query(None, description="Filter by user id"),
+    session_id: str = Query(None, description="Filter by session id"),
+    start_time: datetime = Query(
+        None, description="Logs at or after this time"
+    ),
+    end_time: datetime = Query(
+        None, description="Logs before this time"
+    ),
+    q: str = Query(
+        None,
+        description="Search resource_type, resource_id, user_agent and ip_address, ranked by relevance",
+    ),
 ):
     """Get the range of logs (Tenant-scoped)
 
@@ -111,6 +198,11 @@ async def get_logs(
         request (Request): HTTP request to checkup rate limit declaration
         skip (int): Number of records to skip
         limit (int): Max records to return
+        fields (str): Comma separated fields to select, every field if omitted
+        cursor (str): Opaque cursor returned as next_cursor, pages by (timestamp, id) instead of OFFSET
+        severity, action_type, resource_type, resource_id, user_id, session_id: equality filters, each combination must be served by an index
+        start_time, end_time (datetime): time range [start_time, end_time)
+        q (str): Text searched through the search index, results are ordered by rank
         db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
     """
     try:
@@ -120,19 +212,76 @@ async def get_logs(
         if not tenant_id:
             raise HTTPException(status_code=401, detail="Tenant id is invalid")
 
-        logs = await PGRetrieve(db).retrieve_logs(
-            tenant_id=tenant_id,
-            skip=skip,
-            limit=limit,
+        log_filter = LogFilter(
+            severity=severity,
+            action_type=action_type,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            user_id=user_id,
+            session_id=session_id,
+            start_time=start_time,
+            end_time=end_time,
+            q=q,
         )
+        try:
+            selected_fields = PartialAuditLog.parse_fields(fields)
+            log_cursor = LogCursor.decode(cursor) if cursor else None
+            log_filter.serving_index()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if log_cursor and skip:
+            raise HTTPException(
+                status_code=422,
+                detail="cursor cannot be combined with skip",
+            )
+        if log_cursor and (log_cursor.rank is None) != (q is None):
+            raise HTTPException(
+                status_code=422,
+                detail="cursor does not belong to this search",
+            )
+        if limit and selected_fields is not None:
+            # next_cursor is built from the last log's timestamp
+            selected_fields.add("timestamp")
+
+        logs = None
+        if (
+            limit
+            and not skip
+            and not log_cursor
+            and not log_filter.model_dump(exclude_none=True)
+        ):
+            # head of the list, served from the tenant's recent logs ring
+            logs = await PGRetrieve(db).retrieve_recent_logs(
+                tenant_id,
+                limit,
+                fields=selected_fields,
+                raise_errors=True,
+            )
+        if logs is None:
+            logs = await PGRetrieve(db).retrieve_logs(
+                tenant_id=tenant_id,
+                skip=skip,
+                limit=limit,
+                fields=selected_fields,
+                cursor=log_cursor,
+                filters=log_filter,
+                # e.g. a key that fails to load is not "no logs"
+                raise_errors=True,
+            )
 
         if not logs:
             return GetLogsResponse(
                 message="There is no logs available"
             )
 
+        next_cursor = None
+        if limit and len(logs) == limit:
+            next_cursor = LogCursor.after(logs[-1]).encode()
+
         return GetLogsResponse(
-            message="Retrieve logs successfully!", logs=logs
+            message="Retrieve logs successfully!",
+            logs=logs,
+            next_cursor=next_cursor,
         )
     except HTTPException:
         raise
@@ -144,55 +293,96 @@ async def get_logs(
 
 @router.get(
     "/export",
-    description="Export logs (tenant-scoped)",
+    description="Export logs as a streamed CSV file (tenant-scoped)",
 )
 @Limiter.limit(RATE_LIMITER.default_limit)
 async def export_logs(
     token: TokenDependencies,
     request: Request,
-    db: AsyncSession = Depends(async_get_db),
+    severity: SeverityEnum = Query(
+        None, description="Filter by severity"
+    ),
+    action_type: ActionTypeEnum = Query(
+        None, description="Filter by action type"
+    ),
+    resource_type: str = Query(
+        None, description="Filter by resource type"
+    ),
+    resource_id: str = Query(
+        None,
+        description="Filter by resource id, requires resource_type",
+    ),
+    user_id: str = Query(None, description="Filter by user id"),
+    session_id: str = Query(None, description="Filter by session id"),
+    start_time: datetime = Query(
+        None, description="Logs at or after this time"
+    ),
+    end_time: datetime = Query(
+        None, description="Logs before this time"
+    ),
+    gzip: bool = Query(
+        False, description="Compress the file with gzip"
+    ),
 ):
-    """Export data logs retrieved in format of CSV file (Tenant-scoped)
+    """Export logs in format of CSV file, streamed newest first (Tenant-scoped)
 
     Args:
         token (TokenDependencies): JWT request for short-time authentication access
         request (Request): HTTP request to checkup rate limit declaration
-        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+        severity, action_type, resource_type, resource_id, user_id, session_id: equality filters, each combination must be served by an index
+        start_time, end_time (datetime): time range [start_time, end_time)
+        gzip (bool): Send logs.csv.gz instead of logs.csv
     """
     try:
         token_data = AuthenService.verify_token(token.credentials)
 
         tenant_id = token_data.get("tenant_id")
-        logs = await PGRetrieve(db).retrieve_logs(tenant_id=tenant_id)
-        
         if not tenant_id:
             raise HTTPException(status_code=401, detail="Tenant id is invalid")
 
-        if not logs:
+        log_filter = LogFilter(
+            severity=severity,
+            action_type=action_type,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            user_id=user_id,
+            session_id=session_id,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        try:
+            log_filter.serving_index()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        # the stream owns its session, the request one closes before the body is sent
+        columns = list(AuditLog.model_fields)
+        batches = stream_tenant_logs(
+            request.app.state.db_sessionmaker,
+            tenant_id,
+            columns,
+            filters=log_filter,
+        )
+        first = await anext(batches, None)
+        if not first:
+            await batches.aclose()
             raise HTTPException(
                 status_code=404, detail="No logs found for export"
             )
 
-        with tempfile.NamedTemporaryFile(
-            delete=False,
-            mode="w",
-            newline="",
-            dir="/tmp",
-            suffix=".csv",
-        ) as tmpfile:
-            writer = csv.writer(tmpfile)
-            writer.writerow(list(logs[0].model_dump().keys()))
-            for log in logs:
-                writer.writerow(log.model_dump().values())
-            tmpfile.close()
-            return FileResponse(
-                tmpfile.name,
-                filename="logs.csv",
-                media_type="text/csv",
-                headers={
-                    "Content-Disposition": "attachment; filename=logs.csv"
-                },
-            )
+        async def rows():
+            yield first
+            async for batch in batches:
+                yield batch
+
+        filename = "logs.csv.gz" if gzip else "logs.csv"
+        return StreamingResponse(
+            iter_csv_chunks(rows(), columns, gzip=gzip),
+            media_type="application/gzip" if gzip else "text/csv",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}"
+            },
+        )
 
     except HTTPException:
         raise
@@ -202,6 +392,192 @@ async def export_logs(
         raise HTTPException(status_code=500, detail=message)
 
 
+@router.post(
+    "/export/jobs",
+    description="Queue a background Parquet export (tenant-scoped)",
+    response_model=ExportJobResponse,
+    status_code=202,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def create_export_job(
+    payload: CreateExportJobPayload,
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Queue an export of logs to a Parquet file written in the background (Tenant-scoped)
+
+    Poll GET /export/jobs/{job_id} for its progress, then fetch the file from
+    GET /export/jobs/{job_id}/download.
+
+    Args:
+        payload (CreateExportJobPayload): file format plus the same filters and time range as GET /logs/
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        if not parquet_available():
+            raise HTTPException(
+                status_code=501,
+                detail="Parquet export requires pyarrow to be installed",
+            )
+
+        log_filter = LogFilter(
+            **payload.model_dump(exclude={"format"})
+        )
+        try:
+            log_filter.serving_index()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        job = await PGCreation(db).create_export_job(
+            ExportJob(
+                tenant_id=tenant_id,
+                format=payload.format,
+                filters=log_filter.model_dump(
+                    mode="json", exclude_none=True
+                ),
+                row_group_size=EXPORT_ROW_GROUP_SIZE,
+            )
+        )
+        if not job:
+            raise HTTPException(
+                status_code=500, detail="Failed to create export job!"
+            )
+
+        return ExportJobResponse(
+            message=f"Export job {job.id} is {job.status.value}.",
+            job=job,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to create export job!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.get(
+    "/export/jobs/{job_id}",
+    description="Get progress of an export job (tenant-scoped)",
+    response_model=ExportJobResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_export_job(
+    job_id: str,
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Get the progress of an export job (Tenant-scoped)
+
+    Args:
+        job_id (str): id of the export job returned by POST /export/jobs
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        job = await PGRetrieve(db).retrieve_export_job(
+            job_id=job_id, tenant_id=tenant_id
+        )
+        if not job:
+            raise HTTPException(
+                status_code=404, detail="Export job not found"
+            )
+
+        return ExportJobResponse(
+            message=f"Export job {job.id} is {job.status.value}, {job.rows_written} of {job.rows_total} logs written.",
+            job=job,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to retrieve export job!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.get(
+    "/export/jobs/{job_id}/download",
+    description="Download the file of a finished export job, supports Range requests (tenant-scoped)",
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def download_export_job(
+    job_id: str,
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Download the Parquet file of a finished export job (Tenant-scoped)
+
+    Range and If-Range headers are honoured, so interrupted downloads of
+    large files can resume.
+
+    Args:
+        job_id (str): id of the export job returned by POST /export/jobs
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        job = await PGRetrieve(db).retrieve_export_job(
+            job_id=job_id, tenant_id=tenant_id
+        )
+        if not job:
+            raise HTTPException(
+                status_code=404, detail="Export job not found"
+            )
+        if job.status != JobStatusEnum.DONE:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Export job is {job.status.value}",
+            )
+
+        path = export_path(job.id)
+        if not path.exists():
+            raise HTTPException(
+                status_code=410, detail="Export file has expired"
+            )
+
+        return FileResponse(
+            path,
+            filename=f"logs-{job.id}.parquet",
+            media_type="application/vnd.apache.parquet",
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to download export!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
 @router.post(
     "/bulk",
     description="Bulk log creation (with tenant ID)",
@@ -236,25 +612,40 @@ async def bulk_create_logs(
         if user_role and user_role == UserRoleEnum.AUDITOR:
             raise HTTPException(status_code=401, detail="User with AUDITOR role cannot have action of create bulk")
 
-        logs: List[AuditLog] = await PGCreation(db).create_bulk_logs(
-            logs=payload, tenant_id=tenant_id, user_id=user_id
-        )
-        if not logs:
+        log_spool = request.app.state.log_spool
+        result: LogWriteResult = None
+        if not (
+            log_spool
+            and is_pool_saturated(request.app.state.db_engine)
+        ):
+            result = await PGCreation(db).create_bulk_logs(
+                logs=payload, tenant_id=tenant_id, user_id=user_id
+            )
+
+        if not result and log_spool:
+            if await log_spool.spool_logs(payload, tenant_id, user_id):
+                return BulkLogCreateResponse(
+                    message="Logs accepted and spooled for delivery!",
+                    logs=[log.model_dump() for log in payload],
+                )
+        if not result:
             raise HTTPException(
                 status_code=500, detail="Failed to create bulk logs"
             )
 
-        background_tasks.add_task(
-            Audit_SQS.send_message,
-            {
-                "type": "logs.created",
-                "tenant_id": token_data.get("tenant_id", None),
-                "logs": [log.model_dump() for log in logs],
-            },
-        )
+        if result.logs:
+            background_tasks.add_task(
+                Audit_SQS.send_message,
+                {
+                    "type": "logs.created",
+                    "tenant_id": token_data.get("tenant_id", None),
+                    "logs": [log.model_dump() for log in result.logs],
+                },
+            )
         return BulkLogCreateResponse(
             message="Logs created successfully!",
-            logs=[log.model_dump() for log in logs],
+            logs=[log.model_dump() for log in result.logs],
+            duplicates=result.duplicates,
         )
     except HTTPException:
         raise
@@ -264,6 +655,207 @@ async def bulk_create_logs(
         raise HTTPException(status_code=500, detail=message)
 
 
+@router.post(
+    "/bulk/ndjson",
+    description="Streaming NDJSON bulk log creation (with tenant ID)",
+    response_model=NdjsonLogCreateResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def stream_create_logs(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Create logs from an `application/x-ndjson` body of any size (Tenant-scoped)
+
+    The body is parsed line by line as it arrives, every line is validated
+    as a `CreateLogPayload` and valid lines are inserted in chunks of
+    `NDJSON_CHUNK_SIZE`, so memory stays flat whatever the body size.
+
+    Args:
+        background_tasks (BackgroundTasks): an async task to handle background task for this request.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request carrying the NDJSON body stream
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        user_id = token_data.get("user_id", None)
+
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        if token_data.get("role", "") == UserRoleEnum.AUDITOR:
+            raise HTTPException(
+                status_code=401,
+                detail="User with AUDITOR role cannot have action of create bulk",
+            )
+
+        content_type = request.headers.get("content-type", "")
+        if not content_type.startswith("application/x-ndjson"):
+            raise HTTPException(
+                status_code=415,
+                detail="Content-Type must be application/x-ndjson",
+            )
+
+        log_spool = request.app.state.log_spool
+        response = NdjsonLogCreateResponse(message="")
+        pending: List[CreateLogPayload] = []
+        chunk = NdjsonChunkResult(chunk=1, first_line=1, last_line=0)
+
+        async def flush_chunk():
+            nonlocal chunk
+            if pending:
+                result = await PGCreation(db).create_bulk_logs(
+                    logs=pending, tenant_id=tenant_id, user_id=user_id
+                )
+                if result:
+                    chunk.inserted = len(result.logs)
+                    chunk.duplicates = result.duplicates
+                elif log_spool and await log_spool.spool_logs(
+                    pending, tenant_id, user_id
+                ):
+                    chunk.spooled = len(pending)
+                else:
+                    chunk.failed = len(pending)
+                pending.clear()
+
+            response.chunks.append(chunk)
+            response.total_inserted += chunk.inserted
+            response.total_duplicates += len(chunk.duplicates)
+            response.total_rejected += chunk.rejected
+            response.total_spooled += chunk.spooled
+            response.total_failed += chunk.failed
+            chunk = NdjsonChunkResult(
+                chunk=chunk.chunk + 1,
+                first_line=chunk.last_line + 1,
+                last_line=chunk.last_line,
+            )
+
+        async for line_no, line in iter_ndjson_lines(request.stream()):
+            response.total_lines = line_no
+            chunk.last_line = line_no
+            error = None
+            if line is None:
+                error = "Line exceeds NDJSON_MAX_LINE_BYTES"
+            elif line.strip():
+                try:
+                    pending.append(
+                        CreateLogPayload.model_validate_json(line)
+                    )
+                except ValidationError as e:
+                    err = e.errors()[0]
+                    error = f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
+
+            if error:
+                chunk.rejected += 1
+                if len(chunk.errors) < NDJSON_MAX_ERRORS_PER_CHUNK:
+                    chunk.errors.append(
+                        NdjsonLineError(line=line_no, error=error)
+                    )
+
+            if len(pending) >= NDJSON_CHUNK_SIZE:
+                await flush_chunk()
+
+        if pending or chunk.rejected:
+            await flush_chunk()
+
+        if response.total_inserted:
+            background_tasks.add_task(
+                Audit_SQS.send_message,
+                {
+                    "type": "logs.created",
+                    "tenant_id": tenant_id,
+                    "count": response.total_inserted,
+                },
+            )
+
+        response.message = (
+            f"Processed {response.total_lines} lines, "
+            f"{response.total_inserted} logs created, "
+            f"{response.total_duplicates} duplicates ignored."
+        )
+        return response
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to create logs from NDJSON stream!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.post(
+    "/batch-get",
+    description="Get many logs by id (tenant-scoped)",
+    response_model=BatchGetLogsResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def batch_get_logs(
+    payload: BatchGetLogsPayload,
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+    fields: str = Query(
+        None,
+        description="Comma separated log fields to return, e.g. severity,action_type,timestamp",
+    ),
+):
+    """Resolve up to BATCH_GET_MAX_IDS log ids with one primary key lookup (Tenant-scoped)
+
+    Args:
+        payload (BatchGetLogsPayload): ids to look up, answered in the same order
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+        fields (str): Comma separated fields to select, every field if omitted
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        try:
+            selected_fields = PartialAuditLog.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        found = {
+            log.id: log
+            for log in await PGRetrieve(db).retrieve_logs(
+                tenant_id=tenant_id,
+                log_ids=list(dict.fromkeys(payload.ids)),
+                order_by_time=False,
+                fields=selected_fields,
+                # a failed lookup must not report every id missing
+                raise_errors=True,
+            )
+        }
+        missing = [
+            log_id for log_id in payload.ids if log_id not in found
+        ]
+
+        return BatchGetLogsResponse(
+            message=f"Retrieve {len(payload.ids) - len(missing)} logs successfully!",
+            logs=[found.get(log_id) for log_id in payload.ids],
+            missing=missing,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to get logs!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
 @router.delete(
     "/cleanup",
     description="Cleanup old logs (tenant-scoped)",
@@ -280,6 +872,10 @@ async def cleanup_old_logs(
 ):
     """Clean up retention logs api (Tenant-scoped)
 
+    Queues a background retention job deleting logs older than retention_hours
+    in batches, or returns the tenant's job already in progress. Poll
+    GET /cleanup/{job_id} for its progress.
+
     Args:
         token (TokenDependencies): JWT request for short-time authentication access
         request (Request): HTTP request to checkup rate limit declaration
@@ -297,13 +893,29 @@ async def cleanup_old_logs(
         if user_role and user_role == UserRoleEnum.AUDITOR:
             raise HTTPException(status_code=401, detail="User with AUDITOR role cannot have action on delete logs")
 
-        deleted_count = await PGDeletion(db).cleanup_old_logs(
-            tenant_id, retention_hours=retention_hours
+        job = await PGRetrieve(db).retrieve_retention_job(
+            tenant_id=tenant_id
         )
+        if not job:
+            job = await PGCreation(db).create_retention_job(
+                RetentionJob(
+                    tenant_id=tenant_id,
+                    retention_hours=retention_hours,
+                    cutoff=datetime.now(VIETNAM_TZ)
+                    - timedelta(hours=retention_hours),
+                    batch_size=RETENTION_BATCH_SIZE,
+                )
+            )
+        if not job:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to create retention job!",
+            )
 
         return CleanupLogResponse(
-            message=f"Cleanup completed successfully! {deleted_count} logs deleted.",
-            deleted_count=deleted_count,
+            message=f"Cleanup job {job.id} is {job.status.value}, {job.rows_deleted} logs deleted so far.",
+            deleted_count=job.rows_deleted,
+            job=job,
         )
     except HTTPException:
         raise
@@ -312,6 +924,100 @@ async def cleanup_old_logs(
         logger.error(f"{message}: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=message)
 
+
+@router.get(
+    "/cleanup/{job_id}",
+    description="Get progress of a cleanup job (tenant-scoped)",
+    response_model=CleanupLogResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_cleanup_job(
+    job_id: str,
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Get the progress of a retention job (Tenant-scoped)
+
+    Args:
+        job_id (str): id of the retention job returned by DELETE /cleanup
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        job = await PGRetrieve(db).retrieve_retention_job(
+            job_id=job_id, tenant_id=tenant_id
+        )
+        if not job:
+            raise HTTPException(
+                status_code=404, detail="Cleanup job not found"
+            )
+
+        return CleanupLogResponse(
+            message=f"Cleanup job {job.id} is {job.status.value}, {job.rows_deleted} logs deleted so far.",
+            deleted_count=job.rows_deleted,
+            job=job,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to retrieve cleanup job!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.get(
+    "/ingest/metrics",
+    description="Get write-behind ingestion buffer metrics",
+    response_model=GetIngestMetricsResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_ingest_metrics(
+    token: TokenDependencies,
+    request: Request,
+):
+    """Batch size and flush latency of the ingestion buffer (Admin only)
+
+    Args:
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        ingest_buffer = request.app.state.ingest_buffer
+        if not ingest_buffer:
+            return GetIngestMetricsResponse(
+                message="Ingestion buffer is disabled"
+            )
+
+        return GetIngestMetricsResponse(
+            message="Ingestion metrics retrieved successfully!",
+            metrics=ingest_buffer.get_metrics(),
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to get ingestion metrics!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
 @router.get(
     "/stats",
     description="Get log statistics (tenant-scoped)",
@@ -321,14 +1027,15 @@ async def cleanup_old_logs(
 async def get_logs_stats(
     token: TokenDependencies,
     request: Request,
-    db: AsyncSession = Depends(async_get_db),
 ):
     """Generate statstistic data for logs assume (Tenant-scoped)
 
+    Served from STATS_CACHE, concurrent misses of a tenant share one query
+    on a session of their own.
+
     Args:
         token (TokenDependencies): JWT request for short-time authentication access
         request (Request): HTTP request to checkup rate limit declaration
-        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
     """
     try:
         token_data = AuthenService.verify_token(token.credentials)
@@ -338,8 +1045,8 @@ async def get_logs_stats(
         if not tenant_id:
             raise HTTPException(status_code=401, detail="Tenant id is invalid")
 
-        stats = await PGRetrieve(db).get_logs_stats_by_tenant(
-            tenant_id
+        stats = await get_cached_stats(
+            request.app.state.db_sessionmaker, tenant_id
         )
 
         return GetLogsStatsResponse(
@@ -354,6 +1061,93 @@ async def get_logs_stats(
         raise HTTPException(status_code=500, detail=message)
 
 
+@router.get(
+    "/stats/timeseries",
+    description="Get log counts per time bucket (tenant-scoped)",
+    response_model=GetLogsTimeseriesResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_logs_timeseries(
+    token: TokenDependencies,
+    request: Request,
+    db: AsyncSession = Depends(async_get_db),
+    granularity: str = Query(
+        "hour", description="Bucket size: minute, hour or day"
+    ),
+    start_time: datetime = Query(
+        None,
+        description="Window start, defaults to 24 hours before end_time",
+    ),
+    end_time: datetime = Query(
+        None, description="Window end, defaults to now"
+    ),
+    severity: SeverityEnum = Query(
+        None, description="Filter by severity"
+    ),
+    action_type: ActionTypeEnum = Query(
+        None, description="Filter by action type"
+    ),
+    group_by: str = Query(
+        None, description="One series per severity or action_type"
+    ),
+):
+    """Log counts per minute / hour / day, served from rollups (Tenant-scoped)
+
+    Args:
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+        granularity (str): minute, hour or day, minute buckets only reach back ROLLUP_MINUTE_RETENTION_HOURS
+        start_time, end_time (datetime): window [start_time, end_time)
+        severity, action_type: only count logs matching them
+        group_by (str): severity or action_type, a single series if omitted
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        tenant_id = token_data.get("tenant_id", None)
+        if not tenant_id:
+            raise HTTPException(
+                status_code=401, detail="Tenant id is invalid"
+            )
+
+        if group_by not in (None, "severity", "action_type"):
+            raise HTTPException(
+                status_code=422,
+                detail="group_by must be severity or action_type",
+            )
+        end_time = end_time or datetime.now(VIETNAM_TZ)
+        start_time = start_time or end_time - timedelta(hours=24)
+
+        try:
+            timeseries = await PGRetrieve(db).get_logs_timeseries(
+                tenant_id,
+                granularity=granularity,
+                start=start_time,
+                end=end_time,
+                severity=severity,
+                action_type=action_type,
+                group_by=group_by,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if timeseries is None:
+            raise HTTPException(
+                status_code=500, detail="Failed to get log timeseries!"
+            )
+
+        return GetLogsTimeseriesResponse(
+            message="Log timeseries retrieved successfully!",
+            timeseries=timeseries,
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to get log timeseries!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
 @router.get(
     "/{id}",
     description="Search/filter logs (tenant-scoped)",
@@ -365,6 +1159,10 @@ async def get_logs(
     token: TokenDependencies,
     request: Request,
     db: AsyncSession = Depends(async_get_db),
+    fields: str = Query(
+        None,
+        description="Comma separated log fields to return, e.g. severity,action_type,timestamp",
+    ),
 ):
     """Get the range of logs by given id (Tenant-scoped)
 
@@ -373,6 +1171,7 @@ async def get_logs(
         request (Request): HTTP request to checkup rate limit declaration
         skip (int): Number of records to skip
         limit (int): Max records to return
+        fields (str): Comma separated fields to select, every field if omitted
         db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
     """
     try:
@@ -386,9 +1185,16 @@ async def get_logs(
         if not tenant_id:
             raise HTTPException(status_code=401, detail="Tenant id is invalid")
 
+        try:
+            selected_fields = PartialAuditLog.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
         logs = await PGRetrieve(db).retrieve_logs(
             tenant_id=token_data.get("tenant_id", None),
             log_id=id,
+            fields=selected_fields,
+            raise_errors=True,
         )
         if not logs:
             return GetLogsResponse(
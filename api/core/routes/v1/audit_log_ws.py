@@ -21,6 +21,7 @@ import traceback
 import json
 import asyncio
 from core.config import logger
+from core.services.ws_manager import LogStreamConnection
 
 router = APIRouter()
 
@@ -52,83 +53,26 @@ async def log_stream(websocket: WebSocket):
         return
     
     await websocket.accept()
-    sessionmaker = websocket.app.state.db_sessionmaker
 
-    try:
-        while True:
-            msg = await asyncio.wait_for(websocket.receive_text(), timeout=0.1)
-            parsed = json.loads(msg)
-
-            async with sessionmaker() as db:
-                if parsed["type"] == "chat":
-                    response: AgentResponseFormat = await AGENT.run(
-                        user_input=parsed["query"],
-                        conversation=[
-                            Conversation(
-                                role=ChatRoleEnum.SYSTEM, content=MASTER_PROMPT
-                            )
-                        ],
-                        additional_params=ToolAdditionalParams(
-                            {"tenant_id": tenant_id}
-                        ),
-                    )
-                    if response:
-                        try:
-                            response.content = json.loads(response.content).get("answer")
-                        except Exception:
-                            logger.warning(f"Cannot convert json package of Agent response: {traceback.format_exc()}")
-
-                        await websocket.send_json(
-                            {
-                                "type": "chat.response",
-                                "response": response.content
-                            }
-                        )
-
-                logs = await PGRetrieve(db).retrieve_logs(
-                    tenant_id=tenant_id, skip=0, limit=10
-                )
-                await websocket.send_json(
-                    {
-                        "type": "logs.view",
-                        "logs": [
-                            jsonable_encoder(log.model_dump())
-                            for log in logs
-                        ],
-                    }
-                )
-
-                await asyncio.sleep(2)
-
-                stats = await PGRetrieve(db).get_logs_stats_by_tenant(
-                    tenant_id=tenant_id
+    async def answer(query: str):
+        response: AgentResponseFormat = await AGENT.run(
+            user_input=query,
+            conversation=[
+                Conversation(
+                    role=ChatRoleEnum.SYSTEM, content=MASTER_PROMPT
                 )
-
-                await websocket.send_json(
-                    {
-                        "type": "logs.stats",
-                        **jsonable_encoder(stats)
-                    }
-                )
-                await asyncio.sleep(2)
-
-    except WebSocketDisconnect:
-        return
-
-    except Exception as e:
-        print(f"Error in log_stream: {e}\n{traceback.format_exc()}")
+            ],
+            additional_params=ToolAdditionalParams(
+                {"tenant_id": tenant_id}
+            ),
+        )
+        if not response:
+            return None
         try:
-            await websocket.send_json(
-                {
-                    "type": "ws.error",
-                    "message": "Internal server error during streaming.",
-                }
-            )
-        except:
-            pass
+            return json.loads(response.content).get("answer")
+        except Exception:
+            logger.warning(f"Cannot convert json package of Agent response: {traceback.format_exc()}")
+            return response.content
 
-    finally:
-        try:
-            await websocket.close()
-        except:
-            pass
+    # chat runs beside the log and stats pushes, see LogStreamConnection
+    await LogStreamConnection(websocket, tenant_id, chat=answer).run()
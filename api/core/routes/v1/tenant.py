@@ -4,10 +4,20 @@ from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import async_get_db
 from core.services.authentication import AuthenService
-from core.database.CRUD import PGRetrieve, PGCreation
+from core.database.CRUD import (
+    PGRetrieve,
+    PGCreation,
+    PGDeletion,
+    PGUpdate,
+)
 from core.schemas.payloads.tenant import *
-from core.schemas.v1.tenant import Tenant
+from core.schemas.v1.tenant import Tenant, RetentionPolicy
+from core.schemas.v1.job import KeyRotationJob
 from core.config import logger
+from core.config import (
+    KEY_ROTATION_BATCH_SIZE,
+    KEY_ROTATION_RATE_LIMIT,
+)
 import traceback
 from core.limiter import RATE_LIMITER
 
@@ -101,3 +111,331 @@ async def create_tenant(
         message = "Failed to create tenant!"
         logger.error(f"{message}: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=message)
+
+
+@router.post(
+    "/{tenant_id}/keys/rotate", response_model=RotateTenantKeyResponse
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def rotate_tenant_key(
+    tenant_id: str,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Rotate the data key of a tenant, new logs use the new version (based on Admin role only)
+
+    Args:
+        tenant_id (str): id of the tenant whose key is rotated.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        tenant = await PGRetrieve(db).retrieve_tenant(
+            tenant_id=tenant_id
+        )
+        if not tenant:
+            raise HTTPException(
+                status_code=404, detail="Tenant not found"
+            )
+        if tenant.keys_shredded_at:
+            raise HTTPException(
+                status_code=409, detail="Tenant keys are shredded"
+            )
+
+        version = await PGCreation(db).rotate_tenant_key(tenant_id)
+        if version is None:
+            raise HTTPException(
+                status_code=500, detail="Failed to rotate tenant key!"
+            )
+
+        return RotateTenantKeyResponse(
+            message="Rotate tenant key successfully!", version=version
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to rotate tenant key!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.delete(
+    "/{tenant_id}/keys", response_model=DeleteTenantKeysResponse
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def delete_tenant_keys(
+    tenant_id: str,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Offboard a tenant by destroying its data keys, its encrypted meta_data becomes unreadable (based on Admin role only)
+
+    Args:
+        tenant_id (str): id of the tenant to offboard.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        deleted_count = await PGDeletion(db).delete_tenant_keys(
+            tenant_id
+        )
+        if deleted_count is None:
+            raise HTTPException(
+                status_code=500, detail="Failed to delete tenant keys!"
+            )
+
+        return DeleteTenantKeysResponse(
+            message="Delete tenant keys successfully!",
+            deleted_count=deleted_count,
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to delete tenant keys!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.post(
+    "/keys/rotation-jobs", response_model=KeyRotationJobResponse
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def create_key_rotation_job(
+    payload: CreateKeyRotationJobPayload,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Start a background job re-encrypting stored meta_data with the current keys (based on Admin role only)
+
+    Args:
+        payload (CreateKeyRotationJobPayload): tenant scope (all tenants if omitted), batch size and rows per second.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        if payload.tenant_id and not await PGRetrieve(
+            db
+        ).retrieve_tenant(tenant_id=payload.tenant_id):
+            raise HTTPException(
+                status_code=404, detail="Tenant not found"
+            )
+
+        job = await PGCreation(db).create_key_rotation_job(
+            KeyRotationJob(
+                tenant_id=payload.tenant_id,
+                batch_size=payload.batch_size
+                or KEY_ROTATION_BATCH_SIZE,
+                rate_limit=payload.rate_limit
+                or KEY_ROTATION_RATE_LIMIT,
+            )
+        )
+        if not job:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to create key rotation job!",
+            )
+
+        return KeyRotationJobResponse(
+            message="Create key rotation job successfully!", job=job
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to create key rotation job!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.get(
+    "/keys/rotation-jobs/{job_id}",
+    response_model=KeyRotationJobResponse,
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_key_rotation_job(
+    job_id: str,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Get the progress of a key rotation job (based on Admin role only)
+
+    Args:
+        job_id (str): id of the key rotation job.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        job = await PGRetrieve(db).retrieve_key_rotation_job(
+            job_id=job_id
+        )
+        if not job:
+            raise HTTPException(
+                status_code=404, detail="Key rotation job not found"
+            )
+
+        return KeyRotationJobResponse(
+            message="Retrieve key rotation job successfully!", job=job
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to retrieve key rotation job!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.put(
+    "/{tenant_id}/retention", response_model=RetentionPolicyResponse
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def set_retention_policy(
+    tenant_id: str,
+    payload: SetRetentionPolicyPayload,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Set how long a tenant's logs are kept, enforced by the background retention job (based on Admin role only)
+
+    Args:
+        tenant_id (str): id of the tenant.
+        payload (SetRetentionPolicyPayload): retention window in hours.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        if not await PGRetrieve(db).retrieve_tenant(
+            tenant_id=tenant_id
+        ):
+            raise HTTPException(
+                status_code=404, detail="Tenant not found"
+            )
+
+        policy = await PGUpdate(db).upsert_retention_policy(
+            RetentionPolicy(
+                tenant_id=tenant_id,
+                retention_hours=payload.retention_hours,
+            )
+        )
+        if not policy:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to set retention policy!",
+            )
+
+        return RetentionPolicyResponse(
+            message="Set retention policy successfully!", policy=policy
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to set retention policy!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
+
+
+@router.get(
+    "/{tenant_id}/retention", response_model=RetentionPolicyResponse
+)
+@Limiter.limit(RATE_LIMITER.default_limit)
+async def get_retention_policy(
+    tenant_id: str,
+    request: Request,
+    token: TokenDependencies,
+    db: AsyncSession = Depends(async_get_db),
+):
+    """Get the retention policy of a tenant (based on Admin role only)
+
+    Args:
+        tenant_id (str): id of the tenant.
+        token (TokenDependencies): JWT request for short-time authentication access
+        request (Request): HTTP request to checkup rate limit declaration
+        db (AsyncSession, optional): sessionmaker for each connection request. Defaults to Depends(async_get_db).
+    """
+    try:
+        token_data = AuthenService.verify_token(token.credentials)
+
+        user_role = token_data.get("role", "")
+        if not AuthenService.is_admin_role(user_role):
+            raise HTTPException(
+                status_code=401,
+                detail=f"Role {user_role} is not authorized for this API.",
+            )
+
+        policies = await PGRetrieve(db).retrieve_retention_policies(
+            tenant_id=tenant_id
+        )
+        if not policies:
+            raise HTTPException(
+                status_code=404, detail="Retention policy not found"
+            )
+
+        return RetentionPolicyResponse(
+            message="Retrieve retention policy successfully!",
+            policy=policies[0],
+        )
+
+    except HTTPException:
+        raise
+    except Exception:
+        message = "Failed to retrieve retention policy!"
+        logger.error(f"{message}: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=message)
@@ -1,21 +1,69 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from core.schemas.v1.logs import AuditLog
-from core.schemas.v1.logs import LogStats
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Any, Union
+from core.schemas.v1.logs import AuditLog, PartialAuditLog
+from core.schemas.v1.logs import LogStats, LogTimeseries
+from core.schemas.v1.job import RetentionJob, ExportJob
+from core.schemas.v1.enum import (
+    ExportFormatEnum,
+    LogStreamFormatEnum,
+    SeverityEnum,
+    ActionTypeEnum,
+)
+from datetime import datetime
+from core.config import (
+    AUDIT_LOG_PARTITION_INTERVAL,
+    BATCH_GET_MAX_IDS,
+    LOG_ID_MAX_LENGTH,
+)
+import uuid
 
 
 class CreateLogPayload(AuditLog):
-    pass
+    id: str = Field(
+        default_factory=lambda: str(uuid.uuid4()),
+        max_length=LOG_ID_MAX_LENGTH,
+    )
+
+    @model_validator(mode="after")
+    def require_timestamp_with_id(self):
+        """
+        With timestamp partitions the idempotency key is (tenant_id, id,
+        timestamp), a retry given a new server timestamp would be stored
+        again, so a client supplied id needs its timestamp too
+        """
+        if (
+            AUDIT_LOG_PARTITION_INTERVAL != "none"
+            and "id" in self.model_fields_set
+            and self.timestamp is None
+        ):
+            raise ValueError(
+                "timestamp is required with id while audit_logs is"
+                " partitioned by time"
+            )
+        return self
 
 
 class LogEntryCreateResponse(BaseModel):
     message: str
     log: Optional[AuditLog] = None
+    duplicate: bool = False
 
 
 class GetLogsResponse(BaseModel):
     message: str
-    logs: Optional[List[AuditLog]] = None
+    logs: Optional[List[Union[AuditLog, PartialAuditLog]]] = None
+    next_cursor: Optional[str] = None
+
+
+class BatchGetLogsPayload(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class BatchGetLogsResponse(BaseModel):
+    message: str
+    # aligned with the requested ids, None where an id was not found
+    logs: List[Optional[Union[AuditLog, PartialAuditLog]]] = []
+    missing: List[str] = []
 
 
 class GetLogResponse(BaseModel):
@@ -26,6 +74,35 @@ class GetLogResponse(BaseModel):
 class BulkLogCreateResponse(BaseModel):
     message: str
     logs: Optional[List[AuditLog]] = None
+    duplicates: List[str] = []
+
+
+class NdjsonLineError(BaseModel):
+    line: int
+    error: str
+
+
+class NdjsonChunkResult(BaseModel):
+    chunk: int
+    first_line: int
+    last_line: int
+    inserted: int = 0
+    duplicates: List[str] = []
+    rejected: int = 0
+    spooled: int = 0
+    failed: int = 0
+    errors: List[NdjsonLineError] = []
+
+
+class NdjsonLogCreateResponse(BaseModel):
+    message: str
+    total_lines: int = 0
+    total_inserted: int = 0
+    total_duplicates: int = 0
+    total_rejected: int = 0
+    total_spooled: int = 0
+    total_failed: int = 0
+    chunks: List[NdjsonChunkResult] = []
 
 
 class CleanupLogPayload(BaseModel):
@@ -35,8 +112,51 @@ class CleanupLogPayload(BaseModel):
 class CleanupLogResponse(BaseModel):
     message: str
     deleted_count: Optional[int] = None
+    job: Optional[RetentionJob] = None
+
+
+class CreateExportJobPayload(BaseModel):
+    format: ExportFormatEnum = ExportFormatEnum.PARQUET
+    severity: Optional[SeverityEnum] = None
+    action_type: Optional[ActionTypeEnum] = None
+    resource_type: Optional[str] = None
+    resource_id: Optional[str] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+
+
+class ExportJobResponse(BaseModel):
+    message: str
+    job: Optional[ExportJob] = None
 
 
 class GetLogsStatsResponse(BaseModel):
     message: str
     response: Optional[LogStats] = None
+
+
+class GetLogsTimeseriesResponse(BaseModel):
+    message: str
+    timeseries: Optional[LogTimeseries] = None
+
+
+class GetIngestMetricsResponse(BaseModel):
+    message: str
+    metrics: Optional[Dict[str, Any]] = None
+
+
+class LogStreamFilters(BaseModel):
+    severity: Optional[SeverityEnum] = None
+    action_type: Optional[ActionTypeEnum] = None
+    resource_type: Optional[str] = None
+
+
+class LogStreamSubscribePayload(BaseModel):
+    """`subscribe` message of the /logs/stream socket"""
+
+    filters: LogStreamFilters = LogStreamFilters()
+    # cursor of the last logs.view or logs.delta received, to resume
+    cursor: Optional[str] = None
+    format: LogStreamFormatEnum = LogStreamFormatEnum.JSON
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from core.schemas.v1.tenant import Tenant
+from core.schemas.v1.tenant import Tenant, RetentionPolicy
+from core.schemas.v1.job import KeyRotationJob
 
 
 class ListTenantsResponse(BaseModel):
@@ -15,3 +16,33 @@ class CreateTenantPayload(BaseModel):
 class CreateTenantResponse(BaseModel):
     message: str
     tenant: Optional[Tenant] = None
+
+
+class RotateTenantKeyResponse(BaseModel):
+    message: str
+    version: Optional[int] = None
+
+
+class DeleteTenantKeysResponse(BaseModel):
+    message: str
+    deleted_count: Optional[int] = None
+
+
+class CreateKeyRotationJobPayload(BaseModel):
+    tenant_id: Optional[str] = None
+    batch_size: Optional[int] = Field(default=None, gt=0)
+    rate_limit: Optional[int] = Field(default=None, gt=0)
+
+
+class KeyRotationJobResponse(BaseModel):
+    message: str
+    job: Optional[KeyRotationJob] = None
+
+
+class SetRetentionPolicyPayload(BaseModel):
+    retention_hours: int = Field(gt=0)
+
+
+class RetentionPolicyResponse(BaseModel):
+    message: str
+    policy: Optional[RetentionPolicy] = None
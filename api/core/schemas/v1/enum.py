@@ -36,6 +36,27 @@ class LogStatsEnum(StrEnum):
     VIEW_LOGS = "view_logs"
 
 
+class TenantKeyStatusEnum(StrEnum):
+    ACTIVE = "active"
+    RETIRED = "retired"
+
+
+class JobStatusEnum(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ExportFormatEnum(StrEnum):
+    PARQUET = "parquet"
+
+
+class LogStreamFormatEnum(StrEnum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
 class ChatRoleEnum(StrEnum):
     USER = "user"
     ASSISTANT = "assistant"
@@ -0,0 +1,242 @@
+from core.schemas import Base
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    BigInteger,
+    JSON,
+    String,
+    Text,
+)
+from sqlalchemy.sql import func
+from core.schemas.base import BaseObject
+from core.schemas.v1.enum import JobStatusEnum, ExportFormatEnum
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class KeyRotationJob(BaseObject):
+    """Progress of a key rotation / re-encryption job over audit_logs"""
+
+    tenant_id: Optional[str] = None
+    status: JobStatusEnum = JobStatusEnum.PENDING
+    batch_size: int
+    rate_limit: int
+    partition: Optional[str] = None
+    last_tenant_id: Optional[str] = None
+    last_id: Optional[str] = None
+    partitions_total: int = 0
+    partitions_done: int = 0
+    rows_scanned: int = 0
+    rows_reencrypted: int = 0
+    rows_failed: int = 0
+    owner: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class KeyRotationJobTable(Base):
+    """
+    Checkpoint table of key rotation jobs. The worker walks leaf partitions
+    of audit_logs in name order and keyset order (tenant_id, id) inside
+    each one, so `partition` + `last_tenant_id` + `last_id` is enough to
+    resume after a restart.
+    """
+
+    __tablename__ = "key_rotation_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    status = Column(
+        String, nullable=False, default=JobStatusEnum.PENDING
+    )
+    batch_size = Column(Integer, nullable=False)
+    rate_limit = Column(Integer, nullable=False)
+    partition = Column(String, nullable=True)
+    last_tenant_id = Column(String, nullable=True)
+    last_id = Column(String, nullable=True)
+    partitions_total = Column(Integer, nullable=False, default=0)
+    partitions_done = Column(Integer, nullable=False, default=0)
+    rows_scanned = Column(Integer, nullable=False, default=0)
+    rows_reencrypted = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    # worker running the job, see PGUpdate.claim_job
+    owner = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class RetentionJob(BaseObject):
+    """Progress of a batched retention run over one tenant's logs"""
+
+    tenant_id: str
+    status: JobStatusEnum = JobStatusEnum.PENDING
+    retention_hours: int
+    cutoff: datetime
+    batch_size: int
+    partitions_dropped: int = 0
+    batches: int = 0
+    rows_deleted: int = 0
+    owner: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class RetentionJobTable(Base):
+    """
+    Retention runs, deleting logs older than `cutoff` in batches of
+    `batch_size`. Every batch commits with the counters, so a restarted
+    worker simply carries on deleting what is left.
+    """
+
+    __tablename__ = "retention_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    status = Column(
+        String, nullable=False, default=JobStatusEnum.PENDING
+    )
+    retention_hours = Column(Integer, nullable=False)
+    cutoff = Column(DateTime(timezone=True), nullable=False)
+    batch_size = Column(Integer, nullable=False)
+    partitions_dropped = Column(Integer, nullable=False, default=0)
+    batches = Column(Integer, nullable=False, default=0)
+    rows_deleted = Column(Integer, nullable=False, default=0)
+    owner = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ExportJob(BaseObject):
+    """Progress of a background export of one tenant's logs to a file"""
+
+    tenant_id: str
+    status: JobStatusEnum = JobStatusEnum.PENDING
+    format: ExportFormatEnum = ExportFormatEnum.PARQUET
+    filters: Optional[Dict[str, Any]] = None
+    row_group_size: int
+    rows_total: Optional[int] = None
+    rows_written: int = 0
+    row_groups: int = 0
+    size_bytes: int = 0
+    owner: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ExportJobTable(Base):
+    """
+    Export runs, writing the logs matching `filters` (a LogFilter) into
+    EXPORT_DIR one row group of `row_group_size` rows at a time. A file
+    cannot be appended to after a crash, so a restarted worker writes
+    the export again from the start.
+    """
+
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    status = Column(
+        String, nullable=False, default=JobStatusEnum.PENDING
+    )
+    format = Column(
+        String, nullable=False, default=ExportFormatEnum.PARQUET
+    )
+    filters = Column(JSON, nullable=True)
+    row_group_size = Column(Integer, nullable=False)
+    rows_total = Column(BigInteger, nullable=True)
+    rows_written = Column(BigInteger, nullable=False, default=0)
+    row_groups = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    owner = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class MigrationCheckpoint(BaseObject):
+    """Progress of a keyset walk migrating audit_logs, `id` names it"""
+
+    last_tenant_id: str = ""
+    last_id: str = ""
+    rows_converted: int = 0
+    rows_skipped: int = 0
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class MigrationCheckpointTable(Base):
+    """
+    Checkpoints of data migrations over audit_logs, one row per
+    migration. A batch locks the row until it commits, so a single
+    process migrates at a time and every process resumes where the
+    last batch, of any process, stopped.
+    """
+
+    __tablename__ = "migration_checkpoints"
+
+    id = Column(String, primary_key=True)
+    last_tenant_id = Column(String, nullable=False, default="")
+    last_id = Column(String, nullable=False, default="")
+    rows_converted = Column(BigInteger, nullable=False, default=0)
+    rows_skipped = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
-from datetime import datetime
+from pydantic import BaseModel, PrivateAttr, model_serializer
+from typing import Optional, Dict, Any, List, Set, Tuple
+from datetime import datetime, timedelta, timezone
+import base64
 from core.schemas.base import Base
 from sqlalchemy import (
     Column,
@@ -8,11 +9,14 @@ from sqlalchemy import (
     DateTime,
     Text,
     JSON,
+    LargeBinary,
     ForeignKey,
     Index,
     DDL,
     event,
     PrimaryKeyConstraint,
+    BigInteger,
+    text,
 )
 import uuid
 from sqlalchemy.sql import func
@@ -23,6 +27,9 @@ from core.schemas.v1.enum import (
     ActionTypeEnum,
 )
 from core.schemas.base import BaseObject
+from core.config import LOG_SEARCH_MODE, AUDIT_LOG_PARTITION_INTERVAL
+from core.config import VIETNAM_TZ, TIMESERIES_MAX_POINTS
+from core.config import ROLLUP_MINUTE_RETENTION_HOURS
 
 
 class LogStats(BaseModel):
@@ -43,6 +50,268 @@ class AuditLog(BaseObject):
     after_state: Optional[Dict[str, Any]] = None
     meta_data: Optional[Dict[str, Any]] = None
     timestamp: Optional[datetime] = None
+    # rank of a q= search hit, carried into the next cursor
+    _search_rank: Optional[float] = PrivateAttr(default=None)
+    # meta_data is None because it could not be decrypted
+    _meta_data_failed: bool = PrivateAttr(default=False)
+
+
+class PartialAuditLog(BaseModel):
+    """
+    AuditLog read with a `fields=` projection,
+    only the fields it was built with are serialized
+    """
+
+    id: Optional[str] = None
+    session_id: Optional[str] = None
+    action_type: Optional[ActionTypeEnum] = None
+    resource_type: Optional[str] = None
+    resource_id: Optional[str] = None
+    severity: Optional[SeverityEnum] = None
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    before_state: Optional[Dict[str, Any]] = None
+    after_state: Optional[Dict[str, Any]] = None
+    meta_data: Optional[Dict[str, Any]] = None
+    timestamp: Optional[datetime] = None
+    _search_rank: Optional[float] = PrivateAttr(default=None)
+
+    @model_serializer(mode="wrap")
+    def serialize_projected(self, handler):
+        data = handler(self)
+        return {
+            key: value
+            for key, value in data.items()
+            if key in self.model_fields_set
+        }
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+        """Parse a comma separated `fields=` value, None means every field"""
+        if not fields:
+            return None
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(AuditLog.model_fields)
+        if unknown:
+            raise ValueError(
+                f"Unknown log fields: {', '.join(sorted(unknown))}"
+            )
+        return requested or None
+
+
+class LogCursor(BaseModel):
+    """Keyset position of the last log of a page, opaque to clients"""
+
+    timestamp: datetime
+    id: str
+    # set on q= search pages, which are ordered by rank first
+    rank: Optional[float] = None
+
+    @classmethod
+    def after(cls, log: "AuditLog | PartialAuditLog") -> "LogCursor":
+        return cls(
+            timestamp=log.timestamp, id=log.id, rank=log._search_rank
+        )
+
+    def encode(self) -> str:
+        raw = self.model_dump_json().encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "LogCursor":
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return cls.model_validate_json(
+                base64.urlsafe_b64decode(padded)
+            )
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+
+# primary key and ON CONFLICT target, a unique key of a partitioned
+# table must contain the timestamp once it is a partition key
+AUDIT_LOG_KEY_COLUMNS: Tuple[str, ...] = ("tenant_id", "id")
+if AUDIT_LOG_PARTITION_INTERVAL != "none":
+    AUDIT_LOG_KEY_COLUMNS += ("timestamp",)
+
+# text fields searched by q=, the index and the query share this
+# expression so the planner can match them
+LOG_SEARCH_COLUMNS = (
+    "resource_type",
+    "resource_id",
+    "user_agent",
+    "ip_address",
+)
+LOG_SEARCH_DOCUMENT = " || ' ' || ".join(
+    f"coalesce({column}, '')" for column in LOG_SEARCH_COLUMNS
+)
+LOG_SEARCH_INDEXES = {
+    "trigram": "ix_audit_logs_search_trgm",
+    "fts": "ix_audit_logs_search_fts",
+}
+LOG_SEARCH_MIN_LENGTH = 3
+
+# composite (tenant_id, *columns, timestamp) indexes serving LogFilter,
+# a filter must bind the leading column of at least one of them
+LOG_FILTER_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "idx_audit_logs_tenant_sev_ts": ("severity",),
+    "ix_audit_logs_tenant_action_ts": ("action_type",),
+    "ix_audit_logs_tenant_resource_ts": (
+        "resource_type",
+        "resource_id",
+    ),
+    "ix_audit_logs_tenant_user_ts": ("user_id",),
+    "ix_audit_logs_tenant_session_ts": ("session_id",),
+}
+
+
+class LogFilter(BaseModel):
+    """Equality and time range filters of a tenant-scoped log query"""
+
+    severity: Optional[SeverityEnum] = None
+    action_type: Optional[ActionTypeEnum] = None
+    resource_type: Optional[str] = None
+    resource_id: Optional[str] = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    q: Optional[str] = None
+
+    def equalities(self) -> Dict[str, Any]:
+        return {
+            key: value
+            for key, value in self.model_dump(
+                exclude={"start_time", "end_time", "q"}
+            ).items()
+            if value is not None
+        }
+
+    def serving_index(self) -> str:
+        """
+        Name of the index answering this filter. Raises ValueError for
+        combinations that would fall back to scanning the partition.
+        """
+        if (
+            self.start_time
+            and self.end_time
+            and self.start_time >= self.end_time
+        ):
+            raise ValueError("start_time must be before end_time")
+
+        if self.q is not None:
+            # trigrams need 3 characters, shorter patterns scan
+            if len(self.q.strip()) < LOG_SEARCH_MIN_LENGTH:
+                raise ValueError(
+                    f"q must have at least {LOG_SEARCH_MIN_LENGTH} characters"
+                )
+            return LOG_SEARCH_INDEXES[LOG_SEARCH_MODE]
+
+        equalities = self.equalities()
+        if not equalities:
+            return "ix_audit_logs_tenant_ts_id"
+
+        best_index, best_prefix = None, 0
+        for index, columns in LOG_FILTER_INDEXES.items():
+            prefix = 0
+            for column in columns:
+                if column not in equalities:
+                    break
+                prefix += 1
+            if prefix > best_prefix:
+                best_index, best_prefix = index, prefix
+        if not best_index:
+            raise ValueError(
+                f"No index serves filtering by {', '.join(equalities)}, "
+                "add one of: "
+                + ", ".join(c[0] for c in LOG_FILTER_INDEXES.values())
+            )
+        return best_index
+
+
+TIMESERIES_GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def as_aware(moment: datetime) -> datetime:
+    """Naive datetimes are taken as UTC, like Postgres does with timestamptz"""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def truncate_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the minute / hour / day (in VIETNAM_TZ) holding `moment`"""
+    moment = (
+        as_aware(moment)
+        .astimezone(VIETNAM_TZ)
+        .replace(second=0, microsecond=0)
+    )
+    if granularity in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+class LogTimeseriesSeries(BaseModel):
+    """Counts aligned with LogTimeseries.buckets, for one group"""
+
+    severity: Optional[SeverityEnum] = None
+    action_type: Optional[ActionTypeEnum] = None
+    counts: List[int] = []
+
+
+class LogTimeseries(BaseModel):
+    granularity: str
+    buckets: List[datetime] = []
+    series: List[LogTimeseriesSeries] = []
+
+    @staticmethod
+    def bucket_range(
+        granularity: str, start: datetime, end: datetime
+    ) -> List[datetime]:
+        """
+        Bucket starts covering [start, end). Raises ValueError for an
+        unknown granularity, more than TIMESERIES_MAX_POINTS buckets or
+        minutes already compacted into hours.
+        """
+        if granularity not in TIMESERIES_GRANULARITIES:
+            raise ValueError(
+                "granularity must be one of: "
+                + ", ".join(TIMESERIES_GRANULARITIES)
+            )
+        start, end = as_aware(start), as_aware(end)
+        if start >= end:
+            raise ValueError("start_time must be before end_time")
+        if granularity == "minute" and start < datetime.now(
+            VIETNAM_TZ
+        ) - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS):
+            raise ValueError(
+                "minute buckets only cover the last "
+                f"{ROLLUP_MINUTE_RETENTION_HOURS} hours"
+            )
+        step = TIMESERIES_GRANULARITIES[granularity]
+        if (end - start) / step > TIMESERIES_MAX_POINTS:
+            raise ValueError(
+                f"More than {TIMESERIES_MAX_POINTS} {granularity} buckets, "
+                "narrow the window or use a coarser granularity"
+            )
+        bucket, buckets = truncate_bucket(start, granularity), []
+        while bucket < end:
+            buckets.append(bucket)
+            bucket += step
+        return buckets
+
+
+class LogWriteResult(BaseModel):
+    """Outcome of an idempotent write, `duplicates` were already stored"""
+
+    logs: List[AuditLog] = []
+    duplicates: List[str] = []
 
 
 class AuditLogTable(Base):
@@ -52,17 +321,24 @@ class AuditLogTable(Base):
 
     __tablename__ = "audit_logs"
     __table_args__ = (
-        PrimaryKeyConstraint("tenant_id", "id", name="pk_audit_logs"),
+        PrimaryKeyConstraint(
+            *AUDIT_LOG_KEY_COLUMNS, name="pk_audit_logs"
+        ),
         Index("ix_audit_logs_tenant_log", "tenant_id", "id"),
         Index("ix_audit_logs_tenant", "tenant_id"),
+        *(
+            Index(index, "tenant_id", *columns, "timestamp")
+            for index, columns in LOG_FILTER_INDEXES.items()
+        ),
+        # keyset pagination, matches ORDER BY timestamp DESC, id DESC
         Index(
-            "idx_audit_logs_tenant_sev_ts",
+            "ix_audit_logs_tenant_ts_id",
             "tenant_id",
-            "severity",
-            "timestamp",
+            text("timestamp DESC"),
+            text("id DESC"),
         ),
-        # Need to consider again for this partition
-        # {"postgresql_partition_by": "RANGE (timestamp)"}
+        # tenant partitions are sub-partitioned by RANGE (timestamp)
+        # when AUDIT_LOG_PARTITION_INTERVAL is set, see PGPartition
         {"postgresql_partition_by": "LIST (tenant_id)"},
     )
 
@@ -103,7 +379,9 @@ class AuditLogTable(Base):
     user_agent = Column(Text, nullable=True)
     before_state = Column(JSON, nullable=True)
     after_state = Column(JSON, nullable=True)
+    # legacy base64 cipher text, new rows use the meta_data_bin envelope
     meta_data = Column(String, nullable=True)
+    meta_data_bin = Column(LargeBinary, nullable=True)
     timestamp = Column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -111,6 +389,87 @@ class AuditLogTable(Base):
     )
 
 
+class LogCounterTable(Base):
+    """
+    Running count of a tenant's logs per severity x action_type, kept in
+    the same transaction as every write and delete of audit_logs so
+    /stats never scans the logs themselves. See PGCounter.
+    """
+
+    __tablename__ = "log_counters"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "tenant_id",
+            "severity",
+            "action_type",
+            name="pk_log_counters",
+        ),
+    )
+
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    severity = Column(severity_enum, nullable=False)
+    action_type = Column(action_type_enum, nullable=False)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class LogRollupMinuteTable(Base):
+    """
+    Logs per tenant x minute x severity x action_type, written with every
+    log batch. Buckets older than ROLLUP_MINUTE_RETENTION_HOURS are
+    compacted into LogRollupHourTable. See PGRollup.
+    """
+
+    __tablename__ = "log_rollups_minute"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "tenant_id",
+            "bucket",
+            "severity",
+            "action_type",
+            name="pk_log_rollups_minute",
+        ),
+    )
+
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    severity = Column(severity_enum, nullable=False)
+    action_type = Column(action_type_enum, nullable=False)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class LogRollupHourTable(Base):
+    """Hourly logs per tenant x severity x action_type, compacted minutes"""
+
+    __tablename__ = "log_rollups_hour"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "tenant_id",
+            "bucket",
+            "severity",
+            "action_type",
+            name="pk_log_rollups_hour",
+        ),
+    )
+
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    severity = Column(severity_enum, nullable=False)
+    action_type = Column(action_type_enum, nullable=False)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
 event.listen(
     AuditLogTable.__table__,
     "after_create",
@@ -1,12 +1,24 @@
 from core.schemas.base import Base, BaseObject
-from sqlalchemy import Column, String, DateTime
+from pydantic import BaseModel, Field
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Integer,
+    LargeBinary,
+    ForeignKey,
+    PrimaryKeyConstraint,
+)
+from core.schemas.v1.enum import TenantKeyStatusEnum
 import uuid
 from sqlalchemy.sql import func
 from typing import Optional
+from datetime import datetime
 
 
 class Tenant(BaseObject):
     name: Optional[str] = None
+    keys_shredded_at: Optional[datetime] = None
 
 
 class TenantTable(Base):
@@ -21,8 +33,67 @@ class TenantTable(Base):
         index=True,
     )
     name = Column(String, nullable=False)
+    # set when the tenant's data keys were destroyed (crypto-shredded)
+    keys_shredded_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
         nullable=False,
     )
+
+
+class TenantKeyTable(Base):
+    """Per-tenant data keys, wrapped (AES-GCM) by DATA_ENCRYPTION_KEY.
+    Only the `active` version encrypts, retired versions stay to decrypt.
+    """
+
+    __tablename__ = "tenant_keys"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "tenant_id", "version", name="pk_tenant_keys"
+        ),
+    )
+
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    version = Column(Integer, nullable=False)
+    wrapped_key = Column(LargeBinary, nullable=False)
+    status = Column(
+        String, nullable=False, default=TenantKeyStatusEnum.ACTIVE
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
+class RetentionPolicy(BaseModel):
+    tenant_id: str
+    retention_hours: int = Field(gt=0)
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class RetentionPolicyTable(Base):
+    """How long logs of a tenant are kept, enforced by retention jobs"""
+
+    __tablename__ = "retention_policies"
+
+    tenant_id = Column(
+        String,
+        ForeignKey("tenants.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    retention_hours = Column(Integer, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
@@ -1,17 +1,65 @@
 import asyncio
 import json
+import os
+import socket
+import time
+import uuid
 from core.services import Audit_SQS
 from abc import ABC, abstractmethod
-from core.database.CRUD import PGRetrieve
+from core.database.CRUD import (
+    PGRetrieve,
+    PGCreation,
+    PGUpdate,
+    PGDeletion,
+)
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from core.config import (
     ERROR_THRESHOLD,
     WARNING_THRESHOLD,
     CRITICAL_THRESHOLD,
     VIETNAM_TZ,
+    SPOOL_REPLAY_BATCH_SIZE,
+    SPOOL_REPLAY_INTERVAL,
+    META_DATA_MIGRATION_BATCH_SIZE,
+    META_DATA_MIGRATION_INTERVAL,
+    KEY_ROTATION_POLL_INTERVAL,
+    PARTITION_MAINTENANCE_INTERVAL,
+    RETENTION_BATCH_SIZE,
+    RETENTION_BATCH_SLEEP,
+    RETENTION_SCHEDULE_INTERVAL,
+    RETENTION_POLL_INTERVAL,
+    ROLLUP_MINUTE_RETENTION_HOURS,
+    ROLLUP_COMPACTION_INTERVAL,
+    EXPORT_FILE_TTL_HOURS,
+    EXPORT_POLL_INTERVAL,
+    AUDIT_USER_DB_URL,
+    LOG_HUB_CHANNEL,
+    LOG_HUB_NOTIFY_ENABLED,
+    LOG_HUB_RECONNECT_INTERVAL,
+    TENANT_KEYS_SHRED_CHANNEL,
+)
+from core.services.spool import SegmentSpool
+from core.services.stats_cache import STATS_CACHE
+from core.services.recent_logs import RECENT_LOGS
+from core.services.log_hub import LOG_HUB
+from core.database.migration import PGMigration
+from core.database.partition import PGPartition
+from core.database.rollup import PGRollup
+from core.schemas.v1.logs import AuditLog, LogFilter, truncate_bucket
+from core.database.CRUD.retrieve import stream_tenant_logs
+from core.services.parquet_export import (
+    ParquetExportWriter,
+    export_path,
+    prune_exports,
 )
-from core.schemas.v1.enum import SeverityEnum
-from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+import asyncpg
+from pathlib import Path
+from core.schemas.v1.enum import SeverityEnum, JobStatusEnum
+from core.schemas.v1.job import KeyRotationJob, RetentionJob, ExportJob
+from core.services.security import TENANT_KEYS, SecurityService
+from datetime import datetime, timedelta
 from core.services import Audit_SQS
 from core.config import logger
 import traceback
@@ -78,12 +126,636 @@ class StatsWorker(Worker):
 
 
 class BackgroundWorkers:
-    def __init__(self, sessionmaker: async_sessionmaker[AsyncSession]):
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker[AsyncSession],
+        log_spool: SegmentSpool = None,
+    ):
         self.sessionmaker = sessionmaker
+        self.log_spool = log_spool
         self.poll_interval: float = 1.0
         self.sqs_max_mess: int = 5
         self.sqs_wait_sec: int = 10
         self.sqs_visi_timeout: int = 30
+        self.spool_batch_size: int = SPOOL_REPLAY_BATCH_SIZE
+        self.spool_interval: float = SPOOL_REPLAY_INTERVAL
+        self.migration_batch_size: int = META_DATA_MIGRATION_BATCH_SIZE
+        self.migration_interval: float = META_DATA_MIGRATION_INTERVAL
+        # owner of the jobs this process claims
+        self.worker_id: str = (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+
+    async def partition_maintenance_loop(self):
+        """Create upcoming time partitions of every tenant ahead of time"""
+        while True:
+            try:
+                async with self.sessionmaker() as session:
+                    partition = PGPartition(session)
+                    for (
+                        tenant_id
+                    ) in await partition.list_partitioned_tenants():
+                        try:
+                            await partition.ensure_time_partitions(
+                                tenant_id
+                            )
+                            await session.commit()
+                        except Exception:
+                            # e.g. rows of that period in the default one
+                            logger.error(
+                                f"[WORKER][PARTITION ERROR] {tenant_id}: {traceback.format_exc()}"
+                            )
+                            await session.rollback()
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][PARTITION ERROR] {e}\n{traceback.format_exc()}"
+                )
+            await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+    async def rollup_compaction_loop(self):
+        """Fold minute rollups older than ROLLUP_MINUTE_RETENTION_HOURS into hours"""
+        while True:
+            try:
+                before = truncate_bucket(
+                    datetime.now(VIETNAM_TZ)
+                    - timedelta(hours=ROLLUP_MINUTE_RETENTION_HOURS),
+                    "hour",
+                )
+                async with self.sessionmaker() as session:
+                    moved = await PGRollup(session).compact(before)
+                    await session.commit()
+                if moved:
+                    logger.info(
+                        f"[WORKER][ROLLUP] Compacted {moved} minute buckets"
+                    )
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][ROLLUP ERROR] {e}\n{traceback.format_exc()}"
+                )
+            await asyncio.sleep(ROLLUP_COMPACTION_INTERVAL)
+
+    async def retention_loop(self):
+        """
+        Run retention jobs one at a time and, every
+        RETENTION_SCHEDULE_INTERVAL, queue a job for each tenant policy
+        """
+        loop = asyncio.get_running_loop()
+        next_schedule = loop.time()
+        while True:
+            try:
+                if loop.time() >= next_schedule:
+                    await self.schedule_retention_jobs()
+                    next_schedule = (
+                        loop.time() + RETENTION_SCHEDULE_INTERVAL
+                    )
+
+                async with self.sessionmaker() as session:
+                    job = await PGUpdate(session).claim_retention_job(
+                        self.worker_id
+                    )
+                if job:
+                    await self.run_retention_job(job)
+                else:
+                    await asyncio.sleep(RETENTION_POLL_INTERVAL)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][RETENTION ERROR] {e}\n{traceback.format_exc()}"
+                )
+                await asyncio.sleep(RETENTION_POLL_INTERVAL)
+
+    async def schedule_retention_jobs(self):
+        """Queue a retention job per policy, unless the tenant has one active"""
+        async with self.sessionmaker() as session:
+            for policy in await PGRetrieve(
+                session
+            ).retrieve_retention_policies():
+                if await PGRetrieve(session).retrieve_retention_job(
+                    tenant_id=policy.tenant_id
+                ):
+                    continue
+                await PGCreation(session).create_retention_job(
+                    RetentionJob(
+                        tenant_id=policy.tenant_id,
+                        retention_hours=policy.retention_hours,
+                        cutoff=datetime.now(VIETNAM_TZ)
+                        - timedelta(hours=policy.retention_hours),
+                        batch_size=RETENTION_BATCH_SIZE,
+                    )
+                )
+
+    async def run_retention_job(self, job: RetentionJob):
+        """
+        Drop whole expired time partitions, then delete the remaining
+        expired rows `job.batch_size` at a time, each batch committing
+        with the job counters and followed by RETENTION_BATCH_SLEEP
+        """
+        async with self.sessionmaker() as session:
+            try:
+                # idempotent, so a resumed job simply finds nothing left
+                dropped, rows = await PGPartition(
+                    session
+                ).drop_expired_partitions(job.tenant_id, job.cutoff)
+                job.partitions_dropped += dropped
+                job.rows_deleted += rows
+                job.status = JobStatusEnum.RUNNING
+                if not await PGUpdate(session).save_retention_job(job):
+                    raise Exception(
+                        "Failed to drop expired partitions"
+                    )
+                STATS_CACHE.bump(job.tenant_id)
+                RECENT_LOGS.invalidate(job.tenant_id)
+
+                while True:
+                    deleted = await PGDeletion(
+                        session
+                    ).delete_expired_logs_batch(
+                        job.tenant_id, job.cutoff, job.batch_size
+                    )
+                    job.batches += 1
+                    job.rows_deleted += deleted
+                    if deleted < job.batch_size:
+                        break
+                    if not await PGUpdate(session).save_retention_job(
+                        job
+                    ):
+                        raise Exception(
+                            f"Failed to checkpoint retention job {job.id}"
+                        )
+                    STATS_CACHE.bump(job.tenant_id)
+                    RECENT_LOGS.invalidate(job.tenant_id)
+                    await asyncio.sleep(RETENTION_BATCH_SLEEP)
+
+                job.status = JobStatusEnum.DONE
+                job.finished_at = datetime.now(VIETNAM_TZ)
+                await PGUpdate(session).save_retention_job(job)
+                STATS_CACHE.bump(job.tenant_id)
+                RECENT_LOGS.invalidate(job.tenant_id)
+                logger.info(
+                    f"[WORKER][RETENTION] Job {job.id} done, "
+                    f"{job.rows_deleted} logs deleted"
+                )
+
+            except Exception as e:
+                await session.rollback()
+                job.status = JobStatusEnum.FAILED
+                job.error = str(e)
+                await PGUpdate(session).save_retention_job(job)
+                raise
+
+    async def export_loop(self):
+        """Run export jobs one at a time, pruning expired files when idle"""
+        while True:
+            try:
+                async with self.sessionmaker() as session:
+                    job = await PGUpdate(session).claim_export_job(
+                        self.worker_id
+                    )
+                if job:
+                    await self.run_export_job(job)
+                    continue
+
+                pruned = prune_exports(EXPORT_FILE_TTL_HOURS)
+                if pruned:
+                    logger.info(
+                        f"[WORKER][EXPORT] Pruned {pruned} expired exports"
+                    )
+                await asyncio.sleep(EXPORT_POLL_INTERVAL)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][EXPORT ERROR] {e}\n{traceback.format_exc()}"
+                )
+                await asyncio.sleep(EXPORT_POLL_INTERVAL)
+
+    async def run_export_job(self, job: ExportJob):
+        """
+        Write the job's logs to a Parquet file, one row group per
+        server-side cursor batch. Rows are read on a session of their own
+        since committing progress would close the cursor.
+        """
+        columns = list(AuditLog.model_fields)
+        filters = LogFilter(**(job.filters or {}))
+        writer = None
+        async with self.sessionmaker() as session:
+            try:
+                job.rows_total = await PGRetrieve(session).count_logs(
+                    job.tenant_id, filters
+                )
+                # a resumed job starts over, its partial file is gone
+                job.status = JobStatusEnum.RUNNING
+                job.rows_written = job.row_groups = job.size_bytes = 0
+                if not await PGUpdate(session).save_export_job(job):
+                    raise Exception(
+                        f"Failed to start export job {job.id}"
+                    )
+
+                writer = await asyncio.to_thread(
+                    ParquetExportWriter, export_path(job.id), columns
+                )
+                async for rows in stream_tenant_logs(
+                    self.sessionmaker,
+                    job.tenant_id,
+                    columns,
+                    filters=filters,
+                    batch_size=job.row_group_size,
+                ):
+                    job.size_bytes = await asyncio.to_thread(
+                        writer.write, rows
+                    )
+                    job.rows_written += len(rows)
+                    job.row_groups += 1
+                    if not await PGUpdate(session).save_export_job(
+                        job
+                    ):
+                        raise Exception(
+                            f"Failed to checkpoint export job {job.id}"
+                        )
+
+                job.size_bytes = await asyncio.to_thread(writer.close)
+                job.status = JobStatusEnum.DONE
+                job.finished_at = datetime.now(VIETNAM_TZ)
+                await PGUpdate(session).save_export_job(job)
+                logger.info(
+                    f"[WORKER][EXPORT] Job {job.id} done, "
+                    f"{job.rows_written} logs in {job.row_groups} row groups"
+                )
+
+            except Exception as e:
+                if writer:
+                    await asyncio.to_thread(writer.abort)
+                await session.rollback()
+                job.status = JobStatusEnum.FAILED
+                job.error = str(e)
+                await PGUpdate(session).save_export_job(job)
+                raise
+
+    async def log_hub_listener_loop(self):
+        """
+        LISTEN on one connection outside the pool for shredded tenant
+        keys and, when LOG_HUB_NOTIFY_ENABLED, for inserted log ids to
+        relay to this process' LOG_HUB subscribers
+        """
+        dsn = (
+            make_url(AUDIT_USER_DB_URL)
+            .set(drivername="postgresql")
+            .render_as_string(hide_password=False)
+        )
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                notifications: asyncio.Queue = asyncio.Queue()
+                conn = await asyncpg.connect(dsn)
+                conn.add_termination_listener(
+                    lambda _: notifications.put_nowait(None)
+                )
+                if LOG_HUB_NOTIFY_ENABLED:
+                    await conn.add_listener(
+                        LOG_HUB_CHANNEL,
+                        lambda *args: notifications.put_nowait(
+                            args[-1]
+                        ),
+                    )
+                await conn.add_listener(
+                    TENANT_KEYS_SHRED_CHANNEL,
+                    lambda *args: self.forget_tenant_keys(args[-1]),
+                )
+                if connected_before:
+                    # notifications sent while reconnecting are lost,
+                    # shredded keys are reloaded through the tombstone
+                    LOG_HUB.mark_lagged()
+                    TENANT_KEYS.clear()
+                connected_before = True
+
+                while True:
+                    payload = await notifications.get()
+                    if payload is None:
+                        raise ConnectionError(
+                            "LISTEN connection closed"
+                        )
+                    await self.relay_notification(payload)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][LOG HUB ERROR] {e}\n{traceback.format_exc()}"
+                )
+            finally:
+                if conn and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(LOG_HUB_RECONNECT_INTERVAL)
+
+    def forget_tenant_keys(self, tenant_id: str):
+        """Another process shredded the tenant's keys, drop ours too"""
+        TENANT_KEYS.shred(tenant_id)
+        RECENT_LOGS.invalidate(tenant_id)
+
+    async def relay_notification(self, payload: str):
+        """Read the announced logs once and publish them, if anyone listens"""
+        message = LOG_HUB.parse_payload(payload)
+        if not message:
+            return
+        tenant_id = message["tenant_id"]
+        STATS_CACHE.bump(tenant_id)
+        if not LOG_HUB.has_subscribers(tenant_id):
+            RECENT_LOGS.invalidate(tenant_id)
+            return
+
+        async with self.sessionmaker() as session:
+            logs = await PGRetrieve(session).retrieve_logs(
+                tenant_id=tenant_id, log_ids=message["ids"]
+            )
+        if not logs:
+            RECENT_LOGS.invalidate(tenant_id)
+            return
+        # oldest first, like the batches writers publish
+        logs.reverse()
+        RECENT_LOGS.add(tenant_id, logs)
+        LOG_HUB.publish(tenant_id, logs)
+
+    async def key_rotation_loop(self):
+        """
+        Run key rotation jobs one at a time, a job whose worker stopped
+        resumes first
+        """
+        while True:
+            try:
+                async with self.sessionmaker() as session:
+                    job = await PGUpdate(
+                        session
+                    ).claim_key_rotation_job(self.worker_id)
+                if job:
+                    await self.run_key_rotation_job(job)
+                else:
+                    await asyncio.sleep(KEY_ROTATION_POLL_INTERVAL)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][KEY ROTATION ERROR] {e}\n{traceback.format_exc()}"
+                )
+                await asyncio.sleep(KEY_ROTATION_POLL_INTERVAL)
+
+    async def run_key_rotation_job(self, job: KeyRotationJob):
+        """
+        Re-wrap tenant keys, then re-encrypt meta_data partition by
+        partition from the job checkpoint onwards
+        """
+        try:
+            async with self.sessionmaker() as session:
+                if job.status == JobStatusEnum.PENDING:
+                    if (
+                        await PGUpdate(session).rewrap_tenant_keys(
+                            job.tenant_id
+                        )
+                        is None
+                    ):
+                        raise Exception(
+                            "Failed to re-wrap tenant keys"
+                        )
+                    job.status = JobStatusEnum.RUNNING
+
+                partitions = await PGRetrieve(
+                    session
+                ).list_log_partitions(job.tenant_id)
+                job.partitions_total = len(partitions)
+                if not await PGUpdate(session).save_key_rotation_job(
+                    job
+                ):
+                    raise Exception(
+                        f"Failed to start key rotation job {job.id}"
+                    )
+
+            for index, partition in enumerate(partitions):
+                if job.partition and partition < job.partition:
+                    continue
+                after = ("", "")
+                if partition == job.partition:
+                    after = (
+                        job.last_tenant_id or "",
+                        job.last_id or "",
+                    )
+                await self.reencrypt_partition(job, partition, after)
+                job.partitions_done = index + 1
+
+            job.status = JobStatusEnum.DONE
+            job.finished_at = datetime.now(VIETNAM_TZ)
+            async with self.sessionmaker() as session:
+                await PGUpdate(session).save_key_rotation_job(job)
+            logger.info(
+                f"[WORKER][KEY ROTATION] Job {job.id} done, "
+                f"{job.rows_reencrypted} rows re-encrypted"
+            )
+
+        except Exception as e:
+            job.status = JobStatusEnum.FAILED
+            job.error = str(e)
+            async with self.sessionmaker() as session:
+                await PGUpdate(session).save_key_rotation_job(job)
+            raise
+
+    async def reencrypt_partition(
+        self, job: KeyRotationJob, partition: str, after: tuple
+    ):
+        """Keyset walk over one partition, each batch commits with its checkpoint"""
+        while True:
+            started = time.monotonic()
+            async with self.sessionmaker() as session:
+                rows = await PGRetrieve(
+                    session
+                ).retrieve_meta_data_batch(
+                    partition, after, job.batch_size, job.tenant_id
+                )
+                if not rows:
+                    return
+
+                tenant_ids = [row.tenant_id for row in rows]
+                ciphertexts = [
+                    (
+                        row.meta_data_bin
+                        if row.meta_data_bin is not None
+                        else row.meta_data
+                    )
+                    for row in rows
+                ]
+                key_versions = set()
+                for tenant_id, value in zip(tenant_ids, ciphertexts):
+                    version = SecurityService.envelope_key_version(
+                        value
+                    )
+                    if version:
+                        key_versions.add((tenant_id, version))
+                for tenant_id in set(tenant_ids):
+                    await PGCreation(session).ensure_tenant_key(
+                        tenant_id
+                    )
+                await PGRetrieve(session).load_tenant_keys(
+                    key_versions
+                )
+
+                results = await SecurityService().reencrypt_many(
+                    ciphertexts, tenant_ids
+                )
+                updates = []
+                for row, value, result in zip(
+                    rows, ciphertexts, results
+                ):
+                    if value is None or result is None:
+                        continue
+                    if isinstance(result, Exception):
+                        job.rows_failed += 1
+                        continue
+                    updates.append(
+                        {
+                            "tenant_id": row.tenant_id,
+                            "id": row.id,
+                            "meta_data": (
+                                result
+                                if isinstance(result, str)
+                                else None
+                            ),
+                            "meta_data_bin": (
+                                result
+                                if isinstance(result, bytes)
+                                else None
+                            ),
+                        }
+                    )
+                await PGUpdate(session).update_meta_data(
+                    partition, updates
+                )
+
+                job.rows_scanned += len(rows)
+                job.rows_reencrypted += len(updates)
+                job.partition = partition
+                job.last_tenant_id, job.last_id = (
+                    rows[-1].tenant_id,
+                    rows[-1].id,
+                )
+                if not await PGUpdate(session).save_key_rotation_job(
+                    job
+                ):
+                    raise Exception(
+                        f"Failed to checkpoint key rotation job {job.id}"
+                    )
+
+            after = (job.last_tenant_id, job.last_id)
+            # throttle to job.rate_limit rows per second
+            await asyncio.sleep(
+                max(
+                    0.0,
+                    len(rows) / job.rate_limit
+                    - (time.monotonic() - started),
+                )
+            )
+
+    async def meta_data_migration_loop(self):
+        """
+        Convert legacy base64 meta_data into bytea envelopes, one batch at
+        a time from the persisted checkpoint. Processes take turns on the
+        checkpoint, a batch is never migrated twice.
+        """
+        while True:
+            try:
+                async with self.sessionmaker() as session:
+                    checkpoint = await PGMigration(
+                        db=session
+                    ).migrate_meta_data_batch(
+                        batch_size=self.migration_batch_size,
+                    )
+                if checkpoint is None:
+                    # another process is migrating a batch
+                    await asyncio.sleep(self.poll_interval * 30)
+                    continue
+                if checkpoint.finished_at:
+                    logger.info(
+                        f"[WORKER][META MIGRATION] Done, {checkpoint.rows_converted} rows converted, "
+                        f"{checkpoint.rows_skipped} skipped"
+                    )
+                    return
+                await asyncio.sleep(self.migration_interval)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][META MIGRATION ERROR] {e}\n{traceback.format_exc()}"
+                )
+                await asyncio.sleep(self.poll_interval * 30)
+
+    async def spool_replay_loop(self):
+        """Drain sealed spool segments into audit_logs in large batches"""
+        while True:
+            try:
+                segments = self.log_spool.sealed_segments()
+                if (
+                    not segments
+                    and self.log_spool.has_active_records()
+                ):
+                    await asyncio.to_thread(self.log_spool.seal)
+                    segments = self.log_spool.sealed_segments()
+
+                for segment in segments:
+                    if not await self.replay_segment(segment):
+                        break
+
+                await asyncio.sleep(self.spool_interval)
+
+            except Exception as e:
+                logger.error(
+                    f"[WORKER][SPOOL ERROR] {e}\n{traceback.format_exc()}"
+                )
+                await asyncio.sleep(self.spool_interval)
+
+    async def replay_segment(self, segment: Path) -> bool:
+        """Replay one segment from its last ack, False if DB is unavailable"""
+        batch, tenant_ids = [], set()
+        for offset, row in self.log_spool.read_segment(
+            segment, self.log_spool.load_ack(segment)
+        ):
+            batch.append(row)
+            tenant_ids.add(row.get("tenant_id"))
+            if len(batch) >= self.spool_batch_size:
+                if not await self.replay_rows(batch):
+                    return False
+                self.log_spool.ack(segment, offset)
+                batch = []
+
+        if batch and not await self.replay_rows(batch):
+            return False
+
+        self.log_spool.remove_segment(segment)
+        logger.info(f"[WORKER][SPOOL] Replayed segment {segment.name}")
+        for tenant_id in tenant_ids:
+            await asyncio.to_thread(
+                Audit_SQS.send_message,
+                {"type": "logs.created", "tenant_id": tenant_id},
+            )
+        return True
+
+    async def replay_rows(self, rows: list[dict]) -> bool:
+        async with self.sessionmaker() as session:
+            # ids are idempotency keys, rows already replayed are skipped
+            duplicates = await PGCreation(session).insert_log_rows(
+                rows
+            )
+            if duplicates is not None:
+                return True
+
+            try:
+                await session.execute(text("SELECT 1"))
+                await session.rollback()
+            except Exception:
+                logger.warning("[WORKER][SPOOL] Database unavailable")
+                return False
+
+            # database is up, so isolate the rows it keeps rejecting
+            for row in rows:
+                duplicates = await PGCreation(session).insert_log_rows(
+                    [row]
+                )
+                if duplicates is None:
+                    self.log_spool.dead_letter(row)
+            return True
 
     async def worker_loop(self):
         while True:
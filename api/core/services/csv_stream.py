@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List
+from core.config import EXPORT_GZIP_LEVEL
+
+
+def csv_value(value):
+    """Cell of a CSV row, JSON for dicts and lists, ISO 8601 for times"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def iter_csv_chunks(
+    batches: AsyncIterator[List[tuple]],
+    header: List[str],
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Encode batches of rows as CSV, one chunk per batch so only the
+    batch being written is kept in memory. With `gzip` the chunks form
+    a single gzip member, compressed incrementally.
+    """
+    compressor = (
+        zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        if gzip
+        else None
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(header)
+    async for rows in batches:
+        writer.writerows(
+            [csv_value(value) for value in row] for row in rows
+        )
+        chunk = drain()
+        if chunk:
+            yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,95 @@
+import hashlib
+import math
+from collections import OrderedDict
+from typing import Iterable
+from core.config import (
+    DEDUP_FILTER_CAPACITY,
+    DEDUP_FILTER_ERROR_RATE,
+    DEDUP_MAX_TENANTS,
+)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys using double hashing"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(
+            8,
+            int(-capacity * math.log(error_rate) / (math.log(2) ** 2)),
+        )
+        self.hash_count = max(
+            1, round(self.size / capacity * math.log(2))
+        )
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return (
+            (h1 + i * h2) % self.size for i in range(self.hash_count)
+        )
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7))
+            for pos in self._positions(key)
+        )
+
+
+class TenantDedupFilter:
+    """
+    Per-tenant filter of log ids written by this process.
+    A miss means the id is new as far as this process knows, so the
+    write can skip the conflict path; a hit (or a COPY conflict caused
+    by another process) sends the row through ON CONFLICT DO NOTHING.
+    Each tenant keeps a current and a previous generation so a full
+    filter ages out instead of saturating; idle tenants are evicted LRU.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEDUP_FILTER_CAPACITY,
+        error_rate: float = DEDUP_FILTER_ERROR_RATE,
+        max_tenants: int = DEDUP_MAX_TENANTS,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_tenants = max_tenants
+        self.filters: OrderedDict[str, list[BloomFilter]] = (
+            OrderedDict()
+        )
+
+    def might_contain(self, tenant_id: str, log_id: str) -> bool:
+        generations = self.filters.get(tenant_id)
+        if not generations:
+            return False
+        self.filters.move_to_end(tenant_id)
+        return any(log_id in bloom for bloom in generations)
+
+    def add(self, tenant_id: str, log_ids: Iterable[str]):
+        generations = self.filters.get(tenant_id)
+        if generations is None:
+            generations = [BloomFilter(self.capacity, self.error_rate)]
+            self.filters[tenant_id] = generations
+            if len(self.filters) > self.max_tenants:
+                self.filters.popitem(last=False)
+        self.filters.move_to_end(tenant_id)
+
+        for log_id in log_ids:
+            if generations[0].count >= self.capacity:
+                generations.insert(
+                    0, BloomFilter(self.capacity, self.error_rate)
+                )
+                del generations[2:]
+            generations[0].add(log_id)
+
+
+DEDUP_FILTER = TenantDedupFilter()
@@ -0,0 +1,250 @@
+import asyncio
+import time
+import traceback
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from core.config import (
+    INGEST_FLUSH_INTERVAL_MS,
+    INGEST_BATCH_SIZE,
+    INGEST_MAX_PENDING,
+    logger,
+)
+from core.database.CRUD import PGCreation
+from core.database.engine import is_connection_error
+from core.database.CRUD.creation import LogKey
+from core.schemas.v1.logs import AuditLog, LogWriteResult
+from core.services.spool import SegmentSpool
+
+BATCH_SIZE_BUCKETS = [1, 10, 50, 100, 250, 500, 1000, 5000]
+FLUSH_LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+PendingLog = Tuple[AuditLog, str, str, asyncio.Future]
+# queued by stop(), the flusher returns once it reaches it
+STOP = None
+
+
+class Histogram:
+    """Cumulative bucket counter, last bucket catches everything above"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class IngestMetrics:
+    def __init__(self):
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.flush_latency_ms = Histogram(FLUSH_LATENCY_BUCKETS_MS)
+        self.rows_written: int = 0
+        self.rows_failed: int = 0
+        self.rows_spooled: int = 0
+        self.rows_duplicate: int = 0
+        self.failed_batches: int = 0
+
+    def snapshot(self, pending: int = 0) -> dict:
+        return {
+            "pending": pending,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_spooled": self.rows_spooled,
+            "rows_duplicate": self.rows_duplicate,
+            "failed_batches": self.failed_batches,
+            "batch_size": self.batch_size.snapshot(),
+            "flush_latency_ms": self.flush_latency_ms.snapshot(),
+        }
+
+
+class IngestBuffer:
+    """
+    Write-behind buffer for single-log ingestion.
+    Callers submit a log and wait; a flusher collects pending logs
+    for up to `flush_interval_ms` or `batch_size` rows, writes them with
+    one multi-row INSERT and acknowledges each caller once committed.
+    """
+
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker[AsyncSession],
+        flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_pending: int = INGEST_MAX_PENDING,
+        log_spool: SegmentSpool = None,
+    ):
+        self.sessionmaker = sessionmaker
+        self.log_spool = log_spool
+        self.flush_interval: float = flush_interval_ms / 1000
+        self.batch_size: int = batch_size
+        self.queue: asyncio.Queue[Optional[PendingLog]] = (
+            asyncio.Queue(maxsize=max_pending)
+        )
+        self.metrics = IngestMetrics()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        """
+        Stop the flusher once it wrote whatever is still pending. It is
+        not cancelled, a batch being flushed is always acknowledged.
+        """
+        if self._task:
+            if not self._task.done():
+                await self.queue.put(STOP)
+                await self._task
+            self._task = None
+        # logs queued behind the sentinel, or after the flusher died
+        while not self.queue.empty():
+            batch = []
+            while (
+                not self.queue.empty() and len(batch) < self.batch_size
+            ):
+                item = self.queue.get_nowait()
+                if item is not STOP:
+                    batch.append(item)
+            if batch:
+                await self.flush_batch(batch)
+
+    async def submit(
+        self, log: AuditLog, tenant_id: str, user_id: str
+    ) -> Optional[LogWriteResult]:
+        """Queue a log and wait until its batch is committed"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((log, tenant_id, user_id, future))
+        return await future
+
+    async def flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(
+                            self.queue.get(), timeout=remaining
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                if item is STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self.flush_batch(batch)
+            if stopping:
+                return
+
+    async def flush_batch(self, batch: List[PendingLog]):
+        """Flush, failing the batch's callers if the flush raises"""
+        try:
+            await self.flush(batch)
+        except Exception:
+            logger.error(
+                f"[INGEST][FLUSH ERROR] {traceback.format_exc()}"
+            )
+            self._resolve(batch, ok=False)
+
+    async def flush(self, batch: List[PendingLog]):
+        started = time.perf_counter()
+        async with self.sessionmaker() as session:
+            tenant_ids = {tenant_id for _, tenant_id, _, _ in batch}
+            for tenant_id in tenant_ids:
+                await PGCreation(session).ensure_tenant_key(tenant_id)
+            rows = await PGCreation.prepare_log_rows(
+                [
+                    (log, tenant_id, user_id)
+                    for log, tenant_id, user_id, _ in batch
+                ]
+            )
+            try:
+                duplicates = await PGCreation(session).insert_log_rows(
+                    rows,
+                    logs=[log for log, _, _, _ in batch],
+                    raise_errors=True,
+                )
+                error = None
+            except Exception as e:
+                duplicates, error = None, e
+            if duplicates is not None:
+                self._resolve(batch, ok=True, duplicates=duplicates)
+            elif self.log_spool and is_connection_error(error):
+                # the database is unreachable, replay retries the batch;
+                # rows it rejects are isolated below instead
+                self.metrics.failed_batches += 1
+                await asyncio.to_thread(self.log_spool.append, rows)
+                self._resolve(batch, ok=True, spooled=True)
+            else:
+                # isolate the bad rows so they only fail their own caller
+                self.metrics.failed_batches += 1
+                for item, row in zip(batch, rows):
+                    duplicates = await PGCreation(
+                        session
+                    ).insert_log_rows([row], logs=[item[0]])
+                    self._resolve(
+                        [item],
+                        ok=duplicates is not None,
+                        duplicates=duplicates,
+                    )
+
+        self.metrics.batch_size.observe(len(batch))
+        self.metrics.flush_latency_ms.observe(
+            (time.perf_counter() - started) * 1000
+        )
+
+    def _resolve(
+        self,
+        batch: List[PendingLog],
+        ok: bool,
+        spooled: bool = False,
+        duplicates: Optional[List[LogKey]] = None,
+    ):
+        flags = PGCreation.mark_duplicates(
+            [(tenant_id, log.id) for log, tenant_id, _, _ in batch],
+            duplicates or [],
+        )
+        for (log, _, _, future), duplicate in zip(batch, flags):
+            result = None
+            if spooled:
+                self.metrics.rows_spooled += 1
+                result = LogWriteResult(logs=[log])
+            elif not ok:
+                self.metrics.rows_failed += 1
+            elif duplicate:
+                self.metrics.rows_duplicate += 1
+                result = LogWriteResult(duplicates=[log.id])
+            else:
+                self.metrics.rows_written += 1
+                result = LogWriteResult(logs=[log])
+            if not future.done():
+                future.set_result(result)
+
+    def get_metrics(self) -> dict:
+        return self.metrics.snapshot(pending=self.queue.qsize())
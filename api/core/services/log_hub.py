@@ -0,0 +1,137 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from core.config import (
+    LOG_HUB_MAX_PENDING,
+    LOG_HUB_NOTIFY_BYTES,
+    LOG_HUB_NOTIFY_IDS,
+)
+from core.schemas.v1.logs import AuditLog
+
+
+class LogSubscription:
+    """New logs of one tenant queued for one consumer, e.g. a socket"""
+
+    def __init__(self, tenant_id: str, max_pending: int):
+        self.tenant_id = tenant_id
+        self.queue: asyncio.Queue[List[AuditLog]] = asyncio.Queue(
+            maxsize=max_pending
+        )
+        # set when batches were dropped, the consumer must resync
+        self.lagged: bool = False
+
+    def put(self, logs: List[AuditLog]):
+        try:
+            self.queue.put_nowait(logs)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self) -> List[AuditLog]:
+        """Wait for new logs, then take every batch queued so far"""
+        logs = list(await self.queue.get())
+        while not self.queue.empty():
+            logs.extend(self.queue.get_nowait())
+        return logs
+
+
+class LogHub:
+    """
+    In-process fan-out of committed logs to the subscribers of a tenant.
+    Writers publish their own logs directly and NOTIFY the ids of every
+    insert with this process as `origin`; one listener per process relays
+    the notifications of other processes (or of writers that could not
+    publish) after reading those logs once, whatever the subscriber count.
+    Only used from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_pending: int = LOG_HUB_MAX_PENDING):
+        self.max_pending = max_pending
+        self.origin: str = uuid.uuid4().hex
+        self.subscribers: Dict[str, Set[LogSubscription]] = (
+            defaultdict(set)
+        )
+
+    def subscribe(self, tenant_id: str) -> LogSubscription:
+        subscription = LogSubscription(tenant_id, self.max_pending)
+        self.subscribers[tenant_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        subscribers = self.subscribers.get(subscription.tenant_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscribers[subscription.tenant_id]
+
+    def has_subscribers(self, tenant_id: str) -> bool:
+        return bool(self.subscribers.get(tenant_id))
+
+    def mark_lagged(self):
+        """Ask every subscriber to resync, e.g. after missed notifications"""
+        for subscribers in self.subscribers.values():
+            for subscription in subscribers:
+                subscription.lagged = True
+                # wakes a consumer waiting in get()
+                subscription.put([])
+
+    def publish(self, tenant_id: str, logs: List[AuditLog]):
+        if not logs:
+            return
+        for subscription in self.subscribers.get(tenant_id, ()):
+            subscription.put(logs)
+
+    def notify_payloads(
+        self, rows: List[dict], published: bool
+    ) -> List[str]:
+        """
+        NOTIFY payloads announcing inserted rows, at most
+        LOG_HUB_NOTIFY_IDS ids and LOG_HUB_NOTIFY_BYTES bytes each.
+        Without `published` no origin is set, so this process relays
+        them to its own subscribers as well.
+        """
+        ids_by_tenant = defaultdict(list)
+        for row in rows:
+            ids_by_tenant[row["tenant_id"]].append(row["id"])
+        origin = self.origin if published else None
+        payloads = []
+        for tenant_id, log_ids in ids_by_tenant.items():
+
+            def payload(ids: List[str]) -> str:
+                return json.dumps(
+                    {
+                        "origin": origin,
+                        "tenant_id": tenant_id,
+                        "ids": ids,
+                    }
+                )
+
+            # ASCII only (json escapes the rest), so characters are bytes
+            empty_size = len(payload([]))
+            ids, size = [], empty_size
+            for log_id in log_ids:
+                # the quoted id and its ", " separator
+                id_size = len(json.dumps(log_id)) + 2
+                if ids and (
+                    len(ids) >= LOG_HUB_NOTIFY_IDS
+                    or size + id_size > LOG_HUB_NOTIFY_BYTES
+                ):
+                    payloads.append(payload(ids))
+                    ids, size = [], empty_size
+                ids.append(log_id)
+                size += id_size
+            if ids:
+                payloads.append(payload(ids))
+        return payloads
+
+    def parse_payload(self, payload: str) -> Optional[dict]:
+        """Notification to relay, None when this process published it"""
+        message = json.loads(payload)
+        if message.get("origin") == self.origin:
+            return None
+        return message
+
+
+LOG_HUB = LogHub()
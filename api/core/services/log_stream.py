@@ -0,0 +1,106 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Union
+from core.schemas.v1.enum import LogStreamFormatEnum
+from core.schemas.v1.logs import (
+    AuditLog,
+    LogCursor,
+    LogFilter,
+    as_aware,
+)
+from core.schemas.payloads.logs import LogStreamSubscribePayload
+
+try:
+    import msgpack
+except ImportError:  # optional, only msgpack frames need it
+    msgpack = None
+
+
+class LogStreamView:
+    """
+    What one /logs/stream socket subscribed to and what it was sent.
+    Until the client subscribes it gets full `logs.view` pushes; after,
+    only the new logs matching its filters, with a cursor to resume from.
+    """
+
+    def __init__(self):
+        self.subscribed: bool = False
+        self.filters: Dict[str, Any] = {}
+        self.format: LogStreamFormatEnum = LogStreamFormatEnum.JSON
+        self.cursor: Optional[LogCursor] = None
+        # ids of the last replay, the hub may still deliver them
+        self.replayed_ids: Set[str] = set()
+        self.stats: Optional[dict] = None
+
+    def subscribe(self, payload: LogStreamSubscribePayload):
+        """Raises ValueError for a bad cursor or msgpack not installed"""
+        if (
+            payload.format == LogStreamFormatEnum.MSGPACK
+            and not msgpack
+        ):
+            raise ValueError(
+                "msgpack frames require msgpack installed"
+            )
+        self.cursor = (
+            LogCursor.decode(payload.cursor)
+            if payload.cursor
+            else None
+        )
+        self.filters = payload.filters.model_dump(exclude_none=True)
+        self.format = payload.format
+        self.replayed_ids = set()
+        self.subscribed = True
+
+    def log_filter(self) -> LogFilter:
+        return LogFilter(**self.filters)
+
+    def replayed(self, logs: List[AuditLog]):
+        """Logs read from the database for this socket"""
+        self.replayed_ids = {log.id for log in logs}
+        self.advance(logs)
+
+    def select(self, logs: List[AuditLog]) -> List[AuditLog]:
+        """New logs from the hub to send, the cursor moves past them"""
+        selected = [
+            log
+            for log in logs
+            if log.id not in self.replayed_ids
+            and all(
+                getattr(log, field) == value
+                for field, value in self.filters.items()
+            )
+        ]
+        self.advance(selected)
+        return selected
+
+    def advance(self, logs: List[AuditLog]):
+        for log in logs:
+            position = (as_aware(log.timestamp), log.id)
+            if self.cursor and position <= (
+                as_aware(self.cursor.timestamp),
+                self.cursor.id,
+            ):
+                continue
+            self.cursor = LogCursor(timestamp=log.timestamp, id=log.id)
+
+    def stats_changed(self, stats: dict) -> bool:
+        """True once per distinct stats, so unchanged ones are not resent"""
+        if stats == self.stats:
+            return False
+        self.stats = stats
+        return True
+
+    def logs_message(
+        self, type: str, logs: List[AuditLog], **extra
+    ) -> dict:
+        return {
+            "type": type,
+            "logs": [log.model_dump(mode="json") for log in logs],
+            "cursor": self.cursor.encode() if self.cursor else None,
+            **extra,
+        }
+
+    def frame(self, message: dict) -> Union[str, bytes]:
+        """Text frame of JSON, or a binary one with the msgpack format"""
+        if self.format == LogStreamFormatEnum.MSGPACK:
+            return msgpack.packb(message)
+        return json.dumps(message)
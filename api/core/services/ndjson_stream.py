@@ -0,0 +1,39 @@
+from typing import AsyncIterator, Optional, Tuple
+from core.config import NDJSON_MAX_LINE_BYTES
+
+
+async def iter_ndjson_lines(
+    stream: AsyncIterator[bytes],
+    max_line_bytes: int = NDJSON_MAX_LINE_BYTES,
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Split a byte stream into (line number, line) as data arrives,
+    only the unfinished tail is kept in memory. Lines longer than
+    `max_line_bytes` are dropped and yielded as None.
+    """
+    buffer = bytearray()
+    line_no = 0
+    oversized = False
+
+    async for data in stream:
+        buffer.extend(data)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_no += 1
+            yield line_no, (
+                None if oversized else bytes(buffer[start:end])
+            )
+            oversized = False
+            start = end + 1
+        del buffer[:start]
+
+        if len(buffer) > max_line_bytes:
+            oversized = True
+            buffer.clear()
+
+    if oversized or buffer.strip():
+        line_no += 1
+        yield line_no, None if oversized else bytes(buffer)
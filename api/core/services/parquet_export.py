@@ -0,0 +1,117 @@
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List
+from core.config import EXPORT_DIR, logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only Parquet exports need it
+    pa = pq = None
+
+JSON_COLUMNS = {"before_state", "after_state", "meta_data"}
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def export_path(job_id: str) -> Path:
+    return Path(EXPORT_DIR, f"{job_id}.parquet")
+
+
+def export_schema(columns: List[str]):
+    """
+    Arrow schema of exported logs: real timestamps, and JSON columns
+    annotated as JSON where pyarrow supports it (>= 19), so DuckDB and
+    pandas read them back as JSON rather than plain text
+    """
+    json_type = (
+        pa.json_(pa.string()) if hasattr(pa, "json_") else pa.string()
+    )
+    fields = []
+    for column in columns:
+        if column in JSON_COLUMNS:
+            fields.append((column, json_type))
+        elif column == "timestamp":
+            fields.append((column, pa.timestamp("us", tz="UTC")))
+        else:
+            fields.append((column, pa.string()))
+    return pa.schema(fields)
+
+
+class ParquetExportWriter:
+    """
+    Write batches of log rows as row groups of a Parquet file. Rows go to
+    a `.part` file of this writer, renamed to `path` on close, so a file
+    only appears under its final name once it is complete, and a worker
+    that lost its job never writes into the file of the new owner. Calls
+    block on CPU and disk, run them in a thread.
+    """
+
+    def __init__(self, path: Path, columns: List[str]):
+        self.path = path
+        self.part_path = path.with_name(
+            f"{path.name}.{uuid.uuid4().hex[:8]}.part"
+        )
+        self.columns = columns
+        self.schema = export_schema(columns)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer = pq.ParquetWriter(
+            self.part_path, self.schema, compression="zstd"
+        )
+
+    def write(self, rows: List[tuple]) -> int:
+        """Append `rows` as one row group, returns the file size so far"""
+        values = list(zip(*rows))
+        arrays = []
+        for i, column in enumerate(self.columns):
+            data = values[i]
+            if column in JSON_COLUMNS:
+                data = [
+                    None if v is None else json.dumps(v, default=str)
+                    for v in data
+                ]
+            elif column != "timestamp":
+                data = [None if v is None else str(v) for v in data]
+            arrays.append(
+                pa.array(data, type=self.schema.field(i).type)
+            )
+        self.writer.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            row_group_size=len(rows),
+        )
+        return self.part_path.stat().st_size
+
+    def close(self) -> int:
+        """Finish the file and move it to its final name, returns its size"""
+        self.writer.close()
+        os.replace(self.part_path, self.path)
+        return self.path.stat().st_size
+
+    def abort(self):
+        try:
+            self.writer.close()
+        finally:
+            self.part_path.unlink(missing_ok=True)
+
+
+def prune_exports(ttl_hours: int) -> int:
+    """Delete export files older than `ttl_hours`, returns how many"""
+    if not EXPORT_DIR.exists():
+        return 0
+    expire_before = time.time() - ttl_hours * 3600
+    pruned = 0
+    for path in EXPORT_DIR.glob("*.parquet*"):
+        try:
+            if path.stat().st_mtime < expire_before:
+                path.unlink()
+                pruned += 1
+        except FileNotFoundError:
+            continue
+        except OSError:
+            logger.error(f"[EXPORT] Failed to prune {path}")
+    return pruned
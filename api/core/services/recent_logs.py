@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from core.config import (
+    RECENT_LOGS_SIZE,
+    RECENT_LOGS_MAX_TENANTS,
+    RECENT_LOGS_TTL,
+)
+from core.schemas.v1.logs import AuditLog, as_aware
+
+
+def _newest_first(log: AuditLog) -> Tuple:
+    return (as_aware(log.timestamp), log.id)
+
+
+class RecentLogs:
+    """
+    Per-tenant ring of the newest `size` decrypted logs, in the
+    (timestamp, id) DESC order of head-of-list reads. A tenant's ring is
+    filled from one query on its first read, then kept current by the
+    local create paths, so later head reads skip the database and
+    decryption. Idle tenants are evicted LRU beyond `max_tenants`, and a
+    ring expires after `ttl` seconds to pick up writes of other processes.
+    A tenant's version only counts writes while a fill of it is in
+    flight, so a fill racing a write is not kept, and is dropped with its
+    last fill.
+    """
+
+    def __init__(
+        self,
+        size: int = RECENT_LOGS_SIZE,
+        max_tenants: int = RECENT_LOGS_MAX_TENANTS,
+        ttl: float = RECENT_LOGS_TTL,
+    ):
+        self.size = size
+        self.max_tenants = max_tenants
+        self.ttl = ttl
+        self.rings: OrderedDict[str, Tuple[List[AuditLog], float]] = (
+            OrderedDict()
+        )
+        self.versions: Dict[str, int] = {}
+        self.filling: Dict[str, int] = {}
+
+    def get(
+        self, tenant_id: str, limit: int
+    ) -> Optional[List[AuditLog]]:
+        """Newest `limit` logs, None unless the ring can answer"""
+        if limit > self.size:
+            return None
+        entry = self.rings.get(tenant_id)
+        if not entry:
+            return None
+        if entry[1] < time.monotonic():
+            del self.rings[tenant_id]
+            return None
+        self.rings.move_to_end(tenant_id)
+        return entry[0][:limit]
+
+    def start_fill(self, tenant_id: str) -> int:
+        """Version to pass to `fill`, which must follow in any case"""
+        self.filling[tenant_id] = self.filling.get(tenant_id, 0) + 1
+        return self.versions.get(tenant_id, 0)
+
+    def fill(
+        self,
+        tenant_id: str,
+        logs: Optional[List[AuditLog]],
+        version: int,
+    ):
+        """
+        End a fill, storing the newest logs read from the database unless
+        they are None or a write since `version` may be missing from them
+        """
+        fresh = self.versions.get(tenant_id, 0) == version
+        self.filling[tenant_id] -= 1
+        if not self.filling[tenant_id]:
+            del self.filling[tenant_id]
+            self.versions.pop(tenant_id, None)
+        if logs is None or not fresh:
+            return
+        self.rings[tenant_id] = (
+            logs[: self.size],
+            time.monotonic() + self.ttl,
+        )
+        self.rings.move_to_end(tenant_id)
+        while len(self.rings) > self.max_tenants:
+            self.rings.popitem(last=False)
+
+    def add(self, tenant_id: str, logs: List[AuditLog]):
+        """
+        Merge committed logs into the tenant's ring, if it has one. Logs
+        already in it (e.g. a fill that read them back) are skipped.
+        """
+        self._bump(tenant_id)
+        entry = self.rings.get(tenant_id)
+        if not entry or not logs:
+            return
+        seen = {log.id for log in entry[0]}
+        new = []
+        for log in logs:
+            if log.id not in seen:
+                seen.add(log.id)
+                new.append(log)
+        ring = sorted(entry[0] + new, key=_newest_first, reverse=True)
+        self.rings[tenant_id] = (ring[: self.size], entry[1])
+
+    def invalidate(self, tenant_id: str):
+        """Drop a ring after writes or deletes it cannot apply"""
+        self._bump(tenant_id)
+        self.rings.pop(tenant_id, None)
+
+    def _bump(self, tenant_id: str):
+        if tenant_id in self.filling:
+            self.versions[tenant_id] = (
+                self.versions.get(tenant_id, 0) + 1
+            )
+
+
+RECENT_LOGS = RecentLogs()
@@ -1,31 +1,462 @@
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import asyncio
 import base64
-from core.config import DATA_ENCRYPTION_KEY
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from core.config import (
+    DATA_ENCRYPTION_KEY,
+    DATA_ENCRYPTION_KEY_PREVIOUS,
+    META_DATA_FORMAT,
+    CRYPTO_WORKERS,
+    CRYPTO_PARALLEL_THRESHOLD,
+    TENANT_KEY_CACHE_SIZE,
+    TENANT_KEY_CACHE_TTL,
+)
 import json
 from core.config import os
-from typing import Union, Dict
+from typing import Callable, Union, Dict, List, Optional, Set, Tuple
+
+# version byte prefixed to binary envelopes:
+# 0x01 = nonce + ciphertext under DATA_ENCRYPTION_KEY
+# 0x02 = key version (uint32) + nonce + ciphertext under a tenant key
+ENVELOPE_V1 = b"\x01"
+ENVELOPE_V2 = b"\x02"
+KEY_VERSION = struct.Struct(">I")
+
+# AES-GCM releases the GIL, so large batches scale across these threads
+CRYPTO_EXECUTOR = ThreadPoolExecutor(
+    max_workers=CRYPTO_WORKERS, thread_name_prefix="crypto"
+)
+
+
+@lru_cache(maxsize=1)
+def get_cipher() -> AESGCM:
+    """Process-wide AES-GCM context, built once from DATA_ENCRYPTION_KEY"""
+    return AESGCM(base64.b64decode(DATA_ENCRYPTION_KEY))
+
+
+@lru_cache(maxsize=1)
+def get_previous_cipher() -> Optional[AESGCM]:
+    """AES-GCM context of the replaced master key, if one is configured"""
+    if not DATA_ENCRYPTION_KEY_PREVIOUS:
+        return None
+    return AESGCM(base64.b64decode(DATA_ENCRYPTION_KEY_PREVIOUS))
+
+
+class TenantKeyCache:
+    """
+    LRU of unwrapped tenant data keys as ready AESGCM contexts.
+    Entries expire after `ttl` seconds so a rotation done by another
+    process is picked up; guarded by a lock because crypto batches
+    read it from CRYPTO_EXECUTOR threads.
+    """
+
+    def __init__(
+        self,
+        max_size: int = TENANT_KEY_CACHE_SIZE,
+        ttl: int = TENANT_KEY_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.ciphers: OrderedDict[
+            Tuple[str, int], Tuple[AESGCM, float]
+        ] = OrderedDict()
+        self.active: Dict[str, Tuple[int, float]] = {}
+        # tenants whose keys were destroyed, never given a key again
+        self.shredded: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def get(self, tenant_id: str, version: int) -> Optional[AESGCM]:
+        with self.lock:
+            entry = self.ciphers.get((tenant_id, version))
+            if not entry:
+                return None
+            if entry[1] < time.monotonic():
+                del self.ciphers[(tenant_id, version)]
+                return None
+            self.ciphers.move_to_end((tenant_id, version))
+            return entry[0]
+
+    def put(
+        self,
+        tenant_id: str,
+        version: int,
+        cipher: AESGCM,
+        active: bool = False,
+    ):
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            if tenant_id in self.shredded:
+                return
+            self.ciphers[(tenant_id, version)] = (cipher, expires_at)
+            self.ciphers.move_to_end((tenant_id, version))
+            while len(self.ciphers) > self.max_size:
+                self.ciphers.popitem(last=False)
+            if active:
+                self.active[tenant_id] = (version, expires_at)
+
+    def active_version(self, tenant_id: str) -> Optional[int]:
+        """Active key version of a tenant, if known and still cached"""
+        with self.lock:
+            entry = self.active.get(tenant_id)
+            if not entry or entry[1] < time.monotonic():
+                return None
+            if (tenant_id, entry[0]) not in self.ciphers:
+                return None
+            return entry[0]
+
+    def evict(self, tenant_id: str):
+        with self.lock:
+            self.active.pop(tenant_id, None)
+            for key in [k for k in self.ciphers if k[0] == tenant_id]:
+                del self.ciphers[key]
+
+    def shred(self, tenant_id: str):
+        """Drop the keys of a crypto-shredded tenant, for good"""
+        with self.lock:
+            self.shredded.add(tenant_id)
+        self.evict(tenant_id)
+
+    def is_shredded(self, tenant_id: str) -> bool:
+        return tenant_id in self.shredded
+
+    def clear(self):
+        """Forget every key, e.g. after missing a shred notification"""
+        with self.lock:
+            self.ciphers.clear()
+            self.active.clear()
+
+
+TENANT_KEYS = TenantKeyCache()
 
 
 class SecurityService:
     def __init__(self):
-        self.encryption_key = base64.b64decode(DATA_ENCRYPTION_KEY)
-        self.aesgcm = AESGCM(self.encryption_key)
+        self.aesgcm = get_cipher()
 
-    def encrypt_field(self, plaintext: Union[str, Dict]) -> str:
-        """encrypt AES-GCM which has 12 bytes length for nonce, and remaind 12 bytes for ciphertext"""
+    def _encrypt(
+        self,
+        plaintext: Union[str, Dict],
+        cipher: AESGCM = None,
+        aad: bytes = None,
+    ) -> bytes:
         if isinstance(plaintext, Dict):
             plaintext = json.dumps(plaintext)
 
         nonce = os.urandom(12)
-        ct = self.aesgcm.encrypt(nonce, plaintext.encode(), None)
-        return base64.b64encode(nonce + ct).decode()
+        return nonce + (cipher or self.aesgcm).encrypt(
+            nonce, plaintext.encode(), aad
+        )
 
-    def decrypt_field(self, ciphertext_b64: str) -> str | Dict:
-        """descrypt AES-GCM which has 12 bytes length for nonce, and remaind 12 bytes for ciphertext"""
-        data = base64.b64decode(ciphertext_b64)
+    def _master_decrypt(
+        self, nonce: bytes, ct: bytes, aad: bytes = None
+    ) -> bytes:
+        """decrypt with the master key, falling back to the previous one"""
+        try:
+            return self.aesgcm.decrypt(nonce, ct, aad)
+        except InvalidTag:
+            previous = get_previous_cipher()
+            if previous is None:
+                raise
+            return previous.decrypt(nonce, ct, aad)
+
+    def _decrypt(
+        self, data: bytes, cipher: AESGCM = None, aad: bytes = None
+    ) -> str | Dict:
         nonce, ct = data[:12], data[12:]
-        pt = self.aesgcm.decrypt(nonce, ct, None)
+        pt = (
+            cipher.decrypt(nonce, ct, aad)
+            if cipher
+            else self._master_decrypt(nonce, ct, aad)
+        )
         try:
             return json.loads(pt.decode())
         except Exception:
             return pt.decode()
+
+    def encrypt_field(self, plaintext: Union[str, Dict]) -> str:
+        """encrypt AES-GCM which has 12 bytes length for nonce, and remaind 12 bytes for ciphertext"""
+        return base64.b64encode(self._encrypt(plaintext)).decode()
+
+    def decrypt_field(self, ciphertext_b64: str) -> str | Dict:
+        """descrypt AES-GCM which has 12 bytes length for nonce, and remaind 12 bytes for ciphertext"""
+        return self._decrypt(base64.b64decode(ciphertext_b64))
+
+    # ------------------------- tenant keys -------------------------
+    def wrap_key(
+        self, tenant_id: str, version: int, key: bytes
+    ) -> bytes:
+        """wrap a tenant data key with DATA_ENCRYPTION_KEY"""
+        nonce = os.urandom(12)
+        aad = f"{tenant_id}:{version}".encode()
+        return nonce + self.aesgcm.encrypt(nonce, key, aad)
+
+    def unwrap_key(
+        self, tenant_id: str, version: int, wrapped_key: bytes
+    ) -> bytes:
+        wrapped_key = bytes(wrapped_key)
+        aad = f"{tenant_id}:{version}".encode()
+        return self._master_decrypt(
+            wrapped_key[:12], wrapped_key[12:], aad
+        )
+
+    def rewrap_key(
+        self, tenant_id: str, version: int, wrapped_key: bytes
+    ) -> Optional[bytes]:
+        """Re-wrap a key still wrapped by the previous master key, else None"""
+        wrapped_key = bytes(wrapped_key)
+        aad = f"{tenant_id}:{version}".encode()
+        try:
+            self.aesgcm.decrypt(
+                wrapped_key[:12], wrapped_key[12:], aad
+            )
+            return None
+        except InvalidTag:
+            key = self.unwrap_key(tenant_id, version, wrapped_key)
+            return self.wrap_key(tenant_id, version, key)
+
+    def new_tenant_key(self, tenant_id: str, version: int) -> bytes:
+        """Generate a tenant data key and return it wrapped for storage"""
+        key = AESGCM.generate_key(bit_length=256)
+        return self.wrap_key(tenant_id, version, key)
+
+    def load_tenant_key(
+        self,
+        tenant_id: str,
+        version: int,
+        wrapped_key: bytes,
+        active: bool = False,
+    ):
+        """Unwrap a stored tenant key into the TENANT_KEYS cache"""
+        key = self.unwrap_key(tenant_id, version, wrapped_key)
+        TENANT_KEYS.put(tenant_id, version, AESGCM(key), active=active)
+
+    @staticmethod
+    def envelope_key_version(value) -> Optional[int]:
+        """Tenant key version a v2 envelope was written with, else None"""
+        if (
+            isinstance(value, (bytes, memoryview))
+            and bytes(value[:1]) == ENVELOPE_V2
+        ):
+            return KEY_VERSION.unpack_from(value, 1)[0]
+        return None
+
+    # ------------------------- envelopes ---------------------------
+    def encrypt_envelope(
+        self, plaintext: Union[str, Dict], tenant_id: str = None
+    ) -> bytes:
+        """
+        encrypt into a binary envelope, with the tenant's active key when
+        it is cached (v2) or DATA_ENCRYPTION_KEY otherwise (v1)
+        """
+        version = (
+            TENANT_KEYS.active_version(tenant_id)
+            if tenant_id
+            else None
+        )
+        cipher = (
+            TENANT_KEYS.get(tenant_id, version) if version else None
+        )
+        if cipher is None:
+            return ENVELOPE_V1 + self._encrypt(plaintext)
+        return (
+            ENVELOPE_V2
+            + KEY_VERSION.pack(version)
+            + self._encrypt(plaintext, cipher, aad=tenant_id.encode())
+        )
+
+    def decrypt_envelope(
+        self, envelope: bytes, tenant_id: str = None
+    ) -> str | Dict:
+        """decrypt a binary envelope produced by `encrypt_envelope`"""
+        envelope = bytes(envelope)
+        if envelope[:1] == ENVELOPE_V1:
+            return self._decrypt(envelope[1:])
+        if envelope[:1] == ENVELOPE_V2:
+            version = KEY_VERSION.unpack_from(envelope, 1)[0]
+            cipher = TENANT_KEYS.get(tenant_id, version)
+            if cipher is None:
+                raise KeyError(
+                    f"Key {version} of tenant {tenant_id} is not loaded"
+                )
+            return self._decrypt(
+                envelope[1 + KEY_VERSION.size :],
+                cipher,
+                aad=tenant_id.encode(),
+            )
+        raise ValueError(
+            f"Unknown envelope version {envelope[:1].hex()}"
+        )
+
+    def decrypt_value(
+        self, value: Union[str, bytes], tenant_id: str = None
+    ) -> str | Dict:
+        """decrypt either a binary envelope or a legacy base64 string"""
+        if isinstance(value, str):
+            return self.decrypt_field(value)
+        return self.decrypt_envelope(value, tenant_id)
+
+    def _is_current(
+        self, value: Union[str, bytes], tenant_id: str
+    ) -> bool:
+        """Whether a stored value is already encrypted the way new rows are"""
+        active = (
+            TENANT_KEYS.active_version(tenant_id)
+            if META_DATA_FORMAT == "bytea"
+            else None
+        )
+        version = self.envelope_key_version(value)
+        if META_DATA_FORMAT == "bytea" and isinstance(value, str):
+            return False
+        if META_DATA_FORMAT != "bytea" and not isinstance(value, str):
+            return False
+        if version is not None or active is not None:
+            return version == active
+
+        # v1 envelope or base64 text, current only under today's master key
+        data = (
+            base64.b64decode(value)
+            if isinstance(value, str)
+            else bytes(value)[1:]
+        )
+        try:
+            self._decrypt(data, cipher=self.aesgcm)
+            return True
+        except InvalidTag:
+            return False
+
+    def reencrypt_value(
+        self, value: Union[str, bytes], tenant_id: str
+    ) -> Union[str, bytes, None]:
+        """
+        Re-encrypt a stored value with the current master or tenant key,
+        None when it is already current. Tenant keys must be loaded first.
+        """
+        if self._is_current(value, tenant_id):
+            return None
+        plaintext = self.decrypt_value(value, tenant_id)
+        if META_DATA_FORMAT == "bytea":
+            return self.encrypt_envelope(plaintext, tenant_id)
+        return self.encrypt_field(plaintext)
+
+    # ------------------------- batches -----------------------------
+    def _encrypt_chunk(self, items: List) -> List[Optional[str]]:
+        return [
+            self.encrypt_field(value) if value else None
+            for value, _ in items
+        ]
+
+    def _encrypt_envelope_chunk(
+        self, items: List
+    ) -> List[Optional[bytes]]:
+        return [
+            self.encrypt_envelope(value, tenant_id) if value else None
+            for value, tenant_id in items
+        ]
+
+    def _decrypt_chunk(self, items: List) -> List:
+        """
+        Decrypt a chunk. Values of crypto-shredded tenants become None,
+        other failures are returned as the exception
+        """
+        result = []
+        for value, tenant_id in items:
+            try:
+                result.append(
+                    self.decrypt_value(value, tenant_id)
+                    if isinstance(value, (str, bytes, memoryview))
+                    and value
+                    else None
+                )
+            except Exception as e:
+                result.append(
+                    None if TENANT_KEYS.is_shredded(tenant_id) else e
+                )
+        return result
+
+    def _reencrypt_chunk(self, items: List) -> List:
+        """Re-encrypt a chunk, failures are returned as the exception"""
+        result = []
+        for value, tenant_id in items:
+            try:
+                result.append(self.reencrypt_value(value, tenant_id))
+            except Exception as e:
+                result.append(e)
+        return result
+
+    async def _run_many(self, func: Callable, values: List) -> List:
+        """Run small batches inline, split large ones over CRYPTO_EXECUTOR"""
+        if len(values) < CRYPTO_PARALLEL_THRESHOLD:
+            return func(values)
+
+        size = -(-len(values) // CRYPTO_WORKERS)
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    CRYPTO_EXECUTOR, func, values[i : i + size]
+                )
+                for i in range(0, len(values), size)
+            ]
+        )
+        return [value for chunk in chunks for value in chunk]
+
+    async def encrypt_many(
+        self,
+        plaintexts: List[Union[str, Dict, None]],
+        envelope: bool = False,
+        tenant_ids: List[str] = None,
+    ) -> List[Union[str, bytes, None]]:
+        """
+        Encrypt values in order as base64 or envelopes, empty values stay
+        None. Envelopes use the key of the matching `tenant_ids` entry.
+        """
+        return await self._run_many(
+            (
+                self._encrypt_envelope_chunk
+                if envelope
+                else self._encrypt_chunk
+            ),
+            list(
+                zip(plaintexts, tenant_ids or [None] * len(plaintexts))
+            ),
+        )
+
+    async def decrypt_many(
+        self,
+        ciphertexts: List[Union[str, bytes, None]],
+        tenant_ids: List[str] = None,
+    ) -> List[Union[str, Dict, None]]:
+        """
+        Decrypt envelopes or base64 values in order, empty values and
+        those of crypto-shredded tenants are None, values that fail to
+        decrypt are returned as the exception. Tenant keys must be
+        loaded first.
+        """
+        return await self._run_many(
+            self._decrypt_chunk,
+            list(
+                zip(
+                    ciphertexts,
+                    tenant_ids or [None] * len(ciphertexts),
+                )
+            ),
+        )
+
+    async def reencrypt_many(
+        self,
+        ciphertexts: List[Union[str, bytes]],
+        tenant_ids: List[str],
+    ) -> List[Union[str, bytes, Exception, None]]:
+        """
+        Re-encrypt values in order: the new value, None if it is already
+        current, or the exception for values that could not be decrypted
+        """
+        return await self._run_many(
+            self._reencrypt_chunk, list(zip(ciphertexts, tenant_ids))
+        )
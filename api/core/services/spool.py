@@ -0,0 +1,250 @@
+import asyncio
+import base64
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from core.config import (
+    SPOOL_DIR,
+    SPOOL_SEGMENT_BYTES,
+    SPOOL_FSYNC_POLICY,
+    SPOOL_FSYNC_INTERVAL_MS,
+    logger,
+)
+from core.database.CRUD import PGCreation
+from core.schemas.v1.logs import AuditLog
+
+# every record is <payload length><crc32 of payload><json payload>
+RECORD_HEADER = struct.Struct("<II")
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+ACK_SUFFIX = ".ack"
+DEAD_LETTER_FILE = "dead_letter.ndjson"
+
+
+# bytea columns are written to the spool as base64 text
+BYTES_COLUMNS = ("meta_data_bin",)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    return str(value)
+
+
+class SegmentSpool:
+    """
+    Append-only spool of prepared audit_logs rows on local disk.
+    Records are written into a preallocated, memory-mapped `.open`
+    segment; sealed `.seg` segments are drained by the replay task
+    in BackgroundWorkers, which keeps its progress in an `.ack` file.
+    Appends and seals msync and fsync, so callers on the event loop
+    run them in a worker thread; a lock serialises them.
+    """
+
+    def __init__(
+        self,
+        directory: Path = SPOOL_DIR,
+        segment_bytes: int = SPOOL_SEGMENT_BYTES,
+        fsync_policy: str = SPOOL_FSYNC_POLICY,
+        fsync_interval_ms: int = SPOOL_FSYNC_INTERVAL_MS,
+    ):
+        if fsync_policy not in ("always", "interval", "never"):
+            raise ValueError(
+                f"Unknown spool fsync policy {fsync_policy}"
+            )
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval_ms / 1000
+
+        self._path: Optional[Path] = None
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._pos: int = 0
+        self._last_sync: float = time.monotonic()
+        self._lock = threading.Lock()
+
+        self._recover()
+        segments = sorted(self.directory.glob(f"*{SEALED_SUFFIX}"))
+        self._next_seq = int(segments[-1].stem) + 1 if segments else 0
+
+    # ------------------------- writing ------------------------------
+    def append(self, rows: List[dict]):
+        """Append prepared rows, rolling over to a new segment when full"""
+        with self._lock:
+            for row in rows:
+                payload = json.dumps(
+                    row, default=_json_default
+                ).encode()
+                needed = RECORD_HEADER.size + len(payload)
+                if self._mm is None or self._pos + needed > len(
+                    self._mm
+                ):
+                    self._seal()
+                    self._open_segment(needed)
+
+                RECORD_HEADER.pack_into(
+                    self._mm,
+                    self._pos,
+                    len(payload),
+                    zlib.crc32(payload),
+                )
+                start = self._pos + RECORD_HEADER.size
+                self._mm[start : start + len(payload)] = payload
+                self._pos += needed
+            self._sync()
+
+    async def spool_logs(
+        self, logs: List[AuditLog], tenant_id: str, user_id: str
+    ) -> List[AuditLog]:
+        """Prepare logs exactly like the database path and spool them"""
+        try:
+            rows = [
+                PGCreation.prepare_log_row(
+                    log=log, tenant_id=tenant_id, user_id=user_id
+                )
+                for log in logs
+            ]
+            await asyncio.to_thread(self.append, rows)
+            return logs
+        except Exception as e:
+            logger.error(f"[SPOOL][APPEND ERROR] {e}")
+            return None
+
+    def has_active_records(self) -> bool:
+        return self._mm is not None and self._pos > 0
+
+    def seal(self):
+        """Close the active segment so the replay task can pick it up"""
+        with self._lock:
+            self._seal()
+
+    def _seal(self):
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(self._pos)
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._pos:
+            self._path.rename(self._path.with_suffix(SEALED_SUFFIX))
+        else:
+            self._path.unlink()
+        self._path = None
+        self._file = None
+        self._mm = None
+        self._pos = 0
+
+    def close(self):
+        self.seal()
+
+    def _open_segment(self, min_bytes: int):
+        size = max(self.segment_bytes, min_bytes)
+        self._path = Path(
+            self.directory, f"{self._next_seq:020d}{OPEN_SUFFIX}"
+        )
+        self._next_seq += 1
+        self._file = open(self._path, "w+b")
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._pos = 0
+
+    def _sync(self):
+        now = time.monotonic()
+        if self.fsync_policy == "always" or (
+            self.fsync_policy == "interval"
+            and now - self._last_sync >= self.fsync_interval
+        ):
+            self._mm.flush()
+            self._last_sync = now
+
+    def _recover(self):
+        """Seal segments left open by a crash, keeping valid records only"""
+        for path in sorted(self.directory.glob(f"*{OPEN_SUFFIX}")):
+            end = 0
+            for end, _ in self.read_segment(path):
+                pass
+            with open(path, "r+b") as f:
+                f.truncate(end)
+            if end:
+                path.rename(path.with_suffix(SEALED_SUFFIX))
+                logger.warning(
+                    f"[SPOOL] Recovered segment {path.name}"
+                )
+            else:
+                path.unlink()
+
+    # ------------------------- replaying ----------------------------
+    def sealed_segments(self) -> List[Path]:
+        return sorted(self.directory.glob(f"*{SEALED_SUFFIX}"))
+
+    @staticmethod
+    def read_segment(
+        path: Path, offset: int = 0
+    ) -> Iterator[Tuple[int, dict]]:
+        """Yield (offset after record, row) until the end or a torn record"""
+        if not path.stat().st_size:
+            return
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            pos = offset
+            while pos + RECORD_HEADER.size <= len(mm):
+                length, crc = RECORD_HEADER.unpack_from(mm, pos)
+                start = pos + RECORD_HEADER.size
+                payload = mm[start : start + length]
+                if not length or len(payload) < length:
+                    return
+                if zlib.crc32(payload) != crc:
+                    logger.error(
+                        f"[SPOOL] Corrupted record in {path.name} at {pos}"
+                    )
+                    return
+                pos = start + length
+                yield pos, SegmentSpool.decode_row(json.loads(payload))
+
+    @staticmethod
+    def decode_row(row: dict) -> dict:
+        if isinstance(row.get("timestamp"), str):
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        for column in BYTES_COLUMNS:
+            if isinstance(row.get(column), str):
+                row[column] = base64.b64decode(row[column])
+        return row
+
+    @staticmethod
+    def load_ack(path: Path) -> int:
+        ack_path = path.with_suffix(ACK_SUFFIX)
+        if not ack_path.exists():
+            return 0
+        return int(ack_path.read_text() or 0)
+
+    @staticmethod
+    def ack(path: Path, offset: int):
+        """Persist how far a segment has been replayed"""
+        ack_path = path.with_suffix(ACK_SUFFIX)
+        tmp_path = ack_path.with_suffix(".tmp")
+        tmp_path.write_text(str(offset))
+        os.replace(tmp_path, ack_path)
+
+    @staticmethod
+    def remove_segment(path: Path):
+        path.unlink(missing_ok=True)
+        path.with_suffix(ACK_SUFFIX).unlink(missing_ok=True)
+
+    def dead_letter(self, row: dict):
+        """Keep rows the database keeps rejecting for manual inspection"""
+        with open(Path(self.directory, DEAD_LETTER_FILE), "a") as f:
+            f.write(json.dumps(row, default=_json_default) + "\n")
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from core.config import STATS_CACHE_SIZE, STATS_CACHE_TTL
+
+
+class StatsCache:
+    """
+    Per-tenant LRU of /stats results. An entry is served while younger
+    than `ttl`; writers drop it once their rows are committed, the TTL
+    bounds staleness from writes made by other processes. Concurrent
+    misses of one tenant share a single load (singleflight). A tenant's
+    version only counts writes while a load of it is in flight, so a
+    load racing a write is not cached, and is dropped with its last load.
+    Only used from the event loop, so no lock is needed.
+    """
+
+    def __init__(
+        self,
+        max_size: int = STATS_CACHE_SIZE,
+        ttl: float = STATS_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[Any, float]] = (
+            OrderedDict()
+        )
+        self.versions: Dict[str, int] = {}
+        self.inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    def bump(self, tenant_id: str):
+        """Invalidate a tenant after a committed write or cleanup"""
+        self.entries.pop(tenant_id, None)
+        if self._loading(tenant_id):
+            self.versions[tenant_id] = (
+                self.versions.get(tenant_id, 0) + 1
+            )
+
+    def _loading(self, tenant_id: str) -> bool:
+        return any(key[0] == tenant_id for key in self.inflight)
+
+    async def get(
+        self,
+        tenant_id: str,
+        load: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Optional[Any]:
+        """Cached value of a tenant, else the result of one shared `load()`"""
+        entry = self.entries.get(tenant_id)
+        if entry and entry[1] > time.monotonic():
+            self.entries.move_to_end(tenant_id)
+            return entry[0]
+
+        key = (tenant_id, self.versions.get(tenant_id, 0))
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, load))
+            self.inflight[key] = future
+        # a caller going away must not cancel the load the others await
+        return await asyncio.shield(future)
+
+    async def _load(
+        self,
+        key: Tuple[str, int],
+        load: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Optional[Any]:
+        tenant_id, version = key
+        try:
+            value = await load()
+            # a write during the load may be missing from the value
+            fresh = self.versions.get(tenant_id, 0) == version
+        finally:
+            self.inflight.pop(key, None)
+            if not self._loading(tenant_id):
+                self.versions.pop(tenant_id, None)
+
+        if value is not None and fresh:
+            self.entries[tenant_id] = (
+                value,
+                time.monotonic() + self.ttl,
+            )
+            self.entries.move_to_end(tenant_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+
+STATS_CACHE = StatsCache()
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import traceback
+from typing import Awaitable, Callable, Optional, Union
+from fastapi import WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from core.config import (
+    LOG_STREAM_RESUME_LIMIT,
+    LOG_STREAM_VIEW_SIZE,
+    WS_CHAT_QUEUE_SIZE,
+    WS_OUTBOUND_QUEUE_SIZE,
+    WS_SEND_TIMEOUT,
+    logger,
+)
+from core.database.CRUD import PGRetrieve
+from core.database.CRUD.retrieve import get_cached_stats
+from core.schemas.payloads.logs import LogStreamSubscribePayload
+from core.services.log_hub import LOG_HUB
+from core.services.log_stream import LogStreamView
+
+ChatHandler = Callable[[str], Awaitable[Optional[str]]]
+
+
+class SlowConsumer(Exception):
+    """The client does not read its frames fast enough"""
+
+
+class LogStreamConnection:
+    """
+    One accepted /logs/stream socket. A reader task dispatches client
+    messages, a writer task sends the frames queued by the logs, stats and
+    chat channels, each running as its own task so an agent round trip
+    never holds back pushes. The outbound queue is bounded: a channel
+    waits for room up to WS_SEND_TIMEOUT, then the client is disconnected
+    with 1013; the hub marks the logs channel lagged meanwhile, so it
+    resyncs from the database instead of buffering.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        tenant_id: str,
+        chat: ChatHandler,
+        max_outbound: int = WS_OUTBOUND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+    ):
+        self.websocket = websocket
+        self.tenant_id = tenant_id
+        self.chat = chat
+        self.send_timeout = send_timeout
+        self.sessionmaker = websocket.app.state.db_sessionmaker
+        self.view = LogStreamView()
+        self.outbound: asyncio.Queue[Union[str, bytes]] = (
+            asyncio.Queue(maxsize=max_outbound)
+        )
+        # the reader waits for the logs channel to take a subscribe,
+        # which back-pressures clients sending them faster
+        self.subscribe_requests: asyncio.Queue[dict] = asyncio.Queue(
+            maxsize=1
+        )
+        self.chat_queries: asyncio.Queue[str] = asyncio.Queue(
+            maxsize=WS_CHAT_QUEUE_SIZE
+        )
+        self.stats_due = asyncio.Event()
+
+    async def run(self):
+        """Serve the socket until the client leaves or a channel fails"""
+        # pushes follow new logs of the tenant instead of polling
+        subscription = LOG_HUB.subscribe(self.tenant_id)
+        tasks = [
+            asyncio.create_task(self.read()),
+            asyncio.create_task(self.write()),
+            asyncio.create_task(self.logs_channel(subscription)),
+            asyncio.create_task(self.stats_channel()),
+            asyncio.create_task(self.chat_channel()),
+        ]
+        close_code = status.WS_1000_NORMAL_CLOSURE
+        try:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            error = next(
+                (t.exception() for t in done if t.exception()), None
+            )
+            if isinstance(error, SlowConsumer):
+                logger.warning(
+                    f"[WS] Disconnecting slow consumer of tenant"
+                    f" {self.tenant_id}"
+                )
+                close_code = status.WS_1013_TRY_AGAIN_LATER
+            elif error and not isinstance(error, WebSocketDisconnect):
+                logger.error(
+                    "[WS] Error in log_stream: "
+                    + "".join(traceback.format_exception(error))
+                )
+                close_code = status.WS_1011_INTERNAL_ERROR
+        finally:
+            LOG_HUB.unsubscribe(subscription)
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+
+        if close_code == status.WS_1011_INTERNAL_ERROR:
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(
+                        json.dumps(
+                            {
+                                "type": "ws.error",
+                                "message": "Internal server error"
+                                " during streaming.",
+                            }
+                        )
+                    ),
+                    self.send_timeout,
+                )
+            except Exception:
+                pass
+        try:
+            await self.websocket.close(code=close_code)
+        except Exception:
+            pass
+
+    async def send(self, message: dict):
+        """Queue a frame, raises SlowConsumer if no room is made in time"""
+        try:
+            await asyncio.wait_for(
+                self.outbound.put(self.view.frame(message)),
+                self.send_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise SlowConsumer()
+
+    async def write(self):
+        while True:
+            frame = await self.outbound.get()
+            send = (
+                self.websocket.send_bytes(frame)
+                if isinstance(frame, bytes)
+                else self.websocket.send_text(frame)
+            )
+            try:
+                await asyncio.wait_for(send, self.send_timeout)
+            except asyncio.TimeoutError:
+                raise SlowConsumer()
+
+    async def read(self):
+        """Dispatch client messages to their channel, idle sockets wait"""
+        while True:
+            text = await self.websocket.receive_text()
+            try:
+                parsed = json.loads(text)
+                type = parsed["type"]
+            except (ValueError, TypeError, KeyError):
+                await self.send(
+                    {"type": "ws.error", "message": "Invalid message."}
+                )
+                continue
+
+            if type == "subscribe":
+                await self.subscribe_requests.put(parsed)
+            elif type == "chat":
+                query = parsed.get("query")
+                if not isinstance(query, str) or not query.strip():
+                    await self.send(
+                        {
+                            "type": "ws.error",
+                            "message": "Chat query must be a"
+                            " non-empty string.",
+                        }
+                    )
+                    continue
+                try:
+                    self.chat_queries.put_nowait(query)
+                except asyncio.QueueFull:
+                    await self.send(
+                        {
+                            "type": "ws.error",
+                            "message": "Too many chat queries pending.",
+                        }
+                    )
+            else:
+                await self.send(
+                    {
+                        "type": "ws.error",
+                        "message": f"Unknown message type: {type}",
+                    }
+                )
+
+    async def logs_channel(self, subscription):
+        """Views and deltas of new logs, and replies to subscribes"""
+        await self.push_view()
+        request_task = asyncio.ensure_future(
+            self.subscribe_requests.get()
+        )
+        update_task = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {request_task, update_task},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if update_task in done:
+                    # batches queued meanwhile are coalesced into one push
+                    logs = update_task.result()
+                    update_task = asyncio.ensure_future(
+                        subscription.get()
+                    )
+                    await self.push_update(subscription, logs)
+                if request_task in done:
+                    parsed = request_task.result()
+                    request_task = asyncio.ensure_future(
+                        self.subscribe_requests.get()
+                    )
+                    await self.subscribe(parsed)
+        finally:
+            request_task.cancel()
+            update_task.cancel()
+
+    async def push_update(self, subscription, logs):
+        view = self.view
+        if not view.subscribed:
+            await self.push_view()
+        elif subscription.lagged and view.cursor:
+            subscription.lagged = False
+            await self.push_missed()
+        elif subscription.lagged:
+            subscription.lagged = False
+            await self.push_view()
+        else:
+            logs = view.select(logs)
+            if logs:
+                await self.send(view.logs_message("logs.delta", logs))
+        self.stats_due.set()
+
+    async def subscribe(self, parsed: dict):
+        view = self.view
+        try:
+            view.subscribe(
+                LogStreamSubscribePayload.model_validate(parsed)
+            )
+        except (ValidationError, ValueError) as e:
+            await self.send({"type": "ws.error", "message": str(e)})
+            return
+        await self.send(
+            {
+                "type": "subscribed",
+                "filters": jsonable_encoder(view.filters),
+                "format": view.format.value,
+            }
+        )
+        if view.cursor:
+            await self.push_missed(reply=True)
+        else:
+            await self.push_view()
+
+    async def push_view(self):
+        """Newest logs matching the view, the whole ring if unfiltered"""
+        view = self.view
+        async with self.sessionmaker() as db:
+            if view.filters:
+                logs = await PGRetrieve(db).retrieve_logs(
+                    tenant_id=self.tenant_id,
+                    filters=view.log_filter(),
+                    limit=LOG_STREAM_VIEW_SIZE,
+                )
+            else:
+                logs = await PGRetrieve(db).retrieve_recent_logs(
+                    self.tenant_id, limit=LOG_STREAM_VIEW_SIZE
+                )
+        view.replayed(logs)
+        await self.send(view.logs_message("logs.view", logs))
+        self.stats_due.set()
+
+    async def push_missed(self, reply: bool = False):
+        """
+        Logs after the view's cursor read back from the database, sent
+        even if there are none when replying to a subscribe
+        """
+        view = self.view
+        async with self.sessionmaker() as db:
+            logs = await PGRetrieve(db).retrieve_logs(
+                tenant_id=self.tenant_id,
+                filters=view.log_filter(),
+                after=view.cursor,
+                limit=LOG_STREAM_RESUME_LIMIT,
+            )
+        view.replayed(logs)
+        if not logs and not reply:
+            return
+        await self.send(
+            view.logs_message(
+                "logs.delta",
+                logs,
+                truncated=len(logs) >= LOG_STREAM_RESUME_LIMIT,
+            )
+        )
+
+    async def stats_channel(self):
+        """Tenant stats after each logs push, only when they changed"""
+        while True:
+            await self.stats_due.wait()
+            self.stats_due.clear()
+            stats = jsonable_encoder(
+                await get_cached_stats(
+                    self.sessionmaker, self.tenant_id
+                )
+            )
+            if self.view.stats_changed(stats):
+                await self.send({"type": "logs.stats", **stats})
+
+    async def chat_channel(self):
+        """Agent answers, one query at a time in the order received"""
+        while True:
+            query = await self.chat_queries.get()
+            try:
+                answer = await self.chat(query)
+            except Exception:
+                logger.error(
+                    f"[WS] Chat failed: {traceback.format_exc()}"
+                )
+                await self.send(
+                    {
+                        "type": "ws.error",
+                        "message": "Chat failed, try again.",
+                    }
+                )
+                continue
+            if answer is not None:
+                await self.send(
+                    {"type": "chat.response", "response": answer}
+                )
@@ -1,3 +1,8 @@
+import asyncio
+import base64
+import csv
+import gzip
+import io
 import json
 import uuid
 from datetime import datetime
@@ -5,6 +10,32 @@ from httpx import AsyncClient, ASGITransport
 from core.app import app
 from core.config import DATA_DIR, Path, os
 from asgi_lifespan import LifespanManager
+from core.config import LOG_SEARCH_MODE
+from core.database.CRUD import PGCreation, PGRetrieve, creation
+from core.database.migration import META_DATA_MIGRATION, PGMigration
+from core.schemas.payloads import logs as log_payloads
+from core.schemas.payloads.logs import CreateLogPayload
+from pydantic import ValidationError
+from core.schemas.v1.logs import (
+    AuditLog,
+    AuditLogTable,
+    LogFilter,
+    LOG_SEARCH_INDEXES,
+)
+from core.schemas.v1.job import MigrationCheckpointTable
+from core.schemas.v1.tenant import Tenant
+from core.schemas.v1.user import User
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql
+from core.services.ingest_buffer import IngestBuffer
+from core.services.log_hub import LogHub
+from core.services.recent_logs import RECENT_LOGS, RecentLogs
+from core.services.spool import SegmentSpool
+from core.services.stats_cache import StatsCache
+from core.services import security
+from core.services.security import TENANT_KEYS, SecurityService
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import pytest
 
 UUID = str(uuid.uuid4())
@@ -69,3 +100,1194 @@ async def test_create_and_get_logs(sample_entries, token_package):
             data3 = resp3.json()
             assert data3["message"] == "Retrieve log successfully!"
             assert data3["log"]["id"] == UUID
+
+
+@pytest.mark.asyncio
+async def test_stream_create_logs_ndjson(
+    sample_entries, token_package
+):
+    lines = [json.dumps(entry) for entry in sample_entries]
+    lines.append('{"action_type": "UNKNOWN"}')
+    body = ("\n".join(lines) + "\n").encode()
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            resp = await client.post(
+                "/api/v1/logs/bulk/ndjson",
+                content=body,
+                headers={
+                    "Authorization": f"Bearer {ONE_WEEK_TOKEN}",
+                    "Content-Type": "application/x-ndjson",
+                },
+            )
+            assert resp.status_code == 200
+            data = resp.json()
+            assert data["total_lines"] == len(lines)
+            assert data["total_inserted"] == len(sample_entries)
+            assert data["total_rejected"] == 1
+            assert data["chunks"][-1]["errors"][0]["line"] == len(
+                lines
+            )
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_logs_idempotent(
+    sample_entries, token_package
+):
+    entries = [
+        {**entry, "id": str(uuid.uuid4())} for entry in sample_entries
+    ]
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+            assert resp.json()["duplicates"] == []
+
+            # a retried request only reports the ids as duplicates
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+            assert resp.json()["logs"] == []
+            assert resp.json()["duplicates"] == [
+                e["id"] for e in entries
+            ]
+
+
+@pytest.mark.asyncio
+async def test_get_logs_fields_projection(
+    sample_entries, token_package
+):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={
+                    "fields": "severity,action_type,timestamp",
+                    "limit": 5,
+                },
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            for log in resp.json()["logs"] or []:
+                assert set(log) == {
+                    "id",
+                    "severity",
+                    "action_type",
+                    "timestamp",
+                }
+
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={"fields": "tenant_id"},
+                headers=headers,
+            )
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_logs_cursor_pagination(
+    sample_entries, token_package
+):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            # at least limit + 1 logs, so there is a second page
+            entries = [
+                {**sample_entries[0], "id": str(uuid.uuid4())}
+                for _ in range(3)
+            ]
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+
+            resp = await client.get(
+                "/api/v1/logs/", params={"limit": 2}, headers=headers
+            )
+            assert resp.status_code == 200
+            first_page = resp.json()
+            assert len(first_page["logs"]) == 2
+            assert first_page["next_cursor"]
+
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={
+                    "limit": 2,
+                    "cursor": first_page["next_cursor"],
+                },
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            second_ids = {log["id"] for log in resp.json()["logs"]}
+            first_ids = {log["id"] for log in first_page["logs"]}
+            assert second_ids
+            assert not first_ids & second_ids
+
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={"cursor": "not-a-cursor"},
+                headers=headers,
+            )
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_logs_filters(sample_entries, token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={"severity": "ERROR", "resource_type": "order"},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            for log in resp.json()["logs"] or []:
+                assert log["severity"] == "ERROR"
+                assert log["resource_type"] == "order"
+
+            # resource_id alone does not lead any index
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={"resource_id": "o1"},
+                headers=headers,
+            )
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_search_logs(sample_entries, token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resource_id = f"search-{uuid.uuid4().hex[:8]}"
+            entries = [
+                {
+                    **sample_entries[0],
+                    "id": str(uuid.uuid4()),
+                    "resource_id": resource_id,
+                }
+            ]
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+
+            resp = await client.get(
+                "/api/v1/logs/",
+                params={"q": resource_id},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            assert [
+                log["resource_id"] for log in resp.json()["logs"]
+            ] == [resource_id]
+
+            resp = await client.get(
+                "/api/v1/logs/", params={"q": "ab"}, headers=headers
+            )
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_cleanup_job(token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.delete(
+                "/api/v1/logs/cleanup",
+                params={"retention_hours": 24 * 365},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            job = resp.json()["job"]
+            assert job["status"] in ["pending", "running", "done"]
+
+            resp = await client.get(
+                f"/api/v1/logs/cleanup/{job['id']}", headers=headers
+            )
+            assert resp.status_code == 200
+            assert resp.json()["job"]["id"] == job["id"]
+
+            resp = await client.get(
+                f"/api/v1/logs/cleanup/{uuid.uuid4()}", headers=headers
+            )
+            assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_writes(sample_entries, token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.get(
+                "/api/v1/logs/stats", headers=headers
+            )
+            assert resp.status_code == 200
+            before = resp.json()["response"]["stats"]["total_logs"]
+
+            entries = [{**sample_entries[0], "id": str(uuid.uuid4())}]
+            for _ in range(2):  # the retry is a duplicate, not counted
+                resp = await client.post(
+                    "/api/v1/logs/bulk", json=entries, headers=headers
+                )
+                assert resp.status_code == 200
+
+            resp = await client.get(
+                "/api/v1/logs/stats", headers=headers
+            )
+            assert (
+                resp.json()["response"]["stats"]["total_logs"]
+                == before + 1
+            )
+
+
+@pytest.mark.asyncio
+async def test_stats_timeseries(sample_entries, token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.get(
+                "/api/v1/logs/stats/timeseries",
+                params={"granularity": "hour", "group_by": "severity"},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            timeseries = resp.json()["timeseries"]
+            assert len(timeseries["buckets"]) in (24, 25)
+            for series in timeseries["series"]:
+                assert len(series["counts"]) == len(
+                    timeseries["buckets"]
+                )
+
+            resp = await client.get(
+                "/api/v1/logs/stats/timeseries",
+                params={
+                    "granularity": "minute",
+                    "start_time": "2020-01-01T00:00:00Z",
+                },
+                headers=headers,
+            )
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_stats_cache_coalesces(token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            responses = await asyncio.gather(
+                *[
+                    client.get("/api/v1/logs/stats", headers=headers)
+                    for _ in range(20)
+                ]
+            )
+            assert {resp.status_code for resp in responses} == {200}
+            assert len({resp.text for resp in responses}) == 1
+
+
+@pytest.mark.asyncio
+async def test_head_reads_match_database(
+    sample_entries, token_package
+):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            entries = [{**sample_entries[0], "id": str(uuid.uuid4())}]
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+
+            # served from the recent logs ring
+            head = await client.get(
+                "/api/v1/logs/", params={"limit": 10}, headers=headers
+            )
+            # a time filter always goes to the database
+            stored = await client.get(
+                "/api/v1/logs/",
+                params={
+                    "limit": 10,
+                    "start_time": "2000-01-01T00:00:00Z",
+                },
+                headers=headers,
+            )
+            assert head.status_code == stored.status_code == 200
+            assert head.json()["logs"] == stored.json()["logs"]
+
+
+@pytest.mark.asyncio
+async def test_batch_get_logs(sample_entries, token_package):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            entries = [
+                {**sample_entries[0], "id": str(uuid.uuid4())}
+                for _ in range(3)
+            ]
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+
+            ids = [entries[2]["id"], "missing-id", entries[0]["id"]]
+            resp = await client.post(
+                "/api/v1/logs/batch-get",
+                json={"ids": ids},
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            body = resp.json()
+            assert [log and log["id"] for log in body["logs"]] == [
+                entries[2]["id"],
+                None,
+                entries[0]["id"],
+            ]
+            assert body["missing"] == ["missing-id"]
+
+
+@pytest.mark.asyncio
+async def test_export_logs_streams_gzip_csv(
+    sample_entries, token_package
+):
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            entries = [{**sample_entries[0], "id": str(uuid.uuid4())}]
+            resp = await client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert resp.status_code == 200
+
+            resp = await client.get(
+                "/api/v1/logs/export",
+                params={
+                    "gzip": "true",
+                    "start_time": "2000-01-01T00:00:00Z",
+                },
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            assert (
+                resp.headers["Content-Disposition"]
+                == "attachment; filename=logs.csv.gz"
+            )
+            rows = list(
+                csv.reader(
+                    io.StringIO(gzip.decompress(resp.content).decode())
+                )
+            )
+            assert rows[0][0] == "id"
+            assert entries[0]["id"] in {row[0] for row in rows[1:]}
+
+
+@pytest.mark.asyncio
+async def test_parquet_export_job(sample_entries, token_package):
+    pq = pytest.importorskip("pyarrow.parquet")
+    transport = ASGITransport(app=app)
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=transport, base_url="http://localhost:8080"
+        ) as client:
+            headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+            resp = await client.post(
+                "/api/v1/logs/export/jobs", json={}, headers=headers
+            )
+            assert resp.status_code == 202
+            job_id = resp.json()["job"]["id"]
+
+            for _ in range(60):
+                resp = await client.get(
+                    f"/api/v1/logs/export/jobs/{job_id}",
+                    headers=headers,
+                )
+                job = resp.json()["job"]
+                if job["status"] in ("done", "failed"):
+                    break
+                await asyncio.sleep(0.5)
+            assert job["status"] == "done"
+
+            resp = await client.get(
+                f"/api/v1/logs/export/jobs/{job_id}/download",
+                headers=headers,
+            )
+            assert resp.status_code == 200
+            parquet = pq.ParquetFile(io.BytesIO(resp.content))
+            assert parquet.metadata.num_rows == job["rows_written"]
+
+            resp = await client.get(
+                f"/api/v1/logs/export/jobs/{job_id}/download",
+                headers={**headers, "Range": "bytes=0-3"},
+            )
+            assert resp.status_code == 206
+            assert resp.content == b"PAR1"
+
+
+@pytest.mark.asyncio
+async def test_ingest_buffer_stop_flushes_pending(sample_entries):
+    buffer = IngestBuffer(
+        sessionmaker=None, flush_interval_ms=1, batch_size=2
+    )
+
+    async def slow_flush(batch):
+        await asyncio.sleep(0.2)
+        buffer._resolve(batch, ok=True)
+
+    buffer.flush = slow_flush
+    buffer.start()
+    submits = [
+        asyncio.create_task(
+            buffer.submit(
+                AuditLog(
+                    **{**sample_entries[0], "id": str(uuid.uuid4())}
+                ),
+                "tenant",
+                "user",
+            )
+        )
+        for _ in range(5)
+    ]
+    # the first batch is being flushed when stop() is called
+    await asyncio.sleep(0.05)
+    await buffer.stop()
+
+    results = await asyncio.wait_for(asyncio.gather(*submits), 1)
+    assert all(result and result.logs for result in results)
+
+
+def test_log_hub_notify_payloads_fit_notify_limit():
+    rows = [
+        {"tenant_id": "tenant", "id": f"{i:03d}" + "x" * 200}
+        for i in range(300)
+    ]
+    payloads = LogHub().notify_payloads(rows, published=True)
+
+    assert all(len(payload.encode()) < 8000 for payload in payloads)
+    ids = [i for p in payloads for i in json.loads(p)["ids"]]
+    assert ids == [row["id"] for row in rows]
+
+
+@pytest.fixture
+def rotated_master_key(monkeypatch):
+    """Services under the previous and the current DATA_ENCRYPTION_KEY"""
+    previous = AESGCM(AESGCM.generate_key(bit_length=256))
+    current = AESGCM(AESGCM.generate_key(bit_length=256))
+    monkeypatch.setattr(security, "META_DATA_FORMAT", "bytea")
+    monkeypatch.setattr(
+        security, "get_previous_cipher", lambda: previous
+    )
+    old, new = SecurityService(), SecurityService()
+    old.aesgcm, new.aesgcm = previous, current
+    return old, new
+
+
+def test_rewrap_key_from_previous_master_key(rotated_master_key):
+    old, new = rotated_master_key
+    key = AESGCM.generate_key(bit_length=256)
+    wrapped = old.wrap_key("tenant", 1, key)
+
+    rewrapped = new.rewrap_key("tenant", 1, wrapped)
+    assert rewrapped is not None
+    assert new.unwrap_key("tenant", 1, rewrapped) == key
+    # already under the current master key
+    assert new.rewrap_key("tenant", 1, rewrapped) is None
+
+
+def test_reencrypt_value_from_previous_master_key(rotated_master_key):
+    old, new = rotated_master_key
+    tenant_id = str(uuid.uuid4())
+    value = old.encrypt_envelope({"secret": "x"}, tenant_id)
+
+    # old values still decrypt through the previous key
+    assert not new._is_current(value, tenant_id)
+    assert new.decrypt_value(value, tenant_id) == {"secret": "x"}
+
+    reencrypted = new.reencrypt_value(value, tenant_id)
+    assert new._is_current(reencrypted, tenant_id)
+    assert new.reencrypt_value(reencrypted, tenant_id) is None
+    assert new.decrypt_value(reencrypted, tenant_id) == {"secret": "x"}
+
+
+def test_reencrypt_value_to_active_tenant_key(rotated_master_key):
+    _, new = rotated_master_key
+    tenant_id = str(uuid.uuid4())
+    TENANT_KEYS.put(
+        tenant_id, 1, AESGCM(AESGCM.generate_key(256)), True
+    )
+    try:
+        value = new.encrypt_envelope({"secret": "x"}, tenant_id)
+        assert new._is_current(value, tenant_id)
+
+        TENANT_KEYS.put(
+            tenant_id, 2, AESGCM(AESGCM.generate_key(256)), True
+        )
+        assert not new._is_current(value, tenant_id)
+        reencrypted = new.reencrypt_value(value, tenant_id)
+        assert SecurityService.envelope_key_version(reencrypted) == 2
+        assert new.decrypt_value(reencrypted, tenant_id) == {
+            "secret": "x"
+        }
+    finally:
+        TENANT_KEYS.evict(tenant_id)
+
+
+def test_tenant_envelope_round_trip_and_wrong_tenant():
+    service = SecurityService()
+    tenant_id, other_id = str(uuid.uuid4()), str(uuid.uuid4())
+    key = AESGCM.generate_key(bit_length=256)
+    TENANT_KEYS.put(tenant_id, 1, AESGCM(key), True)
+    try:
+        value = service.encrypt_envelope({"secret": "x"}, tenant_id)
+        assert SecurityService.envelope_key_version(value) == 1
+        assert service.decrypt_value(value, tenant_id) == {
+            "secret": "x"
+        }
+
+        # the tenant id is bound as AAD, even the same key can't read it
+        TENANT_KEYS.put(other_id, 1, AESGCM(key), True)
+        with pytest.raises(InvalidTag):
+            service.decrypt_value(value, other_id)
+        with pytest.raises(KeyError):
+            service.decrypt_value(value, str(uuid.uuid4()))
+    finally:
+        TENANT_KEYS.evict(tenant_id)
+        TENANT_KEYS.evict(other_id)
+
+
+def test_shredded_tenant_keys_are_not_cached_again():
+    service = SecurityService()
+    tenant_id = str(uuid.uuid4())
+    TENANT_KEYS.put(
+        tenant_id, 1, AESGCM(AESGCM.generate_key(256)), True
+    )
+    value = service.encrypt_envelope({"secret": "x"}, tenant_id)
+
+    TENANT_KEYS.shred(tenant_id)
+    TENANT_KEYS.put(
+        tenant_id, 2, AESGCM(AESGCM.generate_key(256)), True
+    )
+    assert TENANT_KEYS.active_version(tenant_id) is None
+    with pytest.raises(KeyError):
+        service.decrypt_value(value, tenant_id)
+    # later logs fall back to DATA_ENCRYPTION_KEY envelopes
+    fallback = service.encrypt_envelope({"secret": "y"}, tenant_id)
+    assert SecurityService.envelope_key_version(fallback) is None
+    assert service.decrypt_value(fallback, tenant_id) == {
+        "secret": "y"
+    }
+
+
+async def test_spool_appends_from_worker_threads(tmp_path):
+    spool = SegmentSpool(directory=tmp_path, segment_bytes=4096)
+    batches = [
+        [{"id": f"{i}-{j}", "payload": "x" * 100} for j in range(10)]
+        for i in range(20)
+    ]
+    await asyncio.gather(
+        *[asyncio.to_thread(spool.append, rows) for rows in batches]
+    )
+    await asyncio.to_thread(spool.seal)
+
+    ids = [
+        row["id"]
+        for segment in spool.sealed_segments()
+        for _, row in SegmentSpool.read_segment(segment)
+    ]
+    assert sorted(ids) == sorted(
+        row["id"] for rows in batches for row in rows
+    )
+
+
+def test_log_search_uses_configured_mode():
+    predicate, _ = PGRetrieve.search_clause("order")
+    sql = str(predicate.compile(dialect=postgresql.dialect()))
+
+    operator = {"fts": "@@", "trigram": "ILIKE"}[LOG_SEARCH_MODE]
+    assert operator in sql
+    assert (
+        LogFilter(q="order").serving_index()
+        == LOG_SEARCH_INDEXES[LOG_SEARCH_MODE]
+    )
+
+
+def test_recent_logs_add_skips_logs_in_ring(sample_entries):
+    logs = [
+        AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+        for _ in range(3)
+    ]
+    recent = RecentLogs(size=10)
+    recent.fill("tenant", logs[:2], recent.start_fill("tenant"))
+
+    # the fill already read logs[1] back, and logs[2] is sent twice
+    recent.add("tenant", [logs[1], logs[2], logs[2]])
+    ids = [log.id for log in recent.get("tenant", 10)]
+    assert sorted(ids) == sorted(log.id for log in logs)
+
+
+class FailingSession:
+    async def execute(self, *args, **kwargs):
+        raise ConnectionError("database is down")
+
+    async def rollback(self):
+        pass
+
+
+async def test_retrieve_logs_raise_errors():
+    retrieve = PGRetrieve(FailingSession())
+    assert await retrieve.retrieve_logs(tenant_id="tenant") == []
+    with pytest.raises(ConnectionError):
+        await retrieve.retrieve_logs(
+            tenant_id="tenant", log_ids=["a"], raise_errors=True
+        )
+
+
+async def test_stats_cache_single_load_and_bump_during_load():
+    cache = StatsCache(max_size=2, ttl=60)
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    # concurrent misses share one load
+    values = await asyncio.gather(
+        *[cache.get("tenant", load) for _ in range(10)]
+    )
+    assert values == [1] * 10
+    assert calls == 1
+    assert await cache.get("tenant", load) == 1
+    assert calls == 1
+
+    # a write during the load may be missing, so it is not cached
+    cache.bump("tenant")
+    pending = asyncio.ensure_future(cache.get("tenant", load))
+    await asyncio.sleep(0.01)
+    cache.bump("tenant")
+    assert await pending == 2
+    assert await cache.get("tenant", load) == 3
+    assert await cache.get("tenant", load) == 3
+    assert calls == 3
+
+    # versions are only kept while a load is in flight
+    for i in range(5):
+        cache.bump(f"other-{i}")
+        await cache.get(f"other-{i}", load)
+    assert cache.versions == {}
+    assert len(cache.entries) == 2
+
+
+def test_partitioned_retry_requires_timestamp(
+    sample_entries, monkeypatch
+):
+    monkeypatch.setattr(
+        log_payloads, "AUDIT_LOG_PARTITION_INTERVAL", "day"
+    )
+    entry = {
+        k: v for k, v in sample_entries[0].items() if k != "timestamp"
+    }
+
+    # the server timestamp of a retry would make it a new key
+    with pytest.raises(ValidationError):
+        CreateLogPayload(**entry, id="retried")
+    # without an id there is nothing to deduplicate
+    CreateLogPayload(**entry)
+
+    log = CreateLogPayload(**sample_entries[0], id="retried")
+    rows = [
+        PGCreation.prepare_log_row(
+            log, "tenant", "user", encrypt=False
+        )
+        for _ in range(2)
+    ]
+    assert rows[0]["timestamp"] == rows[1]["timestamp"]
+
+
+async def test_decrypt_many_none_only_for_shredded_tenants():
+    service = SecurityService()
+    tenant_id, shredded_id = str(uuid.uuid4()), str(uuid.uuid4())
+    for tenant in (tenant_id, shredded_id):
+        TENANT_KEYS.put(
+            tenant, 1, AESGCM(AESGCM.generate_key(256)), True
+        )
+    try:
+        values = [
+            service.encrypt_envelope({"secret": "x"}, tenant)
+            for tenant in (tenant_id, shredded_id)
+        ]
+        TENANT_KEYS.evict(tenant_id)
+        TENANT_KEYS.shred(shredded_id)
+
+        # a key that is merely not loaded is an error, not a null
+        missing, shredded = await service.decrypt_many(
+            values, tenant_ids=[tenant_id, shredded_id]
+        )
+        assert isinstance(missing, KeyError)
+        assert shredded is None
+    finally:
+        TENANT_KEYS.evict(tenant_id)
+        TENANT_KEYS.shredded.discard(shredded_id)
+
+
+async def test_recent_logs_not_filled_after_decrypt_failure(
+    sample_entries, monkeypatch
+):
+    tenant_id = str(uuid.uuid4())
+    log = AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+    log._meta_data_failed = True
+
+    async def retrieve_logs(self, **kwargs):
+        return [log]
+
+    monkeypatch.setattr(PGRetrieve, "retrieve_logs", retrieve_logs)
+    logs = await PGRetrieve(None).retrieve_recent_logs(tenant_id, 10)
+    assert logs == [log]
+    assert RECENT_LOGS.get(tenant_id, 10) is None
+
+
+async def test_text_rotation_converges_with_tenant_key(
+    rotated_master_key, monkeypatch
+):
+    old, new = rotated_master_key
+    monkeypatch.setattr(security, "META_DATA_FORMAT", "text")
+    tenant_id = str(uuid.uuid4())
+    TENANT_KEYS.put(
+        tenant_id, 1, AESGCM(AESGCM.generate_key(256)), True
+    )
+    try:
+        values = [old.encrypt_field({"n": i}) for i in range(5)]
+        tenant_ids = [tenant_id] * len(values)
+
+        first = await new.reencrypt_many(values, tenant_ids)
+        assert all(isinstance(value, str) for value in first)
+        # a second rotation finds nothing left to re-encrypt
+        second = await new.reencrypt_many(first, tenant_ids)
+        assert second == [None] * len(values)
+    finally:
+        TENANT_KEYS.evict(tenant_id)
+
+
+class FakeSpool:
+    def __init__(self):
+        self.rows = []
+
+    def append(self, rows):
+        self.rows.extend(rows)
+
+
+class FakeSessionmaker:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __call__(self):
+        return self
+
+
+async def flush_failing_batch(sample_entries, monkeypatch, error):
+    """Flush 3 logs whose batch insert raises `error` and whose second
+    log is also rejected on its own, returns (results, spooled ids)"""
+    logs = [
+        AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+        for _ in range(3)
+    ]
+
+    async def ensure_tenant_key(self, tenant_id):
+        pass
+
+    async def prepare_log_rows(entries):
+        return [
+            {"tenant_id": t, "id": log.id} for log, t, _ in entries
+        ]
+
+    async def insert_log_rows(
+        self, rows, logs=None, raise_errors=False
+    ):
+        if len(rows) > 1:
+            raise error
+        return None if rows[0]["id"] == logs_ids[1] else []
+
+    logs_ids = [log.id for log in logs]
+    monkeypatch.setattr(
+        PGCreation, "ensure_tenant_key", ensure_tenant_key
+    )
+    monkeypatch.setattr(
+        PGCreation, "prepare_log_rows", staticmethod(prepare_log_rows)
+    )
+    monkeypatch.setattr(PGCreation, "insert_log_rows", insert_log_rows)
+
+    spool = FakeSpool()
+    buffer = IngestBuffer(
+        sessionmaker=FakeSessionmaker(), log_spool=spool
+    )
+    loop = asyncio.get_running_loop()
+    batch = [
+        (log, "tenant", "user", loop.create_future()) for log in logs
+    ]
+    await buffer.flush(batch)
+    results = [future.result() for _, _, _, future in batch]
+    return results, [row["id"] for row in spool.rows], logs_ids
+
+
+async def test_ingest_buffer_spools_connection_errors(
+    sample_entries, monkeypatch
+):
+    results, spooled, logs_ids = await flush_failing_batch(
+        sample_entries,
+        monkeypatch,
+        ConnectionError("database is down"),
+    )
+    assert spooled == logs_ids
+    assert all(result.logs for result in results)
+
+
+async def test_ingest_buffer_isolates_rejected_rows(
+    sample_entries, monkeypatch
+):
+    results, spooled, _ = await flush_failing_batch(
+        sample_entries, monkeypatch, ValueError("bad enum value")
+    )
+    # a data error is not retried by the spool, only its row fails
+    assert spooled == []
+    assert [bool(result) for result in results] == [True, False, True]
+
+
+async def test_tenant_key_failure_fails_the_write(
+    sample_entries, monkeypatch
+):
+    monkeypatch.setattr(creation, "TENANT_KEYS_ENABLED", True)
+    create = PGCreation(FailingSession())
+    tenant_id = str(uuid.uuid4())
+    with pytest.raises(ConnectionError):
+        await create.ensure_tenant_key(tenant_id)
+    # not written under the master key instead
+    log = AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+    assert (
+        await create.create_bulk_logs([log], tenant_id, "user") is None
+    )
+
+
+def test_recent_logs_versions_only_while_filling(sample_entries):
+    log = AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+    recent = RecentLogs(size=10)
+    for tenant_id in ("a", "b", "c"):
+        recent.add(tenant_id, [log])
+        recent.invalidate(tenant_id)
+    assert recent.versions == {}
+
+    # a write during the fill may be missing from what it read
+    version = recent.start_fill("a")
+    recent.add("a", [log])
+    recent.fill("a", [], version)
+    assert recent.get("a", 10) is None
+    assert recent.versions == {} and recent.filling == {}
+
+    recent.fill("a", [log], recent.start_fill("a"))
+    assert recent.get("a", 10) == [log]
+
+
+async def create_test_tenant(session, name: str):
+    tenant = Tenant(name=name)
+    user = User(
+        tenant_id=tenant.id,
+        username=name,
+        email=f"{name}@example.com",
+    )
+    assert await PGCreation(session).create_new_tenant(tenant)
+    assert await PGCreation(session).create_new_user(user)
+    return tenant, user
+
+
+async def migrate_batch(batch_size: int):
+    async with app.state.db_sessionmaker() as session:
+        return await PGMigration(db=session).migrate_meta_data_batch(
+            batch_size=batch_size
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    security.META_DATA_FORMAT != "bytea",
+    reason="meta_data is only migrated to bytea",
+)
+async def test_migrate_meta_data_batches():
+    metas = [{"n": i} for i in range(5)]
+    legacy = [SecurityService().encrypt_field(meta) for meta in metas]
+    legacy[3] = "!!!!"
+    ids = [f"{i:02d}-{uuid.uuid4()}" for i in range(len(legacy))]
+
+    async with LifespanManager(app):
+        # batches are run by hand below
+        if app.state._meta_migration_task:
+            app.state._meta_migration_task.cancel()
+        async with app.state.db_sessionmaker() as session:
+            tenant, user = await create_test_tenant(
+                session, "migration"
+            )
+            await session.execute(
+                insert(AuditLogTable),
+                [
+                    {
+                        "id": log_id,
+                        "tenant_id": tenant.id,
+                        "user_id": user.id,
+                        "action_type": "CREATE",
+                        "resource_type": "order",
+                        "severity": "INFO",
+                        "meta_data": value,
+                        "timestamp": datetime.now(),
+                    }
+                    for log_id, value in zip(ids, legacy)
+                ],
+            )
+            # walk this tenant's rows only from the start
+            await session.execute(
+                delete(MigrationCheckpointTable).where(
+                    MigrationCheckpointTable.id == META_DATA_MIGRATION
+                )
+            )
+            await session.execute(
+                insert(MigrationCheckpointTable).values(
+                    id=META_DATA_MIGRATION, last_tenant_id=tenant.id
+                )
+            )
+            await session.commit()
+            before = await PGRetrieve(session).retrieve_logs(
+                tenant_id=tenant.id, log_ids=ids, raise_errors=True
+            )
+
+        checkpoint = await migrate_batch(2)
+        assert (checkpoint.last_tenant_id, checkpoint.last_id) == (
+            tenant.id,
+            ids[1],
+        )
+        assert checkpoint.rows_converted == 2
+        assert checkpoint.finished_at is None
+
+    # a restarted process resumes from the persisted checkpoint
+    async with LifespanManager(app):
+        if app.state._meta_migration_task:
+            app.state._meta_migration_task.cancel()
+        async with app.state.db_sessionmaker() as session:
+            # another process holds the checkpoint for its batch
+            await session.execute(
+                select(MigrationCheckpointTable).with_for_update()
+            )
+            assert await migrate_batch(2) is None
+            await session.rollback()
+
+        checkpoint = await migrate_batch(2)
+        assert checkpoint.last_id == ids[3]
+        assert checkpoint.rows_converted == 3
+        assert checkpoint.rows_skipped == 1
+        while not checkpoint.finished_at:
+            checkpoint = await migrate_batch(1000)
+
+        async with app.state.db_sessionmaker() as session:
+            rows = (
+                await session.execute(
+                    select(
+                        AuditLogTable.id,
+                        AuditLogTable.meta_data,
+                        AuditLogTable.meta_data_bin,
+                    )
+                    .where(AuditLogTable.tenant_id == tenant.id)
+                    .order_by(AuditLogTable.id)
+                )
+            ).all()
+            after = await PGRetrieve(session).retrieve_logs(
+                tenant_id=tenant.id, log_ids=ids, raise_errors=True
+            )
+
+    for (_, meta_data, meta_data_bin), value in zip(rows, legacy):
+        if value == "!!!!":
+            # not base64, left as it is
+            assert (meta_data, meta_data_bin) == (value, None)
+        else:
+            assert meta_data is None
+            assert meta_data_bin == b"\x01" + base64.b64decode(value)
+    decrypted = {log.id: log.meta_data for log in before}
+    assert {log.id: log.meta_data for log in after} == decrypted
+    assert [decrypted[log_id] for log_id in ids] == [
+        *metas[:3],
+        None,
+        metas[4],
+    ]
+
+
+async def prepare_test_rows(sample_entries, tenant, user, count=3):
+    logs = [
+        AuditLog(**{**sample_entries[0], "id": str(uuid.uuid4())})
+        for _ in range(count)
+    ]
+    rows = await PGCreation.prepare_log_rows(
+        [(log, tenant.id, user.id) for log in logs]
+    )
+    return logs, rows
+
+
+def spy_upserts(monkeypatch):
+    """Sizes of the upserts run from now on"""
+    upserts = []
+    upsert_log_rows = PGCreation.upsert_log_rows
+
+    async def spy(self, rows):
+        upserts.append(len(rows))
+        return await upsert_log_rows(self, rows)
+
+    monkeypatch.setattr(PGCreation, "upsert_log_rows", spy)
+    return upserts
+
+
+async def count_stored(session, tenant_id: str) -> int:
+    return (
+        await session.execute(
+            select(func.count()).where(
+                AuditLogTable.tenant_id == tenant_id
+            )
+        )
+    ).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_copy_conflict_redone_as_upsert(
+    sample_entries, monkeypatch
+):
+    async with LifespanManager(app):
+        async with app.state.db_sessionmaker() as session:
+            tenant, user = await create_test_tenant(
+                session, "copy-conflict"
+            )
+            logs, rows = await prepare_test_rows(
+                sample_entries, tenant, user
+            )
+            # another process stored the first row, the dedup filter of
+            # this one has not seen it so the batch takes the COPY path
+            await PGCreation(session).upsert_log_rows(rows[:1])
+            await session.commit()
+
+            upserts = spy_upserts(monkeypatch)
+            duplicates = await PGCreation(session).insert_log_rows(
+                rows, logs=logs, raise_errors=True
+            )
+            assert duplicates == [(tenant.id, logs[0].id)]
+            assert upserts == [len(rows)]
+            assert await count_stored(session, tenant.id) == len(rows)
+
+
+@pytest.mark.asyncio
+async def test_copy_error_falls_back_to_upsert(
+    sample_entries, monkeypatch
+):
+    async def copy_log_rows(self, tenant_id, rows):
+        raise RuntimeError("COPY failed")
+
+    async with LifespanManager(app):
+        async with app.state.db_sessionmaker() as session:
+            tenant, user = await create_test_tenant(
+                session, "copy-error"
+            )
+            logs, rows = await prepare_test_rows(
+                sample_entries, tenant, user
+            )
+            monkeypatch.setattr(
+                PGCreation, "copy_log_rows", copy_log_rows
+            )
+            upserts = spy_upserts(monkeypatch)
+            duplicates = await PGCreation(session).insert_log_rows(
+                rows, logs=logs, raise_errors=True
+            )
+            assert duplicates == []
+            assert upserts == [len(rows)]
+            assert await count_stored(session, tenant.id) == len(rows)
+
+
+@pytest.mark.asyncio
+async def test_copy_without_tenant_partition_uses_parent(
+    sample_entries, monkeypatch
+):
+    async with LifespanManager(app):
+        async with app.state.db_sessionmaker() as session:
+            tenant, user = await create_test_tenant(
+                session, "copy-parent"
+            )
+            logs, rows = await prepare_test_rows(
+                sample_entries, tenant, user
+            )
+            # no audit_logs_{tenant_id}, its rows are routed by the parent
+            partition = f"audit_logs_{tenant.id}"
+            await session.execute(
+                text(
+                    f'ALTER TABLE "{partition}"'
+                    f' RENAME TO "moved_{partition}"'
+                )
+            )
+            await session.commit()
+
+            upserts = spy_upserts(monkeypatch)
+            duplicates = await PGCreation(session).insert_log_rows(
+                rows, logs=logs, raise_errors=True
+            )
+            assert duplicates == []
+            assert upserts == []
+            assert await count_stored(session, tenant.id) == len(rows)
@@ -99,6 +99,103 @@ def test_get_logs_stats(token_package):
             == "Log statistics retrieved successfully!"
         )
 
+def test_stream_pushes_new_logs(sample_entries, token_package):
+    headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/api/v1/logs/stream", headers=headers
+        ) as websocket:
+            assert websocket.receive_json()["type"] == "logs.view"
+            assert websocket.receive_json()["type"] == "logs.stats"
+
+            entry = {**sample_entries[0], "id": str(uuid.uuid4())}
+            response = client.post(
+                "/api/v1/logs/bulk", json=[entry], headers=headers
+            )
+            assert response.status_code == 200
+
+            # pushed by the log hub, no message from the client needed
+            view = websocket.receive_json()
+            assert view["type"] == "logs.view"
+            assert view["logs"][0]["id"] == entry["id"]
+            assert websocket.receive_json()["type"] == "logs.stats"
+
+def test_stream_subscription_pushes_matching_deltas(
+    sample_entries, token_package
+):
+    headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/api/v1/logs/stream", headers=headers
+        ) as websocket:
+            websocket.receive_json()
+            websocket.receive_json()
+            websocket.send_text(
+                json.dumps(
+                    {"type": "subscribe", "filters": {"severity": "CRITICAL"}}
+                )
+            )
+            assert websocket.receive_json()["type"] == "subscribed"
+            assert websocket.receive_json()["type"] == "logs.view"
+
+            entries = [
+                {**sample_entries[0], "id": str(uuid.uuid4()), "severity": severity}
+                for severity in ("INFO", "CRITICAL")
+            ]
+            response = client.post(
+                "/api/v1/logs/bulk", json=entries, headers=headers
+            )
+            assert response.status_code == 200
+
+            delta = websocket.receive_json()
+            assert delta["type"] == "logs.delta"
+            assert [log["id"] for log in delta["logs"]] == [entries[1]["id"]]
+            assert delta["cursor"]
+
+def test_stream_pushes_logs_while_chat_runs(
+    sample_entries, token_package, monkeypatch
+):
+    import asyncio
+    from core.routes.v1 import audit_log_ws
+
+    async def slow_run(**kwargs):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(audit_log_ws.AGENT, "run", slow_run)
+    headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/api/v1/logs/stream", headers=headers
+        ) as websocket:
+            websocket.receive_json()
+            websocket.receive_json()
+            websocket.send_text(json.dumps({"type": "chat", "query": "hi"}))
+
+            entry = {**sample_entries[0], "id": str(uuid.uuid4())}
+            response = client.post(
+                "/api/v1/logs/bulk", json=[entry], headers=headers
+            )
+            assert response.status_code == 200
+
+            # the chat channel is still waiting on the agent
+            view = websocket.receive_json()
+            assert view["type"] == "logs.view"
+            assert view["logs"][0]["id"] == entry["id"]
+
+def test_stream_rejects_invalid_chat_query(token_package):
+    headers = {"Authorization": f"Bearer {ONE_WEEK_TOKEN}"}
+    with TestClient(app) as client:
+        with client.websocket_connect(
+            "/api/v1/logs/stream", headers=headers
+        ) as websocket:
+            websocket.receive_json()
+            websocket.receive_json()
+            for query in ({}, {"query": None}, {"query": 1}):
+                websocket.send_text(json.dumps({"type": "chat", **query}))
+                error = websocket.receive_json()
+                assert error["type"] == "ws.error"
+                assert error["message"].startswith("Chat query")
+
 # def test_cleanup_old_logs(token_package):
 #     access_token = token_package.get("access_token", "")
 #     with TestClient(app) as client:
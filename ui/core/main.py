@@ -23,26 +23,38 @@ st.title("🔍 Audit Logs Dashboard")
 st.sidebar.title("Settings")
 token = st.sidebar.text_input("Bearer Token", type="password")
 use_ws = st.sidebar.checkbox("Use WebSocket to fetch logs", value=False)
-skip = st.sidebar.number_input("Skip", min_value=0, value=0, step=1)
 limit = st.sidebar.slider("Limit", min_value=1, max_value=1000, value=10)
 bulk_count = st.sidebar.number_input("Bulk Count", min_value=1, max_value=100, value=5, step=1)
 
 # Shared session state
 if "logs" not in st.session_state:
     st.session_state.logs = []
+if "cursor" not in st.session_state:
+    st.session_state.cursor = None
+    st.session_state.next_cursor = None
+
+# keyset pagination, the API hands back an opaque next_cursor per page
+page_col1, page_col2 = st.sidebar.columns(2)
+if page_col1.button("First page"):
+    st.session_state.cursor = None
+if page_col2.button("Next page", disabled=not st.session_state.next_cursor):
+    st.session_state.cursor = st.session_state.next_cursor
 
 ws_thread_started = False
 
-def fetch_logs(token: str, skip: int, limit: int):
+def fetch_logs(token: str, limit: int, cursor: str = None):
     headers = {"Authorization": f"Bearer {token}"}
-    params = {"skip": skip, "limit": limit}
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
     try:
         resp = requests.get(API_URL, headers=headers, params=params, timeout=5)
         resp.raise_for_status()
-        return resp.json().get("logs", [])
+        data = resp.json()
+        return data.get("logs") or [], data.get("next_cursor")
     except Exception as e:
         st.error(f"Error fetching logs: {e}")
-        return []
+        return [], None
 
 def start_ws_client(token: str):
     def run():
@@ -100,7 +112,9 @@ if token:
         start_ws_client(token)
         ws_thread_started = True
     elif not use_ws:
-        st.session_state.logs = fetch_logs(token, skip, limit)
+        st.session_state.logs, st.session_state.next_cursor = fetch_logs(
+            token, limit, st.session_state.cursor
+        )
 
     stats = fetch_stats(token)
 